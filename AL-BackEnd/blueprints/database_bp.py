@@ -1,36 +1,118 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, jsonify, request, g, current_app, Response
 from utils.library_database import *
+from utils.device_catalog import DeviceCatalog
+from utils.response_cache import ResponseCache, VersionedCache
+from utils.query_engine import QueryEngine, QueryTimeout
 from datetime import datetime
 database_bp = Blueprint("database_bp", __name__)
 
+# 进程内共用的数据库连接池，连接在请求之间复用
+db_pool = ConnectionPool()
+
+# /db/execute_sql 使用的只读查询引擎
+query_engine = QueryEngine()
+
+# 流式输出查询结果时每次写出的行数
+STREAM_CHUNK_ROWS = 100
+
+# 公告响应缓存，按 importance 参数分别缓存，插入公告时清空
+announcement_cache = ResponseCache(ttl=config.ANNOUNCEMENT_CACHE_TTL)
+
+# 预约结果缓存，按 pid 缓存，定时任务（另一个进程）写入 reservation_result 后失效
+result_cache = VersionedCache("reservation_result", check_interval=config.RESULT_CACHE_CHECK_INTERVAL)
+
+# 预约请求记录未指定起始时间时默认查询的天数
+ATTEMPT_QUERY_DAYS = 30
+
+# 进程内共用的座位目录，devices 表变化时自动重新加载
+device_catalog = DeviceCatalog()
+
+# 座位列表每页、搜索结果最多返回的座位数
+SEAT_PAGE_SIZE_MAX = 200
+
+# 批量提交预约数据时每个事务写入的最多记录数，NDJSON 请求体不必全部读入内存后再写入
+RESERVATION_BATCH_ROWS = 500
+
+
+def get_db():
+    """
+    获取当前请求使用的数据库对象，同一请求内多次调用返回同一个对象，请求结束时自动归还连接。
+
+    :return: LibraryDatabase 对象
+    """
+    if "db" not in g:
+        g.db = LibraryDatabase(pool=db_pool)
+    return g.db
+
+
+@database_bp.teardown_request
+def release_db(exception=None):
+    """
+    请求结束时将数据库连接归还连接池。
+    """
+    db = g.pop("db", None)
+    if db is not None:
+        db.close()
+
+def prepare_reservation(user_info):
+    """
+    校验前端提交的一条预约数据，并转换为 reservation_info 表的格式。调用前需刷新 device_catalog。
+
+    :param user_info: 前端提交的预约数据字典
+    :return: (预约数据字典, None)，校验失败返回 (None, 错误消息)
+    """
+    if not isinstance(user_info, dict) or not user_info:
+        return None, "无效的请求数据"
+
+    # 检查必需字段
+    required_fields = ["pid", "logonName", "password", "timeSlot", "seat_list"]
+    for field in required_fields:
+        if field not in user_info:
+            return None, f"缺少必需字段: {field}"
+
+    time_slot = str(user_info["timeSlot"]).split("-")
+    if len(time_slot) != 2 or not isinstance(user_info["seat_list"], list):
+        return None, "数据格式错误: timeSlot 应为 \"开始-结束\"，seat_list 应为列表"
+    if not all(isinstance(seat_name, str) for seat_name in user_info["seat_list"]):
+        return None, "数据格式错误: seat_list 中的座位名称应为字符串"
+
+    try:
+        is_reserved = int(user_info.get("is_reserved", True))  # 默认值为 True
+    except (TypeError, ValueError):
+        return None, "数据格式错误: is_reserved 应为 0 或 1"
+
+    # 校验座位名称并解析为座位 ID，预约时无需再查询设备表
+    missing_seats = device_catalog.find_missing(user_info["seat_list"])
+    if missing_seats:
+        return None, f"座位不存在: {', '.join(missing_seats)}"
+
+    # 处理时间段与 seat_list
+    reservation_data = dict(user_info)
+    reservation_data.update({
+        "begin_time": time_slot[0],
+        "end_time": time_slot[1],
+        "seat_list": json.dumps(user_info["seat_list"]),  # 转换 seat_list 为 JSON 字符串
+        "seat_ids": json.dumps(device_catalog.resolve(user_info["seat_list"])),
+        "is_reserved": is_reserved
+    })
+
+    # 删除不需要的字段
+    reservation_data.pop("timeSlot", None)
+    return reservation_data, None
+
+
 # 插入预约信息
 @database_bp.route("/insert_reservation", methods=["POST"])
 def insert_reservation():
-    # 初始化数据库连接
-    db = LibraryDatabase()
+    # 获取当前请求的数据库连接
+    db = get_db()
 
     try:
-        # 获取前端数据
-        user_info = request.get_json()
-        if not user_info:
-            return jsonify({"error": "无效的请求数据"}), 400
-
-        # 检查必需字段
-        required_fields = ["pid", "logonName", "password", "timeSlot", "seat_list"]
-        for field in required_fields:
-            if field not in user_info:
-                return jsonify({"error": f"缺少必需字段: {field}"}), 400
-
-        # 处理时间段与 seat_list
-        user_info.update({
-            "begin_time": user_info["timeSlot"].split("-")[0],
-            "end_time": user_info["timeSlot"].split("-")[1],
-            "seat_list": json.dumps(user_info["seat_list"]),  # 转换 seat_list 为 JSON 字符串
-            "is_reserved": int(user_info.get("is_reserved", True))  # 默认值为 True
-        })
-
-        # 删除不需要的字段
-        user_info.pop("timeSlot", None)
+        # 获取前端数据并校验
+        device_catalog.refresh(db)
+        user_info, error = prepare_reservation(request.get_json())
+        if error:
+            return jsonify({"error": error}), 400
 
         # 调试日志
         print("接收到的预约数据:", user_info)
@@ -44,16 +126,88 @@ def insert_reservation():
         print(f"插入预约信息失败: {e}")
         return jsonify({"message": f"服务器错误"}), 500
 
-    finally:
-        # 确保数据库连接关闭
-        db.close()
+
+def read_batch():
+    """
+    读取批量接口的请求体。支持 JSON 数组、{"reservations": [...]}，
+    以及 Content-Type 为 application/x-ndjson 的逐行 JSON（逐行从请求流中读取，不需要先读入整个请求体，
+    调用方按 RESERVATION_BATCH_ROWS 分批写入）。
+
+    :return: 生成器，元素为 (行号, 解析后的对象)，无法解析的行为 (行号, None)
+    """
+    if request.mimetype == "application/x-ndjson":
+        index = 0
+        for line in request.stream:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield index, json.loads(line)
+            except ValueError:
+                yield index, None
+            index += 1
+        return
+
+    data = request.get_json(silent=True)
+    if isinstance(data, dict):
+        data = data.get("reservations")
+    if not isinstance(data, list):
+        raise ValueError("请求体应为 JSON 数组、{\"reservations\": [...]} 或 NDJSON")
+    yield from enumerate(data)
+
+
+# 批量插入预约信息
+@database_bp.route("/insert_reservations", methods=["POST"])
+def insert_reservations():
+    # 获取当前请求的数据库连接
+    db = get_db()
+
+    try:
+        # 逐条校验，每积累 RESERVATION_BATCH_ROWS 条通过校验的记录在一个事务中写入
+        device_catalog.refresh(db)
+        statuses, reservations, inserted = [], {}, 0
+        for index, user_info in read_batch():
+            pid = user_info.get("pid") if isinstance(user_info, dict) else None
+            try:
+                reservation_data, error = prepare_reservation(user_info)
+            except (TypeError, ValueError) as e:
+                reservation_data, error = None, f"数据格式错误: {e}"
+            if error:
+                statuses.append({"index": index, "pid": pid, "status": "error", "error": error})
+                continue
+            statuses.append({"index": index, "pid": pid, "status": "ok"})
+            # 同一批次中重复的 pid 以最后一条为准（后写入的批次覆盖先写入的）
+            reservations[str(pid)] = reservation_data
+            if len(reservations) >= RESERVATION_BATCH_ROWS:
+                db.insert_or_update_reservations(reservations.values())
+                inserted += len(reservations)
+                reservations = {}
+
+        db.insert_or_update_reservations(reservations.values())
+        inserted += len(reservations)
+        failed = sum(status["status"] == "error" for status in statuses)
+        print(f"批量提交预约数据: 共 {len(statuses)} 条，写入 {inserted} 条，失败 {failed} 条")
+
+        return jsonify({
+            "message": "提交完成",
+            "total": len(statuses),
+            "inserted": inserted,
+            "failed": failed,
+            "results": statuses
+        })
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        print(f"批量插入预约信息失败: {e}")
+        return jsonify({"message": f"服务器错误"}), 500
+
 
 # 更新预约状态
 @database_bp.route("/update_reservation_status", methods=["POST"])
 def update_reservation_status():
     try:
-        # 初始化数据库连接
-        db = LibraryDatabase()
+        # 获取当前请求的数据库连接
+        db = get_db()
 
         # 获取来自前端的数据（pid, is_reserved）
         res = request.get_json()
@@ -62,8 +216,6 @@ def update_reservation_status():
         # 更新用户预约信息
         db.update_reservation_status(pid, is_reserved)
 
-        # 关闭数据库连接
-        db.close()
         return jsonify({
             "message": "已更新",
         })
@@ -71,17 +223,14 @@ def update_reservation_status():
         print(f"更新预约状态失败: {e}")
         return jsonify({"message": f"服务器错误"}), 500
 
-    finally:
-        # 确保数据库连接关闭
-        db.close()
 
 
 # 更新优先级
 @database_bp.route("/update_priority", methods=["POST"])
 def update_priority():
     try:
-        # 初始化数据库连接
-        db = LibraryDatabase()
+        # 获取当前请求的数据库连接
+        db = get_db()
 
         # 获取来自前端的数据（pid, is_reserved）
         res = request.get_json()
@@ -90,8 +239,6 @@ def update_priority():
         # 更新用户预约信息
         db.update_priority_by_pid(pid, priority)
 
-        # 关闭数据库连接
-        db.close()
         return jsonify({
             "message": "已更新",
         })
@@ -99,35 +246,193 @@ def update_priority():
         print(f"更新预约状态失败: {e}")
         return jsonify({"message": f"服务器错误"}), 500
 
-    finally:
-        # 确保数据库连接关闭
-        db.close()
 
 # 查询预约结果
 @database_bp.route("/get_reservations_by_pid", methods=["POST"])
 def get_reservations_by_pid():
-    # 初始化数据库连接
-    db = LibraryDatabase()
-
     # 获取来自前端的数据（pid）
     pid = request.get_json().get("pid")
 
-    # 查询预约信息
-    reservation_result = db.get_reservation_result_by_pid(pid)
+    # reservation_result 表未变化时直接返回缓存的结果
+    result_cache.validate(get_db)
+    cached = result_cache.get(pid)
+    if cached is None:
+        # 查询预约信息
+        reservation_result = get_db().get_reservation_result_by_pid(pid)
+        cached = result_cache.set(pid, current_app.json.dumps({
+            "message": reservation_result,
+        }))
+
+    return Response(cached[0], mimetype="application/json")
+
 
-    # 关闭数据库连接
-    db.close()
+# 查询接口缓存的命中统计
+@database_bp.route("/cache_stats", methods=["GET"])
+def cache_stats():
     return jsonify({
-        "message": reservation_result,
+        "announcements": announcement_cache.stats(),
+        "reservation_results": result_cache.stats(),
     })
 
-# 执行自定义 SQL 查询
+# 列出所有位置及座位数
+@database_bp.route("/seats/rooms", methods=["GET"])
+def list_seat_rooms():
+    try:
+        device_catalog.refresh(get_db())
+        return jsonify({"message": "查询成功", "rooms": device_catalog.rooms()})
+    except Exception as e:
+        print(f"查询位置列表失败: {e}")
+        return jsonify({"error": "服务器错误"}), 500
+
+
+# 按位置列出座位，可分页
+@database_bp.route("/seats", methods=["GET"])
+def list_seats():
+    try:
+        location = request.args.get("location")
+        if not location:
+            return jsonify({"error": "缺少必需参数: location"}), 400
+        device_catalog.refresh(get_db())
+
+        # 未指定页码时返回该位置的完整座位列表（已缓存的 JSON）
+        if "page" not in request.args:
+            body = device_catalog.room_json(location, current_app.json.dumps)
+            if body is None:
+                return jsonify({"error": f"位置不存在: {location}"}), 404
+            return Response(body, mimetype="application/json")
+
+        page = max(request.args.get("page", 1, type=int), 1)
+        page_size = min(max(request.args.get("page_size", 50, type=int), 1), SEAT_PAGE_SIZE_MAX)
+        seats, total = device_catalog.list_room(location, (page - 1) * page_size, page_size)
+        return jsonify({
+            "location": location,
+            "total": total,
+            "page": page,
+            "page_size": page_size,
+            "seats": seats
+        })
+    except Exception as e:
+        print(f"查询座位列表失败: {e}")
+        return jsonify({"error": "服务器错误"}), 500
+
+
+# 按名称前缀搜索座位（输入提示）
+@database_bp.route("/seats/search", methods=["GET"])
+def search_seats():
+    try:
+        prefix = request.args.get("q", "")
+        location = request.args.get("location") or None
+        limit = min(max(request.args.get("limit", 20, type=int), 1), SEAT_PAGE_SIZE_MAX)
+        device_catalog.refresh(get_db())
+        return jsonify({"message": "查询成功", "seats": device_catalog.search(prefix, location, limit)})
+    except Exception as e:
+        print(f"搜索座位失败: {e}")
+        return jsonify({"error": "服务器错误"}), 500
+
+
+def parse_time(value):
+    """
+    将 "YYYY-MM-DD" 或 "YYYY-MM-DD HH:MM:SS" 格式的时间字符串转换为时间戳。
+
+    :param value: 时间字符串
+    :return: 时间戳
+    """
+    time_format = "%Y-%m-%d %H:%M:%S" if " " in value else "%Y-%m-%d"
+    return datetime.strptime(value, time_format).timestamp()
+
+
+# 分页查询预约请求记录
+@database_bp.route("/get_reservation_attempts", methods=["POST"])
+def get_reservation_attempts():
+    try:
+        # 获取当前请求的数据库连接
+        db = get_db()
+
+        # 获取前端数据（pid 或 devId，可选 start, end, limit, cursor）
+        data = request.get_json() or {}
+        pid = data.get("pid")
+        devId = data.get("devId")
+        if pid is None and devId is None:
+            return jsonify({"error": "缺少必需字段: pid 或 devId"}), 400
+
+        # 默认查询最近 30 天，每页最多 200 条
+        end = parse_time(data["end"]) if data.get("end") else None
+        start = parse_time(data["start"]) if data.get("start") else \
+            (end or datetime.now().timestamp()) - ATTEMPT_QUERY_DAYS * 86400
+        limit = min(max(int(data.get("limit", 50)), 1), 200)
+        cursor = None
+        if data.get("cursor"):
+            sent_at, attempt_id = data["cursor"].split(":")
+            cursor = (float(sent_at), int(attempt_id))
+
+        attempts, next_cursor = db.get_reservation_attempts(pid, devId, start, end, limit, cursor)
+        response = {
+            "message": "查询成功",
+            "attempts": attempts,
+            "next_cursor": f"{next_cursor[0]}:{next_cursor[1]}" if next_cursor else None
+        }
+        # 第一页附带该时间段内各结果代码的统计
+        if cursor is None:
+            response["summary"] = db.get_reservation_attempt_summary(pid, devId, start, end)
+        return jsonify(response)
+    except ValueError as e:
+        return jsonify({"error": f"参数格式错误: {e}"}), 400
+    except Exception as e:
+        print(f"查询预约请求记录失败: {e}")
+        return jsonify({"error": "服务器错误"}), 500
+
+def stream_ndjson(result):
+    """
+    以 NDJSON 格式逐行输出查询结果：第一行为列名，之后每行一条记录，最后一行为汇总信息。
+
+    :param result: QueryResult 对象
+    :return: 生成器
+    """
+    yield json.dumps({"columns": result.columns}, ensure_ascii=False) + "\n"
+    summary = {"message": "查询成功"}
+    try:
+        chunk = []
+        for row in result:
+            chunk.append(json.dumps(dict(zip(result.columns, row)), ensure_ascii=False, default=str))
+            if len(chunk) >= STREAM_CHUNK_ROWS:
+                yield "\n".join(chunk) + "\n"
+                chunk = []
+        if chunk:
+            yield "\n".join(chunk) + "\n"
+    except Exception as e:
+        summary = {"message": "查询中断", "error": str(e)}
+    summary.update({"row_count": result.row_count, "truncated": result.truncated})
+    yield json.dumps(summary, ensure_ascii=False) + "\n"
+
+
+def stream_json(result):
+    """
+    以分块 JSON 格式输出查询结果，格式与原接口一致（{"message", "results"}），另外附带 row_count、truncated。
+
+    :param result: QueryResult 对象
+    :return: 生成器
+    """
+    yield '{"columns": ' + json.dumps(result.columns, ensure_ascii=False) + ', "results": ['
+    summary = {"message": "查询成功"}
+    try:
+        chunk = []
+        for row in result:
+            chunk.append(json.dumps(dict(zip(result.columns, row)), ensure_ascii=False, default=str))
+            if len(chunk) >= STREAM_CHUNK_ROWS:
+                yield ("," if result.row_count > len(chunk) else "") + ",".join(chunk)
+                chunk = []
+        if chunk:
+            yield ("," if result.row_count > len(chunk) else "") + ",".join(chunk)
+    except Exception as e:
+        summary = {"message": "查询中断", "error": str(e)}
+    summary.update({"row_count": result.row_count, "truncated": result.truncated})
+    yield "], " + json.dumps(summary, ensure_ascii=False)[1:]
+
+
+# 执行自定义 SQL 查询（只读）
 @database_bp.route("/execute_sql", methods=["POST"])
 def execute_sql():
     try:
-        # 初始化数据库连接
-        db = LibraryDatabase()
-
         # 获取前端数据
         data = request.get_json()
         sql = data.get("sql")  # 获取 SQL 语句
@@ -140,28 +445,26 @@ def execute_sql():
         print("执行的 SQL:", sql)
         print("参数:", params)
 
-        # 执行查询
-        db.cursor.execute(sql, params)
-        rows = db.cursor.fetchall()
-        columns = [desc[0] for desc in db.cursor.description]  # 获取列名
-
-        # 格式化查询结果
-        results = [dict(zip(columns, row)) for row in rows]
-
-        return jsonify({
-            "message": "查询成功",
-            "results": results
-        })
+        # 在只读连接上执行查询，结果逐行流式返回
+        try:
+            result = query_engine.execute(sql, params)
+        except (sqlite3.Error, QueryTimeout) as e:
+            return jsonify({"error": f"查询失败: {str(e)}"}), 400
+
+        if data.get("format") == "ndjson" or request.accept_mimetypes.best == "application/x-ndjson":
+            response = Response(stream_ndjson(result), mimetype="application/x-ndjson")
+        else:
+            response = Response(stream_json(result), mimetype="application/json")
+        # 客户端提前断开时也要归还连接
+        response.call_on_close(result.close)
+        return response
     except Exception as e:
         print(f"执行自定义 SQL 失败: {e}")
         return jsonify({"error": f"服务器错误: {str(e)}"}), 500
-    finally:
-        # 确保数据库连接关闭
-        db.close()
 
 @database_bp.route("/insert_announcement", methods=["POST"])
 def insert_or_update_announcement():
-    db = LibraryDatabase()
+    db = get_db()
 
     try:
         # 获取前端数据
@@ -182,6 +485,7 @@ def insert_or_update_announcement():
 
         # 插入或更新公告
         db.insert_announcement(data)
+        announcement_cache.invalidate()
 
         return jsonify({"message": "公告插入或更新成功！"}), 200
     except KeyError as e:
@@ -192,32 +496,105 @@ def insert_or_update_announcement():
         # 捕获其他异常
         print(f"插入或更新公告失败: {e}")
         return jsonify({"error": f"服务器错误: {str(e)}"}), 500
-    finally:
-        # 确保数据库连接关闭
-        db.close()
 
 
 # 获取公告
 @database_bp.route("/get_announcements", methods=["GET"])
 def get_announcements():
-    db = LibraryDatabase()
-
     try:
         # 获取查询参数
         importance = request.args.get("importance")  # 可选参数（高, 中, 低）
 
-        # 查询公告
-        announcements = db.get_announcements(importance)
-
-        return jsonify({
-            "message": "查询成功",
-            "announcements": announcements
-        })
+        # 缓存未命中时才查询数据库并序列化
+        cached = announcement_cache.get(importance)
+        if cached is None:
+            announcements = get_db().get_announcements(importance)
+            cached = announcement_cache.set(importance, current_app.json.dumps({
+                "message": "查询成功",
+                "announcements": announcements
+            }))
+        body, etag = cached
+
+        # 客户端携带的 If-None-Match 与 ETag 一致时返回 304
+        response = Response(body, mimetype="application/json")
+        response.set_etag(etag)
+        response.cache_control.no_cache = True
+        return response.make_conditional(request)
     except Exception as e:
         print(f"查询公告失败: {e}")
         return jsonify({"error": "服务器错误"}), 500
-    finally:
-        db.close()
 
 
 
+
+
+# 接口延迟基准测试：python -m blueprints.database_bp
+# 同时测量改动前的做法（每个请求新建连接并执行建表语句、不使用缓存）作为对照
+if __name__ == "__main__":
+    from flask import Flask
+    import statistics
+    import tempfile
+    import time
+
+    # 使用临时数据库，避免影响正式数据
+    db_pool = ConnectionPool(os.path.join(tempfile.mkdtemp(), "benchmark.db"))
+    seed_db = LibraryDatabase(pool=db_pool)
+    seed_db.cursor.executemany(
+        "INSERT INTO announcement_info (title, content, publish_time, importance) VALUES (?, ?, ?, ?);",
+        [(f"公告{i}", "内容" * 50, f"2025-01-{i % 28 + 1:02d}", "高中低"[i % 3]) for i in range(50)])
+    seed_db.insert_or_update_reservation_result("2210000000", "预约成功,[]")
+    seed_db.close()
+
+    def baseline_db():
+        """
+        改动前每个请求的数据库访问：新建连接，并执行一遍所有建表语句。
+        """
+        db = LibraryDatabase(db_name=db_pool.db_name)
+        db._create_tables()
+        return db
+
+    def baseline_get_announcements():
+        db = baseline_db()
+        try:
+            return jsonify({"message": "查询成功", "announcements": db.get_announcements(request.args.get("importance"))})
+        finally:
+            db.close()
+
+    def baseline_get_reservations_by_pid():
+        db = baseline_db()
+        try:
+            return jsonify({"message": db.get_reservation_result_by_pid(request.get_json().get("pid"))})
+        finally:
+            db.close()
+
+    app = Flask(__name__)
+    app.register_blueprint(database_bp, url_prefix="/db")
+    app.add_url_rule("/baseline/get_announcements", view_func=baseline_get_announcements, methods=["GET"])
+    app.add_url_rule("/baseline/get_reservations_by_pid", view_func=baseline_get_reservations_by_pid,
+                     methods=["POST"])
+    client = app.test_client()
+
+    def measure(send, rounds=500):
+        latencies = []
+        for _ in range(rounds):
+            start = time.perf_counter()
+            send()
+            latencies.append((time.perf_counter() - start) * 1000)
+        percentiles = statistics.quantiles(latencies, n=100)
+        return percentiles[49], percentiles[98]
+
+    etag = client.get("/db/get_announcements").headers["ETag"]
+    for name, baseline, send in (
+            ("/db/get_announcements",
+             lambda: client.get("/baseline/get_announcements"),
+             lambda: client.get("/db/get_announcements")),
+            ("/db/get_announcements (304)",
+             lambda: client.get("/baseline/get_announcements"),
+             lambda: client.get("/db/get_announcements", headers={"If-None-Match": etag})),
+            ("/db/get_reservations_by_pid",
+             lambda: client.post("/baseline/get_reservations_by_pid", json={"pid": "2210000000"}),
+             lambda: client.post("/db/get_reservations_by_pid", json={"pid": "2210000000"}))):
+        before_p50, before_p99 = measure(baseline)
+        after_p50, after_p99 = measure(send)
+        print(f"{name}: 改动前 p50 {before_p50:.3f}ms，p99 {before_p99:.3f}ms；"
+              f"改动后 p50 {after_p50:.3f}ms，p99 {after_p99:.3f}ms")
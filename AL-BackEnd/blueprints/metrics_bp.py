@@ -0,0 +1,45 @@
+from flask import Blueprint, Response, jsonify
+from utils.library_database import LibraryDatabase
+from utils.phase_metrics import phase_metrics, merge_snapshots, render_prometheus
+from blueprints.database_bp import db_pool
+import threading
+metrics_bp = Blueprint("metrics_bp", __name__)
+
+# 已保存的预约运行（定时任务进程写入 reservation_runs）的各阶段耗时累计值，每次只读取新增的运行记录
+stored_timings = {}
+stored_runs = 0
+last_run_id = 0
+stored_lock = threading.Lock()
+
+
+def collect_stored_timings():
+    """
+    将上次读取之后新增的运行记录累加到 stored_timings 中。
+
+    :return: (累计的各阶段耗时, 运行次数) 的副本
+    """
+    global stored_runs, last_run_id
+    with stored_lock:
+        db = LibraryDatabase(pool=db_pool)
+        try:
+            for row_id, _, phase_timings in db.iter_reservation_runs(last_run_id):
+                merge_snapshots(stored_timings, phase_timings)
+                stored_runs += 1
+                last_run_id = row_id
+        finally:
+            db.close()
+        return merge_snapshots({}, stored_timings), stored_runs
+
+
+@metrics_bp.route("/metrics", methods=["GET"])
+def metrics():
+    """
+    以 Prometheus 文本格式输出预约流程各阶段耗时的直方图：
+    所有已保存的预约运行，加上本进程中（例如 /reserve 接口）的请求。
+    """
+    try:
+        timings, runs = collect_stored_timings()
+        merge_snapshots(timings, phase_metrics.snapshot())
+        return Response(render_prometheus(timings, runs), content_type="text/plain; version=0.0.4; charset=utf-8")
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
@@ -3,6 +3,7 @@ from flask_cors import CORS
 from utils import config
 from blueprints.reserve_bp import reserve_bp
 from blueprints.database_bp import database_bp
+from blueprints.metrics_bp import metrics_bp
 from utils.insert_seat_ifo import *
 app = Flask(__name__)
 
@@ -12,6 +13,7 @@ CORS(app)
 # 注册蓝图
 app.register_blueprint(reserve_bp, url_prefix="/reserve")
 app.register_blueprint(database_bp, url_prefix="/db")
+app.register_blueprint(metrics_bp)
 
 @app.route("/")
 def home():
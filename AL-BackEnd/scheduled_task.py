@@ -1,11 +1,23 @@
 #linux:  #!/www/wwwroot/RemoteLibrary/.venv/bin/python
 from utils.library_system import LibrarySystem
 from utils.library_database import LibraryDatabase
-from utils.vpn_system import VPNSystem
+from utils.vpn_session import VPNSessionManager
+from utils.seat_planner import plan_seat_assignment
+from utils.device_catalog import DeviceCatalog
+from utils.transport import get_transport_stats, ensure_pool_size
+from utils.attempt_log import AttemptRecorder
+from utils.seat_availability import get_shared_availability
+from utils.seat_stats import SeatStats
+from utils.phase_metrics import phase_metrics, format_summary
 from utils import config
-import requests
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+import asyncio
+import itertools
+import threading
 import os
 import json
+import time
 import logging
 
 log_path = os.path.dirname(config.LOG_FILE)
@@ -27,22 +39,37 @@ logger = logging.getLogger(__name__)
 # 创建一个快捷方式用于记录日志
 log = logger.info
 
-def get_seat_ids(db, seat_list):
+# 座位目录，预约前在 prepare_jobs 中刷新，之后的名称解析和相邻座位查找都在内存中完成
+device_catalog = DeviceCatalog()
+
+def get_seat_ids(catalog, seat_list):
     """
-    根据设备名称列表从数据库中获取座位的设备 ID。
+    根据设备名称列表从座位目录中获取座位的设备 ID。
 
-    :param db: 数据库对象
+    :param catalog: 已加载的 DeviceCatalog 对象
     :param seat_list: 设备名称列表
     :return: 座位设备 ID 列表
     """
-    seat_id_list = []
-    for device_name in seat_list:
-        device_id = db.get_device_id_by_name(device_name)
-        if device_id:
-            seat_id_list.append(device_id)
-        else:
-            log(f"设备号 {device_name} 不存在")
-    return seat_id_list
+    for device_name in catalog.find_missing(seat_list):
+        log(f"设备号 {device_name} 不存在")
+    return catalog.resolve(seat_list)
+
+
+def get_reservation_seat_ids(catalog, reservation_item):
+    """
+    获取预约记录的座位 ID 列表。优先使用提交时已解析好的 seat_ids；旧记录没有 seat_ids，
+    或提交后重新导入座位信息删除、更换了其中的设备 ID 时，从座位目录重新解析 seat_list。
+
+    :param catalog: 已加载的 DeviceCatalog 对象
+    :param reservation_item: 包含预约信息的字典
+    :return: 座位设备 ID 列表
+    """
+    if reservation_item["seat_ids"]:
+        seat_ids = json.loads(reservation_item["seat_ids"])
+        if all(seat_id in catalog.by_id for seat_id in seat_ids):
+            return seat_ids
+        log(f"学号 {reservation_item['pid']} 保存的座位 ID 已不在座位目录中，重新解析座位名称")
+    return get_seat_ids(catalog, json.loads(reservation_item["seat_list"]))
 
 
 def handle_reservation_error(e, reservation_item):
@@ -81,44 +108,68 @@ def insert_reservation_result(db, user_pid, success_message, fail_message):
     db.insert_or_update_reservation_result(user_pid, res_message)
 
 
-def reservation(db, reservation_item):
+def get_fallback_seats(seat_id_list):
     """
-    处理单个座位预约的逻辑，包括：
-    1. 从数据库获取设备 ID。
-    2. 使用图书馆系统进行预约。
-    3. 保存预约结果到数据库。
+    查找所选座位附近、用户没有选择的座位，所选座位全部失败时依次尝试。FALLBACK_NEIGHBORS 为 0 时不尝试。
+
+    :param seat_id_list: 座位设备 ID 列表
+    :return: 相邻座位 ID 列表
+    """
+    if config.FALLBACK_NEIGHBORS <= 0:
+        return []
+    return device_catalog.nearest_unlisted(seat_id_list, config.FALLBACK_NEIGHBORS)
+
+
+def run_reservation(reservation_item, seat_id_list, vpn_manager, recorder=None):
+    """
+    执行单个用户的网络预约流程（图书馆登录 + 预约），不访问数据库，可在线程中并发执行。
 
-    :param db: 数据库对象
     :param reservation_item: 包含预约信息的字典
+    :param seat_id_list: 座位设备 ID 列表
+    :param vpn_manager: VPNSessionManager 对象，提供已登录 webvpn 的 Session
+    :param recorder: 可选的 AttemptRecorder，记录该用户的每次预约请求
+    :return: (success_message, user_info, fail_message)，VPN 登录失败或出现异常返回 None
     """
     logonName = reservation_item["logonName"]
     password = reservation_item["password"]
-    seat_list = json.loads(reservation_item["seat_list"])
     begin_time = reservation_item["begin_time"]
     end_time = reservation_item["end_time"]
 
-    # 获取座位设备 ID
-    seat_id_list = get_seat_ids(db, seat_list)
-    shared_session = requests.Session()
-    vpn=VPNSystem(config.VPN_USERNAME, config.VPN_PASSWORD)
-    vpn.session = shared_session
+    # 复用已登录的 webvpn Cookie，每个用户使用独立的 Session
+    shared_session = vpn_manager.new_session()
+    if shared_session is None:
+        log(f"VPN 登录失败，无法继续预约")
+        return None
 
-    # 创建 LibrarySystem 实例并进行 VPN 登录
+    # 创建 LibrarySystem 实例
     library = LibrarySystem(logonName, password)
     library.session = shared_session
-
-    if not vpn.vpn_login():
-        log(f"VPN 登录失败，无法继续预约")
-        return
+    library.vpn_manager = vpn_manager
+    library.hedge_size = config.HEDGE_SIZE
+    library.availability = get_shared_availability()
+    library.fallback_seats = get_fallback_seats(seat_id_list)
 
     try:
         # 进行座位预约
-        success_message, user_info, fail_message = library.reserve_seat(seat_list=seat_id_list, begin_time=begin_time,
-                                                                        end_time=end_time)
-
+        return library.reserve_seat(seat_list=seat_id_list, begin_time=begin_time, end_time=end_time)
     except Exception as e:
         handle_reservation_error(e, reservation_item)
+        return None
+    finally:
+        if recorder is not None:
+            recorder.record(reservation_item["pid"], library.attempts)
+
+
+def save_reservation(db, result):
+    """
+    将预约结果写入数据库。
+
+    :param db: 数据库对象
+    :param result: run_reservation 的返回值
+    """
+    if result is None:
         return
+    success_message, user_info, fail_message = result
 
     if len(user_info) != 9:
         log(f"登录失败: {user_info}")
@@ -128,34 +179,466 @@ def reservation(db, reservation_item):
     insert_reservation_result(db, user_info["pid"], success_message, fail_message)
 
 
-def process_reservations(db):
+def timed_run_reservation(reservation_item, seat_id_list, vpn_manager, recorder=None):
     """
-    处理所有预约记录的执行流程：
-    1. 查询数据库中所有正在预约的记录。
-    2. 按优先级处理预约。
-    3. 为每个记录调用 reservation 函数进行处理。
+    执行 run_reservation 并记录开始、结束时间。
 
-    :param db: 数据库对象
-    :return: None
+    :param reservation_item: 包含预约信息的字典
+    :param seat_id_list: 座位设备 ID 列表
+    :param vpn_manager: VPNSessionManager 对象
+    :param recorder: 可选的 AttemptRecorder
+    :return: (result, start_time, finish_time)，时间为 time.time() 时间戳
     """
-    # 查询所有正在预约中的记录
-    active_reservations = db.get_all_active_reservations()
+    start_time = time.time()
+    try:
+        result = run_reservation(reservation_item, seat_id_list, vpn_manager, recorder)
+    finally:
+        finish_time = time.time()
+        log(f"学号 {reservation_item['pid']} 开始: {format_timestamp(start_time)}，"
+            f"结束: {format_timestamp(finish_time)}，耗时: {finish_time - start_time:.3f}s")
+    return result, start_time, finish_time
 
-    if not active_reservations:
-        log("没有正在预约中的记录")
+
+def format_timestamp(timestamp):
+    """
+    将时间戳格式化为精确到毫秒的时间字符串。
+
+    :param timestamp: time.time() 时间戳
+    :return: 形如 "20:00:00.123" 的字符串
+    """
+    return datetime.fromtimestamp(timestamp).strftime("%H:%M:%S.%f")[:-3]
+
+
+def log_timing_summary(timings):
+    """
+    汇总输出所有用户的开始、结束时间分布。
+
+    :param timings: [(pid, start_time, finish_time), ...]
+    """
+    if not timings:
         return
+    first_start = min(start for _, start, _ in timings)
+    last_start = max(start for _, start, _ in timings)
+    last_finish = max(finish for _, _, finish in timings)
+    log(f"共 {len(timings)} 个用户，首个开始: {format_timestamp(first_start)}，"
+        f"最后开始: {format_timestamp(last_start)}，最后结束: {format_timestamp(last_finish)}，"
+        f"开始时间跨度: {last_start - first_start:.3f}s，总耗时: {last_finish - first_start:.3f}s")
 
-    # 按优先级从大到小排序预约记录
-    active_reservations = sorted(active_reservations, key=lambda x: x["priority"], reverse=True)
 
-    log("-------"*10)
+def iter_jobs(catalog, active_reservations, stats=None):
+    """
+    逐个解析预约记录的座位 ID，解析失败的记录会被跳过。
+
+    :param catalog: 已加载的 DeviceCatalog 对象
+    :param active_reservations: 按优先级排序的预约记录（可迭代对象）
+    :param stats: 可选的 SeatStats，按历史成功率在 SEAT_REORDER_TOLERANCE 范围内调整座位顺序
+    :return: 生成器，元素为 (reservation_item, seat_id_list)
+    """
     for reservation_item in active_reservations:
+        try:
+            seat_id_list = get_reservation_seat_ids(catalog, reservation_item)
+            if stats is not None:
+                seat_id_list = stats.reorder(seat_id_list, config.SEAT_REORDER_TOLERANCE)
+            yield reservation_item, seat_id_list
+        except Exception as e:
+            handle_reservation_error(e, reservation_item)
+
+
+def prepare_jobs(db, active_reservations, planning=True):
+    """
+    在主线程中查好所有用户的座位 ID，并统一规划座位顺序。
+
+    全局座位分配需要先读完所有记录；不做规划时返回生成器，读到一条记录就可以调度一条。
+
+    :param db: 数据库对象
+    :param active_reservations: 按优先级排序的预约记录（可迭代对象）
+    :param planning: 是否进行全局座位分配（见 plan_seat_assignment）
+    :return: [(reservation_item, seat_id_list), ...] 或同样元素的生成器，保持优先级顺序
+    """
+    # 一次性加载座位目录，之后的名称解析都在内存中完成
+    device_catalog.refresh(db)
+
+    # 按历史成功率调整座位顺序（默认关闭）
+    stats = None
+    if config.SEAT_REORDER_TOLERANCE > 0:
+        stats = SeatStats.from_db(db)
+        log(f"按历史成功率调整座位顺序，最多后移 {config.SEAT_REORDER_TOLERANCE} 位，{len(stats.seats)} 个座位有统计")
+
+    jobs = iter_jobs(device_catalog, active_reservations, stats)
+    if planning:
+        jobs = list(jobs)
+        plan, deferred = plan_seat_assignment([(reservation_item["pid"], reservation_item["priority"], seat_id_list)
+                                               for reservation_item, seat_id_list in jobs])
+        # 没有独占首选座位的用户排在最后，串行模式下等其他用户预约完成后再请求；
+        # 并发和两阶段模式下只是最后提交，仍可能与分配到同一座位的用户同时请求
+        jobs = [(reservation_item, plan[reservation_item["pid"]]) for reservation_item, _ in jobs
+                if reservation_item["pid"] not in deferred] + \
+               [(reservation_item, plan[reservation_item["pid"]]) for reservation_item, _ in jobs
+                if reservation_item["pid"] in deferred]
+        log(f"座位规划完成: {len(jobs)} 个用户，{len(jobs) - len(deferred)} 个分配到互不冲突的首选座位，"
+            f"{len(deferred)} 个没有独占的首选座位（排在最后）")
+    return jobs
+
+
+def process_sequentially(db, jobs, vpn_manager, recorder=None):
+    """
+    按优先级顺序逐个处理预约。
+
+    :param db: 数据库对象
+    :param jobs: prepare_jobs 的返回值
+    :param vpn_manager: VPNSessionManager 对象
+    :param recorder: 可选的 AttemptRecorder
+    :return: [(pid, start_time, finish_time), ...]
+    """
+    timings = []
+    for reservation_item, seat_id_list in jobs:
         try:
             log("\n\n")
             log(f"预约学号: {reservation_item['pid']},优先级: {reservation_item['priority']}")
-            reservation(db, reservation_item)
+            result, start_time, finish_time = timed_run_reservation(reservation_item, seat_id_list, vpn_manager,
+                                                                    recorder)
+            timings.append((reservation_item["pid"], start_time, finish_time))
+            save_reservation(db, result)
         except Exception as e:
             handle_reservation_error(e, reservation_item)
+    return timings
+
+
+def process_concurrently(db, jobs, vpn_manager, workers, recorder=None):
+    """
+    使用线程池并发处理预约。
+
+    任务按优先级顺序提交到线程池，保证高优先级用户先被调度；
+    数据库对象只在主线程中使用，预约完成后由主线程写入结果。
+
+    :param db: 数据库对象
+    :param jobs: prepare_jobs 的返回值
+    :param vpn_manager: VPNSessionManager 对象
+    :param workers: 线程数
+    :param recorder: 可选的 AttemptRecorder
+    :return: [(pid, start_time, finish_time), ...]
+    """
+    timings = []
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {}
+        for reservation_item, seat_id_list in jobs:
+            log(f"提交预约 学号: {reservation_item['pid']},优先级: {reservation_item['priority']}")
+            future = executor.submit(timed_run_reservation, reservation_item, seat_id_list, vpn_manager, recorder)
+            futures[future] = reservation_item
+
+        for future in as_completed(futures):
+            reservation_item = futures[future]
+            try:
+                result, start_time, finish_time = future.result()
+                timings.append((reservation_item["pid"], start_time, finish_time))
+                save_reservation(db, result)
+            except Exception as e:
+                handle_reservation_error(e, reservation_item)
+    return timings
+
+
+def arm_reservation(reservation_item, seat_id_list, vpn_manager):
+    """
+    预热阶段：在放座之前完成图书馆登录、获取用户信息，并构造好所有预约请求数据。
+    配置了 ROOM_IDS 时在预热阶段查询座位占用，去掉放座前已被占用的座位，发射阶段不再查询。
+
+    :param reservation_item: 包含预约信息的字典
+    :param seat_id_list: 座位设备 ID 列表
+    :param vpn_manager: VPNSessionManager 对象
+    :return: (library, user_info, resv_data_list, fallback_data_list)，失败返回 None
+    """
+    shared_session = vpn_manager.new_session()
+    if shared_session is None:
+        log(f"VPN 登录失败，无法继续预约")
+        return None
+
+    library = LibrarySystem(reservation_item["logonName"], reservation_item["password"])
+    library.session = shared_session
+    library.vpn_manager = vpn_manager
+    library.hedge_size = config.HEDGE_SIZE
+
+    user_info = library.get_user_info()
+    if not user_info:
+        log(f"登录失败: 学号 {reservation_item['pid']}")
+        return None
+
+    resv_begin_time, resv_end_time = library.get_reservation_time(reservation_item["begin_time"],
+                                                                  reservation_item["end_time"])
+    fallback_seats = get_fallback_seats(seat_id_list)
+    availability = get_shared_availability()
+    if availability is not None:
+        seat_id_list = availability.filter_seats(library, seat_id_list, resv_begin_time, resv_end_time)
+        fallback_seats = availability.filter_seats(library, fallback_seats, resv_begin_time, resv_end_time)
+    resv_data_list = [library.build_resv_data(user_info, seat_id, resv_begin_time, resv_end_time)
+                      for seat_id in seat_id_list]
+    fallback_data_list = [library.build_resv_data(user_info, seat_id, resv_begin_time, resv_end_time)
+                          for seat_id in fallback_seats]
+    return library, user_info, resv_data_list, fallback_data_list
+
+
+def fire_reservation(armed, fire_event):
+    """
+    发射阶段：等待发射信号后立即提交预先构造好的预约请求。
+
+    :param armed: arm_reservation 的返回值
+    :param fire_event: threading.Event，到达发射时间时由主线程触发
+    :return: (success_message, user_info, fail_message)
+    """
+    library, user_info, resv_data_list, fallback_data_list = armed
+    if not resv_data_list and not fallback_data_list:
+        return "无已预约结果", user_info, ["所选座位均已被占用"]
+    fire_event.wait()
+    success_message, fail_message = library.reserve_with_fallback(resv_data_list, fallback_data_list)
+    return success_message, user_info, fail_message
+
+
+def parse_fire_time(fire_time):
+    """
+    解析发射时间，支持精确到秒或毫秒。
+
+    :param fire_time: 形如 "20:00:00" 或 "20:00:00.000" 的时间字符串
+    :return: datetime.time 对象
+    """
+    time_format = "%H:%M:%S.%f" if "." in fire_time else "%H:%M:%S"
+    return datetime.strptime(fire_time, time_format).time()
+
+
+def get_fire_timestamp(fire_time):
+    """
+    将发射时间转换为最近一次该时刻的时间戳。
+
+    发射时刻在午夜之后、任务在前一天启动时（例如 FIRE_TIME 为 00:00:05，23:59 启动），
+    当天的该时刻已过去十几个小时，应取第二天；刚过去不久的时刻仍取当天，由调用方立即发射。
+
+    :param fire_time: 形如 "20:00:00" 或 "20:00:00.000" 的时间字符串
+    :return: time.time() 时间戳
+    """
+    clock = parse_fire_time(fire_time)
+    now = datetime.now()
+    fire_at = datetime.combine(now.date(), clock)
+    if (now - fire_at).total_seconds() > 12 * 3600:
+        fire_at += timedelta(days=1)
+    return fire_at.timestamp()
+
+
+def wait_until(target_time):
+    """
+    阻塞到指定时间戳。距离目标较远时休眠，最后 20ms 内自旋以提高精度。
+
+    :param target_time: time.time() 时间戳
+    """
+    while True:
+        remaining = target_time - time.time()
+        if remaining <= 0:
+            return
+        if remaining > 0.02:
+            time.sleep(remaining - 0.02)
+
+
+def process_armed(db, jobs, vpn_manager, fire_timestamp, workers, recorder=None):
+    """
+    两阶段预约：放座前完成所有用户的登录（预热），到达发射时间后所有用户同时提交预约请求。
+
+    :param db: 数据库对象
+    :param jobs: prepare_jobs 的返回值
+    :param vpn_manager: VPNSessionManager 对象
+    :param fire_timestamp: 发射时刻（本机 time.time() 时间戳）
+    :param workers: 预热阶段的并发线程数
+    :param recorder: 可选的 AttemptRecorder
+    :return: [(pid, start_time, finish_time), ...]
+    """
+    log(f"两阶段预约模式，发射时间: {format_timestamp(fire_timestamp)}")
+
+    # 发射时所有用户同时请求（每人最多 HEDGE_SIZE 个），连接池要能保留这么多连接
+    jobs = list(jobs)
+    ensure_pool_size(len(jobs) * max(1, config.HEDGE_SIZE))
+
+    # 预热阶段
+    armed_list = []
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        futures = [(reservation_item, executor.submit(arm_reservation, reservation_item, seat_id_list, vpn_manager))
+                   for reservation_item, seat_id_list in jobs]
+        for reservation_item, future in futures:
+            try:
+                armed = future.result()
+                if armed:
+                    armed_list.append((reservation_item, armed))
+            except Exception as e:
+                handle_reservation_error(e, reservation_item)
+
+    log(f"预热完成: {len(armed_list)}/{len(futures)} 个用户，"
+        f"距发射还有 {fire_timestamp - time.time():.3f}s")
+    if not armed_list:
+        return []
+    if time.time() > fire_timestamp:
+        log("预热完成时已超过发射时间，立即发射")
+
+    # 发射阶段：每个用户一个线程，按优先级顺序等待同一个发射信号
+    fire_event = threading.Event()
+    timings = []
+    with ThreadPoolExecutor(max_workers=len(armed_list)) as executor:
+        futures = [(reservation_item, armed, executor.submit(fire_reservation, armed, fire_event))
+                   for reservation_item, armed in armed_list]
+        wait_until(fire_timestamp)
+        fire_event.set()
+
+        for reservation_item, armed, future in futures:
+            try:
+                result = future.result()
+                save_reservation(db, result)
+            except Exception as e:
+                handle_reservation_error(e, reservation_item)
+
+            attempts = armed[0].attempts
+            if recorder is not None:
+                recorder.record(reservation_item["pid"], attempts)
+            for attempt in attempts:
+                returned = "无响应" if attempt["returned_at"] is None else \
+                    f"{(attempt['returned_at'] - fire_timestamp) * 1000:.1f}ms"
+                log(f"学号 {reservation_item['pid']} 座位 {attempt['devId']} "
+                    f"发出: T0+{(attempt['sent_at'] - fire_timestamp) * 1000:.1f}ms，返回: T0+{returned}")
+            if attempts:
+                finish_time = max(attempt["returned_at"] or attempt["sent_at"] for attempt in attempts)
+                timings.append((reservation_item["pid"], attempts[0]["sent_at"], finish_time))
+    return timings
+
+
+def process_async(db, jobs, recorder=None):
+    """
+    使用 asyncio 在单个事件循环中并发处理所有用户的预约，所有用户共用一个连接池和一次 VPN 登录。
+
+    :param db: 数据库对象
+    :param jobs: prepare_jobs 的返回值
+    :param recorder: 可选的 AttemptRecorder
+    :return: [(pid, start_time, finish_time), ...]
+    """
+    # aiohttp 仅在异步模式下需要
+    from utils.async_system import run_reservations
+
+    results = asyncio.run(run_reservations(jobs, config.VPN_USERNAME, config.VPN_PASSWORD,
+                                           pool_size=config.ASYNC_POOL_SIZE, hedge_size=config.HEDGE_SIZE,
+                                           recorder=recorder))
+    timings = []
+    for reservation_item, result, start_time, finish_time in results:
+        log(f"学号 {reservation_item['pid']} 开始: {format_timestamp(start_time)}，"
+            f"结束: {format_timestamp(finish_time)}，耗时: {finish_time - start_time:.3f}s")
+        timings.append((reservation_item["pid"], start_time, finish_time))
+        try:
+            save_reservation(db, result)
+        except Exception as e:
+            handle_reservation_error(e, reservation_item)
+    return timings
+
+
+def save_attempts(db, recorder):
+    """
+    将本次运行收集到的预约请求记录批量写入数据库，写入失败不影响预约结果。
+
+    :param db: 数据库对象
+    :param recorder: AttemptRecorder 对象
+    """
+    try:
+        count = recorder.flush(db)
+        log(f"预约请求记录已保存: 运行 {recorder.run_id}，共 {count} 条")
+        if recorder.fallback_users:
+            log(f"相邻座位备选: {recorder.fallback_users} 个用户所选座位全部失败，"
+                f"其中 {recorder.fallback_wins} 个靠相邻座位预约成功")
+    except Exception as e:
+        log(f"保存预约请求记录失败: {e}")
+
+
+def save_run(db, recorder, started_at):
+    """
+    记录本次运行的概况和各阶段耗时（包括运行前在同一进程中完成的 VPN 登录、时钟校准），写入失败不影响预约结果。
+
+    :param db: 数据库对象
+    :param recorder: AttemptRecorder 对象
+    :param started_at: 运行开始时间戳
+    """
+    phase_timings = phase_metrics.drain()
+    if phase_timings:
+        log(f"各阶段耗时: {format_summary(phase_timings)}")
+    try:
+        db.insert_reservation_run(recorder.run_id, started_at, time.time(), recorder.users, phase_timings)
+    except Exception as e:
+        log(f"保存运行记录失败: {e}")
+
+
+def process_reservations(db, workers=None, fire_time=None, vpn_manager=None, fire_timestamp=None):
+    """
+    处理所有预约记录的执行流程：
+    1. 查询数据库中所有正在预约的记录。
+    2. 按优先级统一规划每个用户的座位顺序，避免自己人互相抢同一个座位。
+    3. 登录一次 VPN，所有用户共用该次登录的 webvpn Cookie。
+    4. 串行、线程池并发、asyncio 异步或两阶段方式为每个记录进行预约。
+    5. 输出每个用户的开始、结束时间及整体分布。
+    6. 将本次运行的所有预约请求一次性写入 reservation_attempts 表，各阶段耗时写入 reservation_runs 表。
+
+    :param db: 数据库对象
+    :param workers: 并发线程数，默认读取 config.RESERVE_WORKERS，1 表示串行
+    :param fire_time: 两阶段预约的发射时间，默认读取 config.FIRE_TIME，为空时登录后立即预约
+    :param vpn_manager: 可选的 VPNSessionManager 对象，默认新建一个
+    :param fire_timestamp: 可选，两阶段预约的发射时刻（时间戳），指定时忽略 fire_time；
+                           常驻调度进程已算好校正后的绝对时刻，不经过时间字符串转换，避免跨午夜时算错日期
+    :return: None
+    """
+    if workers is None:
+        workers = config.RESERVE_WORKERS
+    if fire_timestamp is None:
+        if fire_time is None:
+            fire_time = config.FIRE_TIME
+        if fire_time:
+            fire_timestamp = get_fire_timestamp(fire_time)
+
+    # 按优先级从大到小逐条读取正在预约中的记录
+    active_reservations = db.iter_active_reservations()
+    first_reservation = next(active_reservations, None)
+
+    if first_reservation is None:
+        log("没有正在预约中的记录")
+        return
+    active_reservations = itertools.chain([first_reservation], active_reservations)
+
+    recorder = AttemptRecorder()
+    started_at = time.time()
+
+    if config.RESERVE_ASYNC and fire_timestamp is None:
+        log("-------"*10)
+        log(f"异步预约模式，连接池大小: {config.ASYNC_POOL_SIZE}")
+        jobs = prepare_jobs(db, active_reservations, planning=config.SEAT_PLANNING)
+        try:
+            log_timing_summary(process_async(db, jobs, recorder))
+        finally:
+            save_attempts(db, recorder)
+            save_run(db, recorder, started_at)
+        log("-------"*10)
+        return
+
+    # 所有用户共用一次 VPN 登录
+    if vpn_manager is None:
+        vpn_manager = VPNSessionManager()
+    if not vpn_manager.login():
+        log("VPN 登录失败，无法继续预约")
+        save_run(db, recorder, started_at)
+        return
+
+    log("-------"*10)
+    jobs = prepare_jobs(db, active_reservations, planning=config.SEAT_PLANNING)
+    try:
+        if fire_timestamp is not None:
+            timings = process_armed(db, jobs, vpn_manager, fire_timestamp, workers, recorder)
+        elif workers > 1:
+            log(f"并发预约模式，线程数: {workers}")
+            timings = process_concurrently(db, jobs, vpn_manager, workers, recorder)
+        else:
+            timings = process_sequentially(db, jobs, vpn_manager, recorder)
+    finally:
+        save_attempts(db, recorder)
+        save_run(db, recorder, started_at)
+    log_timing_summary(timings)
+    stats = get_transport_stats()
+    log(f"HTTP 请求 {stats['requests']} 次，新建连接 {stats['new_connections']} 次，"
+        f"复用连接 {stats['reused_connections']} 次")
     log("-------"*10)
 
 def main():
@@ -166,6 +649,9 @@ def main():
 
     try:
         process_reservations(db)
+        # 本次运行的写入全部写回数据库文件
+        if config.DB_WAL:
+            db.checkpoint()
     finally:
         # 确保数据库连接被关闭
         db.close()
@@ -0,0 +1,95 @@
+#linux:  #!/www/wwwroot/RemoteLibrary/.venv/bin/python
+from scheduled_task import process_reservations, format_timestamp, parse_fire_time, log
+from utils.library_database import LibraryDatabase
+from utils.library_system import LibrarySystem
+from utils.vpn_session import VPNSessionManager
+from utils.clock_sync import ClockSync
+from utils import config
+from datetime import datetime, timedelta
+import time
+
+
+def get_next_release(now=None):
+    """
+    计算下一次放座时刻（服务器时间）。若距今天的放座时刻已不足预热时间，则取明天。
+
+    :param now: 当前时间戳，默认为 time.time()
+    :return: time.time() 时间戳
+    """
+    now = time.time() if now is None else now
+    clock = parse_fire_time(config.FIRE_TIME)
+    release = datetime.combine(datetime.fromtimestamp(now).date(), clock)
+    if release.timestamp() - config.DAEMON_ARM_LEAD < now:
+        release += timedelta(days=1)
+    return release.timestamp()
+
+
+def estimate_clock_offset(vpn_manager):
+    """
+    通过已登录 webvpn 的会话请求图书馆公钥接口，估计与图书馆服务器的时钟偏差。
+
+    :param vpn_manager: VPNSessionManager 对象
+    :return: (offset, uncertainty)，失败时返回 (0, None)
+    """
+    session = vpn_manager.new_session()
+    if session is None:
+        log("VPN 登录失败，无法校准时钟，按本机时间执行")
+        return 0, None
+
+    library = LibrarySystem(None, None)
+    library.session = session
+    clock = ClockSync(library, library.public_key_url, max_rtt=config.CLOCK_SYNC_MAX_RTT)
+    offset, uncertainty = clock.sync(config.CLOCK_SYNC_SAMPLES)
+    if offset is None:
+        log("时钟校准失败，按本机时间执行")
+        return 0, None
+    log(f"时钟偏差(服务器-本机): {offset * 1000:+.1f}ms，误差: ±{uncertainty * 1000:.1f}ms，"
+        f"有效样本: {len(clock.samples)}，最小往返: {clock.min_rtt * 1000:.1f}ms")
+    return offset, uncertainty
+
+
+def run_once(release_timestamp):
+    """
+    执行一次预约：校准时钟后，以校正后的本机时间作为两阶段预约的发射时间。
+
+    :param release_timestamp: 放座时刻（服务器时间）时间戳
+    """
+    # 校准时钟与预约共用同一次 VPN 登录
+    vpn_manager = VPNSessionManager()
+    offset, _ = estimate_clock_offset(vpn_manager)
+    fire_timestamp = release_timestamp - offset
+    log(f"放座时刻: {format_timestamp(release_timestamp)}，校正后本机发射时刻: {format_timestamp(fire_timestamp)}")
+
+    db = LibraryDatabase()
+    try:
+        process_reservations(db, fire_timestamp=fire_timestamp, vpn_manager=vpn_manager)
+    finally:
+        db.close()
+
+
+def main():
+    """
+    常驻调度进程：保持解释器和依赖模块常驻内存，每天在放座前 DAEMON_ARM_LEAD 秒醒来，
+    校准时钟并执行两阶段预约，避免定时任务在关键时刻才启动进程。
+    """
+    if not config.FIRE_TIME:
+        log("未配置 FIRE_TIME，常驻调度进程无法确定放座时刻")
+        return
+
+    while True:
+        release_timestamp = get_next_release()
+        wake_timestamp = release_timestamp - config.DAEMON_ARM_LEAD
+        log(f"下一次放座: {datetime.fromtimestamp(release_timestamp)}，将于 {datetime.fromtimestamp(wake_timestamp)} 开始预热")
+        while time.time() < wake_timestamp:
+            time.sleep(max(0, min(60, wake_timestamp - time.time())))
+
+        try:
+            run_once(release_timestamp)
+        except Exception as e:
+            log(f"本次预约出现异常: {str(e)}")
+        # 避免同一放座时刻重复执行
+        time.sleep(max(0, release_timestamp + 1 - time.time()))
+
+
+if __name__ == "__main__":
+    main()
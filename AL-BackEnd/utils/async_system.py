@@ -0,0 +1,532 @@
+from http.cookies import Morsel
+import asyncio
+import time
+
+import aiohttp
+from yarl import URL
+
+from utils import config
+from utils.attempt_log import new_attempt, mark_cancelled, OUTCOME_SUCCESS, OUTCOME_REJECTED, OUTCOME_HTTP_ERROR
+from utils.library_system import LibrarySystem
+from utils.password_encryptor import PasswordEncryptor
+from utils.phase_metrics import (phase_metrics, PHASE_VPN_INITIAL_PAGE, PHASE_VPN_FORM_EXTRACT,
+                                 PHASE_VPN_AES_ENCRYPT, PHASE_VPN_LOGIN_POST, PHASE_INITIAL_COOKIE,
+                                 PHASE_PUBLIC_KEY, PHASE_RSA_ENCRYPT, PHASE_LOGIN_POST, PHASE_RESERVE_POST)
+from utils.transport import DEFAULT_HEADERS
+from utils.vpn_session import VPN_LOGIN_MARKERS
+from utils.vpn_system import VPNSystem
+
+def log(*args):
+    """
+    统一打印日志函数。
+
+    :param args: 打印的内容
+    :return: None
+    """
+    # print(*args)
+    pass
+
+WEBVPN_URL = URL("https://webvpn.njfu.edu.cn/")
+
+
+def client_timeout(timeout):
+    """
+    将 (连接超时, 读取超时) 转换为 aiohttp.ClientTimeout，含义与 requests 的 timeout 参数相同（不限制总时长）。
+
+    :param timeout: (连接超时, 读取超时)
+    :return: aiohttp.ClientTimeout 对象
+    """
+    connect_timeout, read_timeout = timeout
+    return aiohttp.ClientTimeout(total=None, sock_connect=connect_timeout, sock_read=read_timeout)
+
+
+# 与同步流程相同的超时：登录等请求使用 LOGIN_TIMEOUT（Session 默认值），预约和取消请求使用 RESERVE_TIMEOUT
+LOGIN_CLIENT_TIMEOUT = client_timeout(config.LOGIN_TIMEOUT)
+RESERVE_CLIENT_TIMEOUT = client_timeout(config.RESERVE_TIMEOUT)
+
+class AsyncBaseSystem:
+    def __init__(self, username, password, base_url, vpn_suffix, session):
+        """
+        基于 asyncio 的基础系统类，与 BaseSystem 对应。
+
+        :param username: 用户名
+        :param password: 密码
+        :param base_url: 基础 URL
+        :param vpn_suffix: VPN 后缀
+        :param session: aiohttp.ClientSession 对象，多个用户的 Session 共用同一个连接池
+        """
+        self.session = session
+        self.username = username
+        self.password = password
+        self.base_url = base_url
+        self.vpn_suffix = vpn_suffix
+
+    async def get_response(self, url, params=None, timeout=None):
+        """
+        通用 GET 请求方法。响应体在返回前已读取完毕，可直接调用 text()/json()。
+
+        :param url: 请求的 URL
+        :param params: 请求参数
+        :param timeout: aiohttp.ClientTimeout 对象，默认使用 Session 的默认超时
+        :return: 响应对象
+        """
+        try:
+            async with self.session.get(url, params=params, timeout=timeout) as response:
+                await response.read()
+            log(f"请求 {url} 的响应状态码:", response.status)
+            return response
+        except Exception as e:
+            log(f"请求 {url} 时发生异常:", str(e))
+            return None
+
+    async def post_request(self, url, data=None, json=None, timeout=None):
+        """
+        通用 POST 请求方法。响应体在返回前已读取完毕，可直接调用 text()/json()。
+
+        :param url: 请求的 URL
+        :param data: 表单数据
+        :param json: JSON 数据
+        :param timeout: aiohttp.ClientTimeout 对象，默认使用 Session 的默认超时
+        :return: 响应对象
+        """
+        try:
+            async with self.session.post(url, data=data, json=json, timeout=timeout) as response:
+                await response.read()
+            log(f"请求 {url} 的响应状态码:", response.status)
+            return response
+        except Exception as e:
+            log(f"请求 {url} 时发生异常:", str(e))
+            return None
+
+
+class AsyncVPNSystem(AsyncBaseSystem):
+    def __init__(self, username, password, session):
+        super().__init__(username, password, VPNSystem.BASE_URL, VPNSystem.VPN_SUFFIX, session)
+
+    async def vpn_login(self):
+        """
+        登录 VPN，流程与 VPNSystem.vpn_login 相同。
+
+        :return: 登录成功返回 True，失败返回 False
+        """
+        login_url = f"{self.base_url}authserver/login"
+        params = {'service': 'https://webvpn.njfu.edu.cn/rump_frontend/loginFromCas/'}
+
+        # 获取初始页面
+        with phase_metrics.timer(PHASE_VPN_INITIAL_PAGE):
+            response = await self.get_response(login_url, params=params)
+        if response is None or response.status != 200:
+            log("VPN初始页面获取失败")
+            return False
+
+        # 提取表单元素
+        html_text = await response.text()
+        with phase_metrics.timer(PHASE_VPN_FORM_EXTRACT):
+            form_elements = VPNSystem.extract_form_elements(html_text)
+        if not form_elements:
+            return False
+
+        salt, lt = form_elements
+
+        # 加密密码
+        with phase_metrics.timer(PHASE_VPN_AES_ENCRYPT):
+            encrypted_password = PasswordEncryptor.aes_encrypt_password(salt, self.password)
+        if not encrypted_password:
+            return False
+
+        # 提交登录请求
+        data = {
+            'username': self.username,
+            'password': encrypted_password,
+            'lt': lt,
+            'dllt': 'userNamePasswordLogin',
+            'execution': 'e1s1',
+            '_eventId': 'submit',
+            'rmShown': '1'
+        }
+        with phase_metrics.timer(PHASE_VPN_LOGIN_POST):
+            response = await self.post_request(login_url, data=data)
+
+        if response is not None and "frontend/login/index.html" in str(response.url):
+            log("VPN登录成功")
+            return True
+
+        log("VPN登录失败")
+        return False
+
+
+class AsyncLibrarySystem(AsyncBaseSystem):
+    def __init__(self, username, password, session, vpn_manager=None):
+        super().__init__(username, password, LibrarySystem.BASE_URL, LibrarySystem.VPN_SUFFIX, session)
+        self.index_url = LibrarySystem.INDEX_URL
+        self.public_key_url = LibrarySystem.PUBLIC_KEY_URL
+        self.login_url = LibrarySystem.LOGIN_URL
+        self.reserve_url = LibrarySystem.RESERVE_URL
+        self.cancel_url = LibrarySystem.CANCEL_URL
+        # 可选的 AsyncVPNSessionManager，webvpn Cookie 失效时用于自动重新登录
+        self.vpn_manager = vpn_manager
+        # 每次预约请求的记录: {"devId", "sent_at", "returned_at", "outcome", "status", "result"}
+        self.attempts = []
+        # 同时并发请求的座位数，1 表示按顺序逐个尝试
+        self.hedge_size = 1
+
+    async def get_initial_cookie(self):
+        """
+        获取初始 Cookie 以建立会话。
+
+        :return: 成功返回 True，失败返回 False
+        """
+        with phase_metrics.timer(PHASE_INITIAL_COOKIE):
+            response = await self.get_response(self.index_url)
+        if self.vpn_manager and self.vpn_manager.is_rejected(response):
+            log("webvpn Cookie 已失效，重新登录 VPN")
+            if not await self.vpn_manager.refresh(self.session):
+                return False
+            response = await self.get_response(self.index_url)
+        if response is None or response.status != 200:
+            log("图书馆首页访问失败")
+            return False
+        return True
+
+    async def get_public_key(self):
+        """
+        获取登录所需的公钥和随机字符串。
+
+        :return: (public_key, nonce) 或 (None, None)
+        """
+        with phase_metrics.timer(PHASE_PUBLIC_KEY):
+            response = await self.get_response(self.public_key_url)
+        if response is None or response.status != 200:
+            log("获取公钥失败")
+            return None, None
+        try:
+            key_data = await response.json(content_type=None)
+            if key_data.get('code') != 0:
+                log("公钥数据异常")
+                return None, None
+            return key_data['data']['publicKey'], key_data['data']['nonceStr']
+        except Exception as e:
+            log("获取公钥时发生异常:", str(e))
+            return None, None
+
+    async def perform_login(self, public_key, nonce):
+        """
+        加密密码并发送登录请求。
+
+        :param public_key: 公钥
+        :param nonce: 随机字符串
+        :return: 登录成功返回用户信息字典，失败返回 None
+        """
+        with phase_metrics.timer(PHASE_RSA_ENCRYPT):
+            encrypted_password = PasswordEncryptor.rsa_encrypt(public_key, f"{self.password};{nonce}")
+        login_data = {
+            "logonName": self.username,
+            "password": encrypted_password,
+            "captcha": "",
+            "privacy": True,
+        }
+        with phase_metrics.timer(PHASE_LOGIN_POST):
+            response = await self.post_request(self.login_url, json=login_data)
+        if response is None or response.status != 200:
+            log("图书馆登录请求失败")
+            return None
+        try:
+            login_result = await response.json(content_type=None)
+            if login_result.get('code') != 0:
+                log("图书馆登录失败:", login_result.get('message'))
+                return None
+            return login_result['data']
+        except Exception as e:
+            log("登录请求时发生异常:", str(e))
+            return None
+
+    def set_user_cookie(self, user_info):
+        """
+        设置用户相关的 Cookie。
+
+        :param user_info: 用户信息字典
+        """
+        value = (f"userid={user_info['accNo']};username={user_info['logonName']};"
+                 f"usernumber={user_info['cardNo']};token={user_info['token']}")
+        morsel = Morsel()
+        # 用户 Session 的 Cookie 罐关闭了 quote_cookie，值中的分号会与 requests 一样按原样发送
+        morsel.set('ic-cookie', value, value)
+        morsel['domain'] = 'njfu.edu.cn'
+        morsel['path'] = '/'
+        self.session.cookie_jar.update_cookies({'ic-cookie': morsel})
+
+    async def library_login(self):
+        """
+        登录图书馆系统，获取用户信息和登录状态。
+
+        :return: 成功返回用户信息字典，失败返回 None
+        """
+        if not await self.get_initial_cookie():
+            return None
+
+        public_key, nonce = await self.get_public_key()
+        if not public_key or not nonce:
+            return None
+
+        user_info = await self.perform_login(public_key, nonce)
+        if not user_info:
+            return None
+
+        self.set_user_cookie(user_info)
+        log("图书馆登录成功")
+        return user_info
+
+    async def get_user_info(self):
+        """
+        获取并返回用户信息。
+
+        :return: 用户信息字典，失败返回 None
+        """
+        user_info = await self.library_login()
+        if not user_info:
+            log("获取用户信息失败")
+            return None
+        return {key: user_info[key] for key in
+                ('uuid', 'accNo', 'pid', 'logonName', 'trueName', 'className', 'sex', 'deptName', 'token')}
+
+    async def submit_reservation(self, resv_data):
+        """
+        发送预约请求，并在 self.attempts 中记录本次请求的发出、返回时间。
+
+        :param resv_data: LibrarySystem.build_resv_data 构造的预约请求数据
+        :return: 成功返回预约结果字典，失败返回错误消息
+        """
+        seat_id = resv_data["resvDev"][0]
+        attempt = new_attempt(seat_id)
+        self.attempts.append(attempt)
+
+        with phase_metrics.timer(PHASE_RESERVE_POST):
+            response = await self.post_request(self.reserve_url, json=resv_data, timeout=RESERVE_CLIENT_TIMEOUT)
+        attempt["returned_at"] = time.time()
+        if response is None:
+            attempt["result"] = f"座位 {seat_id} 请求失败: 无响应"
+        elif response.status != 200:
+            attempt["outcome"] = OUTCOME_HTTP_ERROR
+            attempt["status"] = response.status
+            attempt["result"] = f"座位 {seat_id} 请求失败: 状态码 {response.status}"
+        else:
+            attempt["status"] = response.status
+            result = await response.json(content_type=None)
+            if result.get('code') != 0:
+                attempt["outcome"] = OUTCOME_REJECTED
+                attempt["result"] = result.get('message')
+            else:
+                attempt["outcome"] = OUTCOME_SUCCESS
+                attempt["result"] = {
+                    "message": result["message"],
+                    "resvName": result["data"]["resvName"],
+                    "roomName": result["data"]["resvDevInfoList"][0]["roomName"],
+                    "devName": result["data"]["resvDevInfoList"][0]["devName"],
+                    "uuid": result["data"].get("uuid"),
+                }
+        return attempt["result"]
+
+    async def cancel_reservation(self, resv_uuid):
+        """
+        取消一条已成功的预约。
+
+        :param resv_uuid: 预约的 uuid
+        :return: 成功返回 True，失败返回 False
+        """
+        try:
+            response = await self.post_request(self.cancel_url, json={"uuid": resv_uuid},
+                                               timeout=RESERVE_CLIENT_TIMEOUT)
+            if response is None or response.status != 200:
+                return False
+            # webvpn 可能以 200 返回 HTML 登录页，解析失败按取消失败处理，不影响已抢到的座位
+            return (await response.json(content_type=None)).get('code') == 0
+        except Exception as e:
+            log(f"取消预约 {resv_uuid} 时发生异常: {str(e)}")
+            return False
+
+    async def reserve_prepared(self, resv_data_list):
+        """
+        提交预先构造好的预约请求，每批同时提交 hedge_size 个，取排名最靠前的成功结果，多余的成功预约立即取消。
+
+        :param resv_data_list: 预约请求数据列表
+        :return: (预约结果信息, 失败消息列表)
+        """
+        fail_message = []
+        hedge_size = max(1, self.hedge_size)
+        for start in range(0, len(resv_data_list), hedge_size):
+            batch = resv_data_list[start:start + hedge_size]
+            results = await asyncio.gather(*(self.submit_reservation(resv_data) for resv_data in batch),
+                                           return_exceptions=True)
+            best = None
+            for resv_data, result in zip(batch, results):
+                seat_id = resv_data["resvDev"][0]
+                if isinstance(result, Exception):
+                    result = f"出现异常: {str(result)}"
+                if not isinstance(result, dict):
+                    log(f"座位 {seat_id} 预约失败: {result}")
+                    if result not in fail_message:
+                        fail_message.append(result)
+                elif best is None:
+                    best = result
+                elif result.get("uuid") and await self.cancel_reservation(result["uuid"]):
+                    mark_cancelled(self.attempts, result)
+                else:
+                    log(f"取消座位 {seat_id} 的多余预约失败")
+
+            if best is not None:
+                result_data = LibrarySystem.format_result(best)
+                log("预约信息:", result_data)
+                return result_data, fail_message
+
+        return "无已预约结果", fail_message
+
+    async def reserve_seat(self, seat_list, begin_time="10:30", end_time="22:00"):
+        """
+        尝试为指定的座位列表进行预约，流程与 LibrarySystem.reserve_seat 相同。
+
+        :param seat_list: 座位列表
+        :param begin_time: 预约开始时间，默认为 "10:30"
+        :param end_time: 预约结束时间，默认为 "22:00"
+        :return: 预约结果信息、用户信息、失败消息列表
+        """
+        try:
+            user_info = await self.get_user_info()
+            if not user_info:
+                return "无已预约结果", "无用户信息", ["获取用户信息失败"]
+
+            resv_begin_time, resv_end_time = LibrarySystem.get_reservation_time(begin_time, end_time)
+            resv_data_list = [LibrarySystem.build_resv_data(user_info, seat_id, resv_begin_time, resv_end_time)
+                              for seat_id in seat_list]
+            success_message, fail_message = await self.reserve_prepared(resv_data_list)
+            return success_message, user_info, fail_message
+        except Exception as e:
+            log(f"预约过程出现异常: {str(e)}")
+            return "无已预约结果", "无用户信息", [f"出现异常: {str(e)}"]
+
+
+class AsyncVPNSessionManager:
+    def __init__(self, username, password, pool_size=100):
+        """
+        asyncio 版本的 webvpn 会话管理类：所有用户共用一个连接池和一次 VPN 登录，
+        每个用户使用独立的 aiohttp.ClientSession 和 Cookie 罐。需在事件循环中创建。
+
+        :param username: VPN 用户名
+        :param password: VPN 密码
+        :param pool_size: 连接池大小
+        """
+        self.username = username
+        self.password = password
+        self.connector = aiohttp.TCPConnector(limit=pool_size)
+        self._vpn_session = self.new_client_session()
+        self._generation = 0
+        self._lock = asyncio.Lock()
+
+    def new_client_session(self):
+        """
+        创建一个共用连接池的 aiohttp.ClientSession。
+
+        :return: aiohttp.ClientSession 对象
+        """
+        return aiohttp.ClientSession(connector=self.connector, connector_owner=False, timeout=LOGIN_CLIENT_TIMEOUT,
+                                     headers=DEFAULT_HEADERS, cookie_jar=aiohttp.CookieJar(quote_cookie=False))
+
+    async def login(self):
+        """
+        登录 VPN。
+
+        :return: 登录成功返回 True，失败返回 False
+        """
+        async with self._lock:
+            return await self._do_login()
+
+    async def _do_login(self):
+        self._vpn_session.cookie_jar.clear()
+        if not await AsyncVPNSystem(self.username, self.password, self._vpn_session).vpn_login():
+            return False
+        self._generation += 1
+        return True
+
+    def _copy_cookies(self, session):
+        session.cookie_jar.update_cookies(self._vpn_session.cookie_jar.filter_cookies(WEBVPN_URL), WEBVPN_URL)
+        session.vpn_generation = self._generation
+
+    def new_session(self):
+        """
+        创建一个携带 webvpn Cookie 的用户 Session。
+
+        :return: aiohttp.ClientSession 对象
+        """
+        session = self.new_client_session()
+        self._copy_cookies(session)
+        return session
+
+    async def refresh(self, session):
+        """
+        webvpn 拒绝了 Session 中的 Cookie 时调用，重新登录并更新该 Session 的 Cookie。
+
+        :param session: 被拒绝的 aiohttp.ClientSession 对象
+        :return: 成功返回 True，失败返回 False
+        """
+        async with self._lock:
+            if getattr(session, "vpn_generation", 0) == self._generation:
+                if not await self._do_login():
+                    return False
+            self._copy_cookies(session)
+        return True
+
+    @staticmethod
+    def is_rejected(response):
+        """
+        判断响应是否说明 webvpn Cookie 已失效（被重定向回登录页面）。
+
+        :param response: 响应对象
+        :return: Cookie 失效返回 True
+        """
+        return response is not None and any(marker in str(response.url) for marker in VPN_LOGIN_MARKERS)
+
+    async def close(self):
+        """
+        关闭 VPN Session 和连接池。
+        """
+        await self._vpn_session.close()
+        await self.connector.close()
+
+
+async def run_reservations(jobs, vpn_username, vpn_password, pool_size=100, hedge_size=1, recorder=None):
+    """
+    在同一个事件循环中并发执行所有用户的预约流程。任务按 jobs 的顺序（即优先级）创建。
+
+    :param jobs: [(reservation_item, seat_id_list), ...]
+    :param vpn_username: VPN 用户名
+    :param vpn_password: VPN 密码
+    :param pool_size: 连接池大小
+    :param hedge_size: 每个用户同时并发请求的座位数
+    :param recorder: 可选的 AttemptRecorder，记录每个用户的预约请求
+    :return: [(reservation_item, result, start_time, finish_time), ...]，result 同 LibrarySystem.reserve_seat，
+             VPN 登录失败时返回空列表
+    """
+    vpn_manager = AsyncVPNSessionManager(vpn_username, vpn_password, pool_size)
+    try:
+        if not await vpn_manager.login():
+            log("VPN 登录失败，无法继续预约")
+            return []
+
+        async def run_one(reservation_item, seat_id_list):
+            start_time = time.time()
+            session = vpn_manager.new_session()
+            library = AsyncLibrarySystem(reservation_item["logonName"], reservation_item["password"],
+                                         session, vpn_manager)
+            library.hedge_size = hedge_size
+            try:
+                result = await library.reserve_seat(seat_id_list, reservation_item["begin_time"],
+                                                    reservation_item["end_time"])
+            finally:
+                await session.close()
+                if recorder is not None:
+                    recorder.record(reservation_item["pid"], library.attempts)
+            return reservation_item, result, start_time, time.time()
+
+        return await asyncio.gather(*(run_one(reservation_item, seat_id_list)
+                                      for reservation_item, seat_id_list in jobs))
+    finally:
+        await vpn_manager.close()
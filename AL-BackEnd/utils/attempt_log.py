@@ -0,0 +1,130 @@
+import threading
+import time
+import os
+from datetime import datetime
+
+from utils import config
+
+# 单次预约请求的结果代码
+OUTCOME_SUCCESS = "success"          # 预约成功
+OUTCOME_REJECTED = "rejected"        # 图书馆返回 code != 0（座位已被预约等）
+OUTCOME_HTTP_ERROR = "http_error"    # HTTP 状态码不是 200
+OUTCOME_NO_RESPONSE = "no_response"  # 超时、连接失败等未收到响应的情况
+OUTCOME_CANCELLED = "cancelled"      # 并发预约中多余的成功预约，已被取消
+
+def log(*args):
+    """
+    统一打印日志函数。
+
+    :param args: 打印的内容
+    :return: None
+    """
+    # print(*args)
+    pass
+
+def new_attempt(seat_id):
+    """
+    创建一条预约请求记录，发出时调用。
+
+    :param seat_id: 座位 ID
+    :return: {"devId", "sent_at", "returned_at", "outcome", "status", "result", "fallback"}
+    """
+    return {"devId": seat_id, "sent_at": time.time(), "returned_at": None,
+            "outcome": OUTCOME_NO_RESPONSE, "status": None, "result": None, "fallback": False}
+
+
+def is_seat_taken(message):
+    """
+    判断图书馆的拒绝消息是否表示座位已被别人预约（包含 config.SEAT_TAKEN_MARKERS 中的关键词）。
+
+    :param message: 拒绝消息
+    :return: 座位已被别人预约返回 True
+    """
+    return isinstance(message, str) and any(marker in message for marker in config.SEAT_TAKEN_MARKERS)
+
+
+def is_seat_failure(attempt):
+    """
+    判断请求失败是否只与座位本身有关（座位已被别人预约、请求失败或无响应），换一个座位可能成功；
+    已有预约、不在预约时间等与用户有关的拒绝换座位也不会成功。
+
+    :param attempt: 请求记录
+    :return: 与座位有关的失败返回 True
+    """
+    if attempt["outcome"] in (OUTCOME_HTTP_ERROR, OUTCOME_NO_RESPONSE):
+        return True
+    if attempt["outcome"] == OUTCOME_REJECTED:
+        return is_seat_taken(attempt["result"])
+    return False
+
+
+def mark_cancelled(attempts, result):
+    """
+    将多余的成功预约对应的请求记录标记为已取消。
+
+    :param attempts: 请求记录列表
+    :param result: 被取消的预约结果字典
+    :return: None
+    """
+    for attempt in attempts:
+        if attempt["result"] is result:
+            attempt["outcome"] = OUTCOME_CANCELLED
+            return
+
+
+class AttemptRecorder:
+    def __init__(self, run_id=None):
+        """
+        收集一次预约运行中所有用户的请求记录，运行结束后一次性写入 reservation_attempts 表，
+        预约过程中不产生任何数据库写入。可在多个线程中同时调用 record()。
+
+        :param run_id: 本次运行的 ID，默认由当前时间和进程号生成
+        """
+        self.run_id = run_id or f"{datetime.now().strftime('%Y%m%d%H%M%S')}-{os.getpid()}"
+        self.rows = []
+        # 记录过的用户数
+        self.users = 0
+        # 尝试了相邻座位的用户数，以及其中靠相邻座位预约成功的用户数
+        self.fallback_users = 0
+        self.fallback_wins = 0
+        self._lock = threading.Lock()
+
+    def record(self, pid, attempts):
+        """
+        记录一个用户的所有请求。
+
+        :param pid: 学号
+        :param attempts: LibrarySystem.attempts
+        :return: None
+        """
+        rows = []
+        used_fallback = won_fallback = False
+        for attempt in attempts:
+            if attempt.get("fallback"):
+                used_fallback = True
+                won_fallback = won_fallback or attempt.get("outcome") == OUTCOME_SUCCESS
+            returned_at = attempt["returned_at"]
+            latency = None if returned_at is None else round((returned_at - attempt["sent_at"]) * 1000, 3)
+            message = attempt["result"] if isinstance(attempt["result"], str) else None
+            rows.append((self.run_id, pid, attempt["devId"], attempt["sent_at"], returned_at, latency,
+                         attempt.get("outcome", OUTCOME_NO_RESPONSE), attempt.get("status"), message,
+                         int(attempt.get("fallback", False))))
+        with self._lock:
+            self.rows.extend(rows)
+            self.users += 1
+            self.fallback_users += used_fallback
+            self.fallback_wins += won_fallback
+
+    def flush(self, db):
+        """
+        将收集到的请求记录批量写入数据库并清空。
+
+        :param db: LibraryDatabase 对象
+        :return: 写入的记录数
+        """
+        with self._lock:
+            rows, self.rows = self.rows, []
+        if rows:
+            db.insert_reservation_attempts(rows)
+        log(f"运行 {self.run_id} 写入 {len(rows)} 条预约请求记录")
+        return len(rows)
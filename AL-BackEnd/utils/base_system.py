@@ -1,4 +1,4 @@
-import  requests
+from utils.transport import create_session
 
 def log(*args):
     """
@@ -20,45 +20,42 @@ class BaseSystem:
         :param base_url: 基础 URL
         :param vpn_suffix: VPN 后缀
         """
-        self.session = requests.Session()
+        # 共用连接池、带默认请求头和超时的 Session
+        self.session = create_session()
         self.username = username
         self.password = password
         self.base_url = base_url
         self.vpn_suffix = vpn_suffix
 
-        self.session.headers.update({
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-            "Accept": "application/json, text/plain, */*",
-            "Accept-Language": "zh-CN,zh;q=0.9",
-        })
-
-    def get_response(self, url, params=None):
+    def get_response(self, url, params=None, timeout=None):
         """
         通用 GET 请求方法。
 
         :param url: 请求的 URL
         :param params: 请求参数
+        :param timeout: 超时 (连接超时, 读取超时)，默认使用 Session 的默认超时
         :return: 响应对象
         """
         try:
-            response = self.session.get(url, params=params)
+            response = self.session.get(url, params=params, timeout=timeout)
             log(f"请求 {url} 的响应状态码:", response.status_code)
             return response
         except Exception as e:
             log(f"请求 {url} 时发生异常:", str(e))
             return None
 
-    def post_request(self, url, data=None, json=None):
+    def post_request(self, url, data=None, json=None, timeout=None):
         """
         通用 POST 请求方法。
 
         :param url: 请求的 URL
         :param data: 表单数据
         :param json: JSON 数据
+        :param timeout: 超时 (连接超时, 读取超时)，默认使用 Session 的默认超时
         :return: 响应对象
         """
         try:
-            response = self.session.post(url, data=data, json=json)
+            response = self.session.post(url, data=data, json=json, timeout=timeout)
             log(f"请求 {url} 的响应状态码:", response.status_code)
             return response
         except Exception as e:
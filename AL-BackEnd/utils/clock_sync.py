@@ -0,0 +1,118 @@
+from email.utils import parsedate_to_datetime
+import math
+import time
+
+def log(*args):
+    """
+    统一打印日志函数。
+
+    :param args: 打印的内容
+    :return: None
+    """
+    # print(*args)
+    pass
+
+class ClockSync:
+    def __init__(self, system, url, max_rtt=1.0):
+        """
+        根据 HTTP 响应头中的 Date 估计本机与服务器的时钟偏差。
+
+        Date 只精确到秒，因此每次请求只能得到偏差的一个区间：
+        服务器在 [发出, 返回] 之间的某一时刻生成 Date，所以 offset ∈ [Date - 返回时间, Date + 1 - 发出时间]。
+        多次请求的区间取交集，并让后续请求恰好落在预测的服务器整秒附近（二分），区间会迅速收窄。
+
+        :param system: BaseSystem 对象，通过其 get_response 发送请求
+        :param url: 用于探测的 URL，应选择响应快、无副作用的接口
+        :param max_rtt: 往返时间超过该值（秒）的样本直接丢弃
+        """
+        self.system = system
+        self.url = url
+        self.max_rtt = max_rtt
+        # offset = 服务器时间 - 本机时间
+        self.lower = -math.inf
+        self.upper = math.inf
+        self.min_rtt = math.inf
+        self.samples = []
+
+    @property
+    def offset(self):
+        """
+        当前估计的时钟偏差（秒），为区间中点。
+
+        :return: 偏差，尚无有效样本时返回 None
+        """
+        if math.isinf(self.lower) or math.isinf(self.upper):
+            return None
+        return (self.lower + self.upper) / 2
+
+    @property
+    def uncertainty(self):
+        """
+        当前估计的误差上限（秒），为区间宽度的一半。
+
+        :return: 误差上限，尚无有效样本时返回 None
+        """
+        if self.offset is None:
+            return None
+        return (self.upper - self.lower) / 2
+
+    def probe(self):
+        """
+        发送一次探测请求并更新偏差区间。
+
+        :return: 样本有效返回 True，否则返回 False
+        """
+        send_time = time.time()
+        response = self.system.get_response(self.url)
+        receive_time = time.time()
+        if response is None or "Date" not in response.headers:
+            log("探测请求失败或缺少 Date 响应头")
+            return False
+
+        rtt = receive_time - send_time
+        self.min_rtt = min(self.min_rtt, rtt)
+        # 往返时间过长的样本区间太宽，且可能经过了排队，直接丢弃
+        if rtt > self.max_rtt or rtt > self.min_rtt * 2 + 0.05:
+            log(f"丢弃往返时间过长的样本: {rtt * 1000:.1f}ms")
+            return False
+
+        server_second = parsedate_to_datetime(response.headers["Date"]).timestamp()
+        lower = server_second - receive_time
+        upper = server_second + 1 - send_time
+        self.samples.append((send_time, receive_time, server_second))
+
+        if lower > self.upper or upper < self.lower:
+            # 与已有区间矛盾（服务器或本机时钟发生跳变），重新开始估计
+            log("样本与已有区间矛盾，重新估计")
+            self.lower, self.upper = lower, upper
+        else:
+            self.lower = max(self.lower, lower)
+            self.upper = min(self.upper, upper)
+        return True
+
+    def next_probe_time(self):
+        """
+        计算下一次探测的发送时间，使请求中点恰好落在按当前估计预测的服务器整秒上。
+
+        :return: time.time() 时间戳
+        """
+        offset = self.offset
+        if offset is None:
+            return time.time()
+        half_rtt = self.min_rtt / 2
+        boundary = math.ceil(time.time() + 0.05 + half_rtt + offset)
+        return boundary - offset - half_rtt
+
+    def sync(self, samples=8):
+        """
+        连续探测多次以估计时钟偏差。
+
+        :param samples: 探测次数
+        :return: (offset, uncertainty)，全部失败时返回 (None, None)
+        """
+        for _ in range(samples):
+            delay = self.next_probe_time() - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            self.probe()
+        return self.offset, self.uncertainty
@@ -17,6 +17,59 @@ DB_NAME = os.path.join(PROJECT_ROOT, os.getenv("DB_NAME"))
 FOLDER_PATH = os.path.join(PROJECT_ROOT, os.getenv("FOLDER_PATH"))
 SERVER_IP = os.getenv("SERVER_IP")
 
+# 预约并发线程数，1 表示按优先级逐个串行预约
+RESERVE_WORKERS = int(os.getenv("RESERVE_WORKERS", "1"))
+# webvpn Cookie 有效时长（秒），超时后重新登录 VPN
+VPN_COOKIE_LIFETIME = int(os.getenv("VPN_COOKIE_LIFETIME", "1800"))
+# 两阶段预约的发射时间（如 "20:00:00"），为空时登录后立即预约
+FIRE_TIME = os.getenv("FIRE_TIME", "")
+# 是否在预约前统一规划所有用户的首选座位，避免自己人互相抢座
+SEAT_PLANNING = os.getenv("SEAT_PLANNING", "1") == "1"
+# 每个用户同时并发请求的座位数，1 表示按顺序逐个尝试
+HEDGE_SIZE = int(os.getenv("HEDGE_SIZE", "1"))
+# 是否使用 asyncio 异步模式预约（需安装 aiohttp），以及异步模式的连接池大小
+RESERVE_ASYNC = os.getenv("RESERVE_ASYNC", "0") == "1"
+ASYNC_POOL_SIZE = int(os.getenv("ASYNC_POOL_SIZE", "100"))
+# HTTP 连接池大小（默认与并发数匹配，两阶段预约时自动扩大到 用户数 × HEDGE_SIZE）、连接失败重试次数
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", str(max(10, RESERVE_WORKERS * HEDGE_SIZE))))
+HTTP_RETRIES = int(os.getenv("HTTP_RETRIES", "1"))
+# 登录类请求和预约请求的超时（秒），格式为 "连接超时,读取超时"
+LOGIN_TIMEOUT = tuple(float(t) for t in os.getenv("LOGIN_TIMEOUT", "5,15").split(","))
+RESERVE_TIMEOUT = tuple(float(t) for t in os.getenv("RESERVE_TIMEOUT", "3,10").split(","))
+
+# SQLite 并发访问：WAL 模式、忙等待超时（毫秒）、同步级别、页缓存大小（KB）、连接池被动检查点间隔（秒）
+DB_WAL = os.getenv("DB_WAL", "1") == "1"
+DB_BUSY_TIMEOUT = int(os.getenv("DB_BUSY_TIMEOUT", "5000"))
+DB_SYNCHRONOUS = os.getenv("DB_SYNCHRONOUS", "NORMAL")
+DB_CACHE_SIZE_KB = int(os.getenv("DB_CACHE_SIZE_KB", "8192"))
+DB_CHECKPOINT_INTERVAL = int(os.getenv("DB_CHECKPOINT_INTERVAL", "300"))
+# 常驻调度进程在放座前多少秒开始校准时钟和预热
+DAEMON_ARM_LEAD = int(os.getenv("DAEMON_ARM_LEAD", "120"))
+# 时钟校准的探测次数和允许的最大往返时间（秒）
+CLOCK_SYNC_SAMPLES = int(os.getenv("CLOCK_SYNC_SAMPLES", "8"))
+CLOCK_SYNC_MAX_RTT = float(os.getenv("CLOCK_SYNC_MAX_RTT", "1.0"))
+# 公告接口响应缓存的有效时长（秒），0 表示只在插入公告时失效
+ANNOUNCEMENT_CACHE_TTL = int(os.getenv("ANNOUNCEMENT_CACHE_TTL", "300"))
+# 预约结果缓存查询 reservation_result 表版本号的最小间隔（秒），0 表示每次请求都查询
+RESULT_CACHE_CHECK_INTERVAL = float(os.getenv("RESULT_CACHE_CHECK_INTERVAL", "1.0"))
+# /db/execute_sql 只读查询: 最多返回的行数、每次查询的耗时上限（秒）、每个连接缓存的预编译语句数
+SQL_MAX_ROWS = int(os.getenv("SQL_MAX_ROWS", "1000"))
+SQL_TIME_BUDGET = float(os.getenv("SQL_TIME_BUDGET", "2.0"))
+SQL_CACHED_STATEMENTS = int(os.getenv("SQL_CACHED_STATEMENTS", "128"))
+# 预约前查询座位占用情况的房间 ID（逗号分隔，为空则不查询），以及占用快照的有效时长（秒）
+ROOM_IDS = [room_id.strip() for room_id in os.getenv("ROOM_IDS", "").split(",") if room_id.strip()]
+AVAILABILITY_TTL = float(os.getenv("AVAILABILITY_TTL", "3"))
+# 查询座位占用的超时（秒），格式为 "连接超时,读取超时"；查询失败不重试，按未过滤的座位列表预约
+AVAILABILITY_TIMEOUT = tuple(float(t) for t in os.getenv("AVAILABILITY_TIMEOUT", "2,3").split(","))
+# 按历史成功率调整座位顺序: 每个座位最多后移的位置数（0 为不调整）、统计数据的半衰期（天）
+SEAT_REORDER_TOLERANCE = int(os.getenv("SEAT_REORDER_TOLERANCE", "0"))
+SEAT_STATS_HALF_LIFE_DAYS = float(os.getenv("SEAT_STATS_HALF_LIFE_DAYS", "7"))
+# 所选座位全部失败后继续尝试的相邻座位数（0 为不尝试）
+FALLBACK_NEIGHBORS = int(os.getenv("FALLBACK_NEIGHBORS", "0"))
+# 表示座位已被别人预约的拒绝消息关键词（逗号分隔），只有所选座位都因此类原因失败时才尝试相邻座位
+SEAT_TAKEN_MARKERS = [marker.strip() for marker in os.getenv("SEAT_TAKEN_MARKERS", "已被预约,已被占用,已被他人").split(",")
+                      if marker.strip()]
+
 if __name__ == "__main__":
     print(f"Log File Path: {LOG_FILE}")
     print(f"Database Path: {DB_NAME}")
@@ -0,0 +1,218 @@
+import bisect
+import re
+import threading
+
+# 设备名称拆分为前缀和末尾的编号，如 "2F-A001" -> ("2F-A", "001")
+DEV_NAME_PATTERN = re.compile(r"^(.*?)(\d+)$")
+
+def log(*args):
+    """
+    统一打印日志函数。
+
+    :param args: 打印的内容
+    :return: None
+    """
+    # print(*args)
+    pass
+
+class DeviceCatalog:
+    def __init__(self):
+        """
+        内存中的座位目录，按设备名称索引 devices 表，名称到 ID 的解析不再需要查询数据库。
+
+        devices 表的每次增删改都会通过触发器增加 table_versions 中的版本号，
+        refresh() 只需查询这一个版本号即可判断是否需要重新加载。
+        """
+        self.by_name = {}
+        self.by_id = {}
+        # 按位置分组的座位列表，组内按设备名称排序
+        self.by_location = {}
+        # 前缀索引: 按键排序的 [(键, 设备)]，键为大写的完整名称及 "-" 之后的部分（如 "2F-A001" 和 "A001"）
+        self._prefix_keys = []
+        self._prefix_devices = []
+        # 相邻座位索引: 同一位置、同一名称前缀的座位按编号排序 {(location, 前缀): [(编号, devId)]}，
+        # 以及每个座位在其中的位置 {devId: ((location, 前缀), 下标)}
+        self._rows = {}
+        self._row_index = {}
+        # 每个位置序列化好的座位列表，目录重新加载时清空
+        self._room_json = {}
+        self.version = None
+        self._lock = threading.Lock()
+
+    def refresh(self, db, force=False):
+        """
+        devices 表发生变化时重新加载目录。
+
+        :param db: LibraryDatabase 对象
+        :param force: 是否强制重新加载
+        :return: 发生了重新加载返回 True
+        """
+        version = db.get_table_version("devices")
+        if not force and version == self.version:
+            return False
+
+        by_name, by_id, by_location, prefix_entries = {}, {}, {}, []
+        for devId, devName, location in db.get_all_devices():
+            device = {"devId": devId, "devName": devName, "location": location}
+            by_name.setdefault(devName, device)
+            by_id[devId] = device
+            by_location.setdefault(location, []).append(device)
+            key = devName.upper()
+            prefix_entries.append((key, devId, device))
+            if "-" in key:
+                prefix_entries.append((key.rsplit("-", 1)[1], devId, device))
+        for devices in by_location.values():
+            devices.sort(key=lambda device: device["devName"])
+        prefix_entries.sort(key=lambda entry: (entry[0], entry[1]))
+        rows, row_index = self._build_neighbor_index(by_id.values())
+        with self._lock:
+            self.by_name, self.by_id, self.by_location, self.version = by_name, by_id, by_location, version
+            self._prefix_keys = [entry[0] for entry in prefix_entries]
+            self._prefix_devices = [entry[2] for entry in prefix_entries]
+            self._rows, self._row_index = rows, row_index
+            self._room_json = {}
+        log(f"座位目录已加载: {len(by_id)} 个座位，版本 {version}")
+        return True
+
+    @staticmethod
+    def _build_neighbor_index(devices):
+        """
+        按位置和名称前缀分组，组内按编号排序，编号相邻即座位相邻。
+
+        :param devices: 座位列表
+        :return: (rows, row_index)，见 __init__
+        """
+        rows = {}
+        for device in devices:
+            match = DEV_NAME_PATTERN.match(device["devName"])
+            if match:
+                key = (device["location"], match.group(1))
+                rows.setdefault(key, []).append((int(match.group(2)), device["devId"]))
+        row_index = {}
+        for key, row in rows.items():
+            row.sort()
+            for index, (_, devId) in enumerate(row):
+                row_index[devId] = (key, index)
+        return rows, row_index
+
+    def nearest_unlisted(self, seat_ids, k):
+        """
+        找出离用户所选座位最近、但不在所选列表中的 k 个座位（同一位置、同一名称前缀、编号最接近）。
+
+        距离相同时优先选择靠近用户排名更靠前的座位。
+
+        :param seat_ids: 用户所选的座位 ID 列表（按偏好排序）
+        :param k: 最多返回的座位数
+        :return: 座位 ID 列表，按距离从近到远排列
+        """
+        rows, row_index = self._rows, self._row_index
+        listed = set(seat_ids)
+        candidates = {}
+        for preference, seat_id in enumerate(seat_ids):
+            if seat_id not in row_index:
+                continue
+            key, index = row_index[seat_id]
+            row = rows[key]
+            number = row[index][0]
+            # 每个方向最多取 k 个未被选中的座位
+            for step in (-1, 1):
+                found, position = 0, index + step
+                while 0 <= position < len(row) and found < k:
+                    neighbor_number, neighbor_id = row[position]
+                    if neighbor_id not in listed:
+                        rank = (abs(neighbor_number - number), preference, neighbor_number)
+                        candidates[neighbor_id] = min(rank, candidates.get(neighbor_id, rank))
+                        found += 1
+                    position += step
+        return sorted(candidates, key=lambda devId: candidates[devId])[:k]
+
+    def resolve(self, names):
+        """
+        批量将设备名称解析为设备 ID，不存在的名称会被跳过。
+
+        :param names: 设备名称列表
+        :return: 设备 ID 列表，顺序与 names 一致
+        """
+        by_name = self.by_name
+        return [by_name[name]["devId"] for name in names if name in by_name]
+
+    def find_missing(self, names):
+        """
+        找出目录中不存在的设备名称。
+
+        :param names: 设备名称列表
+        :return: 不存在的名称列表
+        """
+        by_name = self.by_name
+        return [name for name in names if name not in by_name]
+
+    def get(self, devName):
+        """
+        根据设备名称获取座位信息。
+
+        :param devName: 设备名称
+        :return: {"devId", "devName", "location"} 或 None
+        """
+        return self.by_name.get(devName)
+
+    def search(self, prefix, location=None, limit=20):
+        """
+        按名称前缀搜索座位（不区分大小写），既可以输入完整名称的前缀（"2F-A0"），也可以省略楼层（"A0"）。
+
+        :param prefix: 名称前缀
+        :param location: 可选，只返回该位置的座位
+        :param limit: 最多返回的座位数
+        :return: 座位列表，元素为 {"devId", "devName", "location"}，按名称排序
+        """
+        keys, devices = self._prefix_keys, self._prefix_devices
+        prefix = prefix.strip().upper()
+        if not prefix:
+            return []
+        matches, seen = [], set()
+        for index in range(bisect.bisect_left(keys, prefix), len(keys)):
+            if not keys[index].startswith(prefix) or len(matches) >= limit:
+                break
+            device = devices[index]
+            if device["devId"] in seen or (location is not None and device["location"] != location):
+                continue
+            seen.add(device["devId"])
+            matches.append(device)
+        return sorted(matches, key=lambda device: device["devName"])
+
+    def rooms(self):
+        """
+        列出所有位置及其座位数。
+
+        :return: [{"location", "count"}, ...]，按位置名称排序
+        """
+        return [{"location": location, "count": len(devices)}
+                for location, devices in sorted(self.by_location.items())]
+
+    def list_room(self, location, offset=0, limit=None):
+        """
+        分页列出某个位置的座位。
+
+        :param location: 位置
+        :param offset: 起始下标
+        :param limit: 最多返回的座位数，None 表示不限制
+        :return: (座位列表, 该位置的座位总数)
+        """
+        devices = self.by_location.get(location, [])
+        end = None if limit is None else offset + limit
+        return devices[offset:end], len(devices)
+
+    def room_json(self, location, dumps):
+        """
+        获取某个位置完整座位列表的序列化结果，每个位置只序列化一次，目录重新加载后重新生成。
+
+        :param location: 位置
+        :param dumps: 序列化函数，接收 Python 对象返回 JSON 字符串
+        :return: JSON 字符串，位置不存在时返回 None
+        """
+        room_json = self._room_json
+        if location not in room_json:
+            devices = self.by_location.get(location)
+            if devices is None:
+                return None
+            room_json[location] = dumps({"location": location, "total": len(devices), "seats": devices})
+        return room_json[location]
@@ -1,61 +1,102 @@
 # -*- coding: utf-8 -*-
+import hashlib
 import os
+import time
 from utils.library_database import LibraryDatabase
 
+def get_location(filename):
+    """
+    从座位信息文件名中提取位置，例如 "一楼A区座位.txt" -> "一楼A区"。
+
+    :param filename: 文件名
+    :return: 位置字符串
+    """
+    location = os.path.basename(filename)[:-4]  # 提取文件名并去掉 ".txt"
+    return location[:len(location) - 2]  # 去掉倒数两个字符
+
+
+def parse_devices(content, location):
+    """
+    解析座位信息文件的内容，每行格式为 "devId: xxx, devName: xxx"。
+
+    :param content: 文件内容
+    :param location: 位置
+    :return: 设备列表，元素为字典，包含字段：devId, devName, location
+    """
+    devices = []
+    for line in content.splitlines():
+        line = line.strip()
+        if line:
+            parts = line.split(", ")
+            devices.append({
+                "devId": parts[0].split(": ")[1],
+                "devName": parts[1].split(": ")[1],
+                "location": location
+            })
+    return devices
+
+
 def insert_devices_from_folder_to_db(folder_path, db_path):
     """
-    遍历文件夹中的所有 .txt 文件，将设备信息插入数据库。
+    遍历文件夹中的所有 .txt 文件，将设备信息增量导入数据库。
+
+    大小和修改时间都没变的文件直接跳过；变化了的文件再比较内容哈希，内容也没变则只更新文件记录。
+    需要导入的文件在一个事务中批量写入，并删除该文件上次导入、这次已不存在的设备。
+    已被删除的文件，其导入的设备也会一并删除；其他来源（例如房间设备 JSON）的设备不受影响。
+
     :param folder_path: 包含设备信息的 .txt 文件的文件夹路径
     :param db_path: 数据库文件路径
     """
-    def insert_devices_from_txt(txt_file_path, db):
-        """
-        从 txt 文件读取设备信息并插入数据库。
-        :param txt_file_path: txt 文件路径
-        :param db: LibraryDatabase 对象
-        """
-        # 从文件路径提取 location
-        location = os.path.basename(txt_file_path)[:-4]  # 提取文件名并去掉 ".txt"
-        location = location[:len(location) - 2]  # 去掉倒数两个字符
-
-        with open(txt_file_path, "r", encoding="utf-8") as file:
-            lines = file.readlines()
-
-        for line in lines:
-            line = line.strip()
-            if line:
-                parts = line.split(", ")
-                devId = parts[0].split(": ")[1]
-                devName = parts[1].split(": ")[1]
-
-                # 插入设备数据
-                device_data = {
-                    "devId": devId,
-                    "devName": devName,
-                    "location": location
-                }
-                db.insert_device(device_data)
-
-        print(f"文件 {txt_file_path} 的设备信息已成功插入到数据库，location: {location}")
+    start = time.perf_counter()
+    skipped = imported = upserted = deleted = 0
 
     # 初始化数据库
     db = LibraryDatabase(db_name=db_path)
 
     try:
+        known_files = db.get_device_files()
+
         # 遍历文件夹中的所有 .txt 文件
-        for filename in os.listdir(folder_path):
-            if filename.endswith(".txt"):
-                txt_file_path = os.path.join(folder_path, filename)
-                insert_devices_from_txt(txt_file_path, db)
+        filenames = [filename for filename in os.listdir(folder_path) if filename.endswith(".txt")]
+        for filename in filenames:
+            txt_file_path = os.path.join(folder_path, filename)
+            stat = os.stat(txt_file_path)
+            known = known_files.get(filename)
+            if known and known["size"] == stat.st_size and known["mtime"] == stat.st_mtime:
+                skipped += 1
+                continue
 
-        print("所有设备信息已成功插入到数据库！")
+            with open(txt_file_path, "rb") as file:
+                raw = file.read()
+            sha256 = hashlib.sha256(raw).hexdigest()
+            if known and known["sha256"] == sha256:
+                db.update_device_file_stat(filename, stat.st_size, stat.st_mtime)
+                skipped += 1
+                continue
+
+            location = get_location(filename)
+            file_info = {
+                "file_name": filename,
+                "location": location,
+                "size": stat.st_size,
+                "mtime": stat.st_mtime,
+                "sha256": sha256
+            }
+            count, removed = db.import_device_file(file_info, parse_devices(raw.decode("utf-8"), location))
+            imported += 1
+            upserted += count
+            deleted += removed
+
+        # 处理已被删除的文件
+        for filename in set(known_files) - set(filenames):
+            deleted += db.delete_device_file(filename)
+
+        print(f"座位信息导入完成: {len(filenames)} 个文件，跳过 {skipped} 个未变化的文件，"
+              f"导入 {imported} 个（写入 {upserted} 条，删除 {deleted} 条），"
+              f"耗时 {(time.perf_counter() - start) * 1000:.1f}ms")
     except Exception as e:
         print(f"处理文件夹 {folder_path} 时出现错误: {e}")
     finally:
-        # 查询插入的设备信息验证
-        device_info = db.cursor.execute("SELECT * FROM devices").fetchall()
-        print("查询所有设备信息:", device_info)
-
         # 关闭数据库连接
         db.close()
 
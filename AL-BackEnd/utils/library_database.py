@@ -1,24 +1,178 @@
 from datetime import datetime
 from utils import config
+import threading
 import sqlite3
+import queue
 import json
+import time
 import os
+from urllib.request import pathname2url
 
 db_dir = os.path.dirname(config.DB_NAME)
 if not os.path.exists(db_dir):
     os.makedirs(db_dir)
 
+# 本进程中已完成建表的数据库文件，每个文件只建表一次
+_initialized_databases = set()
+_schema_lock = threading.Lock()
+
+
+def connect(db_name, check_same_thread=True, read_only=False):
+    """
+    打开数据库连接并设置并发访问相关的 PRAGMA。
+
+    Flask 进程和定时任务进程共用同一个数据库文件，开启 WAL 后读不阻塞写、写不阻塞读，
+    busy_timeout 让写写冲突时等待而不是立即报 "database is locked"。
+
+    :param db_name: 数据库文件路径
+    :param check_same_thread: 是否限制连接只能在创建它的线程中使用
+    :param read_only: 是否以只读方式打开（mode=ro），只读连接上的任何写操作都会失败
+    :return: sqlite3.Connection 对象
+    """
+    if read_only:
+        uri = f"file:{pathname2url(os.path.abspath(db_name))}?mode=ro"
+        conn = sqlite3.connect(uri, uri=True, timeout=config.DB_BUSY_TIMEOUT / 1000,
+                               check_same_thread=check_same_thread, cached_statements=config.SQL_CACHED_STATEMENTS)
+        conn.execute("PRAGMA query_only = ON;")
+        conn.execute(f"PRAGMA busy_timeout = {config.DB_BUSY_TIMEOUT};")
+        conn.execute(f"PRAGMA cache_size = -{config.DB_CACHE_SIZE_KB};")
+        return conn
+    conn = sqlite3.connect(db_name, timeout=config.DB_BUSY_TIMEOUT / 1000, check_same_thread=check_same_thread)
+    if config.DB_WAL:
+        conn.execute("PRAGMA journal_mode = WAL;")
+        # WAL 模式下 NORMAL 仍能保证数据库一致，只是断电时可能丢失最后几个事务
+        conn.execute(f"PRAGMA synchronous = {config.DB_SYNCHRONOUS};")
+    conn.execute(f"PRAGMA busy_timeout = {config.DB_BUSY_TIMEOUT};")
+    conn.execute(f"PRAGMA cache_size = -{config.DB_CACHE_SIZE_KB};")
+    return conn
+
+class ConnectionPool:
+    def __init__(self, db_name=config.DB_NAME, max_idle=8, checkpoint_interval=config.DB_CHECKPOINT_INTERVAL,
+                 read_only=False):
+        """
+        SQLite 连接池。连接在请求之间复用，同一时刻只会被一个线程使用。
+
+        :param db_name: 数据库文件路径
+        :param max_idle: 最多保留的空闲连接数
+        :param checkpoint_interval: WAL 模式下每隔多少秒在归还连接时做一次被动检查点，0 表示不做
+        :param read_only: 是否使用只读连接（只读连接不做检查点）
+        """
+        self.db_name = db_name
+        self.read_only = read_only
+        self.max_idle = max_idle
+        self.checkpoint_interval = 0 if read_only else checkpoint_interval
+        self._last_checkpoint = time.time()
+        self._idle = queue.LifoQueue()
+
+    def acquire(self):
+        """
+        取出一个空闲连接，没有空闲连接时新建。
+
+        :return: sqlite3.Connection 对象
+        """
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            return connect(self.db_name, check_same_thread=False, read_only=self.read_only)
+
+    def release(self, conn):
+        """
+        归还连接。未提交的事务会被回滚，空闲连接过多时直接关闭。
+
+        :param conn: sqlite3.Connection 对象
+        """
+        try:
+            conn.rollback()
+            if config.DB_WAL and self.checkpoint_interval and \
+                    time.time() - self._last_checkpoint > self.checkpoint_interval:
+                self._last_checkpoint = time.time()
+                conn.execute("PRAGMA wal_checkpoint(PASSIVE);")
+        except sqlite3.Error:
+            conn.close()
+            return
+        if self._idle.qsize() < self.max_idle:
+            self._idle.put(conn)
+        else:
+            conn.close()
+
+    def close_all(self):
+        """
+        关闭所有空闲连接。
+
+        :return: None
+        """
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+# 插入或更新设备，只有名称或位置变化时才更新（避免无意义地增加 devices 表的版本号）。
+# 不来自座位信息文件的设备（例如房间设备 JSON）source_file 为空，删除或重新导入座位信息文件时不会删除这些设备
+UPSERT_DEVICE_QUERY = """
+INSERT INTO devices (devId, devName, location)
+VALUES (:devId, :devName, :location)
+ON CONFLICT(devId) DO UPDATE SET
+    devName = excluded.devName,
+    location = excluded.location,
+    source_file = NULL
+WHERE devName IS NOT excluded.devName OR location IS NOT excluded.location OR source_file IS NOT NULL;
+"""
+
+# 从座位信息文件插入或更新设备，并记录设备来自哪个文件
+UPSERT_FILE_DEVICE_QUERY = """
+INSERT INTO devices (devId, devName, location, source_file)
+VALUES (:devId, :devName, :location, :source_file)
+ON CONFLICT(devId) DO UPDATE SET
+    devName = excluded.devName,
+    location = excluded.location,
+    source_file = excluded.source_file
+WHERE devName IS NOT excluded.devName OR location IS NOT excluded.location
+    OR source_file IS NOT excluded.source_file;
+"""
+
+# 插入或更新预约数据，pid 已存在时更新其余字段（不修改优先级）
+UPSERT_RESERVATION_QUERY = """
+INSERT INTO reservation_info (pid, begin_time, end_time, seat_list, seat_ids, logonName, password, is_reserved)
+VALUES (:pid, :begin_time, :end_time, :seat_list, :seat_ids, :logonName, :password, :is_reserved)
+ON CONFLICT(pid) DO UPDATE SET
+    begin_time = excluded.begin_time,
+    end_time = excluded.end_time,
+    seat_list = excluded.seat_list,
+    seat_ids = excluded.seat_ids,
+    logonName = excluded.logonName,
+    password = excluded.password,
+    is_reserved = excluded.is_reserved;
+"""
+
+
 class LibraryDatabase:
-    def __init__(self, db_name=config.DB_NAME):
+    def __init__(self, db_name=config.DB_NAME, pool=None):
         """
-        初始化数据库连接，并创建必要的表格。
+        初始化数据库连接，并创建必要的表格（每个进程只建表一次）。
 
         :param db_name: 数据库文件路径，默认为 "../db/library.db"
+        :param pool: 可选的 ConnectionPool，传入时从连接池取连接，close() 时归还
         """
-        self.db_name = db_name
-        self.conn = sqlite3.connect(self.db_name)
+        self.pool = pool
+        self.db_name = pool.db_name if pool else db_name
+        self.conn = pool.acquire() if pool else connect(self.db_name)
         self.cursor = self.conn.cursor()
-        self._create_tables()
+        self._ensure_tables()
+
+    def _ensure_tables(self):
+        """
+        若本进程尚未对该数据库建表，则创建所有表格。
+
+        :return: None
+        """
+        if self.db_name in _initialized_databases:
+            return
+        with _schema_lock:
+            if self.db_name not in _initialized_databases:
+                self._create_tables()
+                _initialized_databases.add(self.db_name)
 
     def _create_tables(self):
         """
@@ -30,6 +184,10 @@ class LibraryDatabase:
         - devices: 存储设备信息
         - reservation_result: 存储预约结果
         - announcement_info: 存储公告信息
+        - table_versions: 存储各表的版本号，由触发器在表变化时自动递增
+        - device_files: 存储已导入的座位信息文件，用于跳过未变化的文件
+        - reservation_attempts: 存储每一次预约请求（只追加，不修改）
+        - reservation_runs: 存储每次预约运行的概况和各阶段耗时
         """
         # 创建 user_info 表
         create_user_table_query = """
@@ -67,10 +225,36 @@ class LibraryDatabase:
         CREATE TABLE IF NOT EXISTS devices (
             devId TEXT PRIMARY KEY,  -- 设备 ID 主键
             devName TEXT,           -- 设备名称
-            location TEXT           -- 设备位置
+            location TEXT,          -- 设备位置
+            source_file TEXT        -- 导入该设备的座位信息文件名，其他来源的设备为空
         );
         """
         self.cursor.execute(create_devices_table_query)
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_devices_devName ON devices (devName);")
+
+        # 旧版本数据库的 devices 表没有 source_file 列，补充该列，并按位置认定为已记录的座位信息文件导入的设备
+        columns = [row[1] for row in self.cursor.execute("PRAGMA table_info(devices);")]
+        if "source_file" not in columns:
+            self.cursor.execute("ALTER TABLE devices ADD COLUMN source_file TEXT;")
+            if self.cursor.execute("SELECT name FROM sqlite_master WHERE name = 'device_files';").fetchone():
+                self.cursor.execute("""
+                UPDATE devices SET source_file =
+                    (SELECT file_name FROM device_files WHERE device_files.location = devices.location);
+                """)
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_devices_source_file ON devices (source_file);")
+
+        # 旧版本数据库的 reservation_info 表没有 seat_ids 列，补充该列
+        columns = [row[1] for row in self.cursor.execute("PRAGMA table_info(reservation_info);")]
+        if "seat_ids" not in columns:
+            # 存储提交时已解析好的座位 ID 列表（JSON 字符串），预约时无需再查询设备表
+            self.cursor.execute("ALTER TABLE reservation_info ADD COLUMN seat_ids TEXT;")
+
+        # 预约任务按优先级读取正在预约的记录，按索引顺序逐行回表，无需排序。
+        # 索引中不保存密码等列（旧版本的覆盖索引 idx_reservation_info_active 包含密码，删除）
+        self.cursor.execute("DROP INDEX IF EXISTS idx_reservation_info_active;")
+        self.cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_reservation_info_priority ON reservation_info (is_reserved, priority DESC, pid);
+        """)
 
         self.conn.commit()
 
@@ -98,8 +282,99 @@ class LibraryDatabase:
         """
         self.cursor.execute(create_announcement_query)
 
+        # 创建 table_versions 表，其他进程可据此判断某张表是否发生变化
+        create_table_versions_query = """
+        CREATE TABLE IF NOT EXISTS table_versions (
+            name TEXT PRIMARY KEY,        -- 表名
+            version INTEGER DEFAULT 0     -- 版本号
+        );
+        """
+        self.cursor.execute(create_table_versions_query)
+        self._create_version_triggers("devices")
+        self._create_version_triggers("reservation_result")
+
+        # 创建 device_files 表
+        create_device_files_query = """
+        CREATE TABLE IF NOT EXISTS device_files (
+            file_name TEXT PRIMARY KEY,   -- 座位信息文件名
+            location TEXT,                -- 文件对应的位置
+            size INTEGER,                 -- 文件大小
+            mtime REAL,                   -- 文件修改时间
+            sha256 TEXT,                  -- 文件内容哈希
+            device_count INTEGER,         -- 文件中的设备数
+            imported_at TEXT              -- 导入时间
+        );
+        """
+        self.cursor.execute(create_device_files_query)
+
+        # 创建 reservation_attempts 表
+        create_reservation_attempts_query = """
+        CREATE TABLE IF NOT EXISTS reservation_attempts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,  -- 自增主键
+            run_id TEXT NOT NULL,                  -- 预约运行的 ID
+            pid TEXT NOT NULL,                     -- 学号
+            devId TEXT,                            -- 座位 ID
+            sent_at REAL NOT NULL,                 -- 请求发出时间（时间戳）
+            returned_at REAL,                      -- 响应返回时间（时间戳），无响应时为空
+            latency_ms REAL,                       -- 请求耗时（毫秒）
+            outcome TEXT NOT NULL,                 -- 结果代码 (success, rejected, http_error, no_response, cancelled)
+            status INTEGER,                        -- HTTP 状态码
+            message TEXT,                          -- 失败消息
+            fallback INTEGER DEFAULT 0             -- 是否为所选座位全部失败后尝试的相邻座位
+        );
+        """
+        self.cursor.execute(create_reservation_attempts_query)
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_attempts_pid_time ON reservation_attempts (pid, sent_at);")
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_attempts_devId_time ON reservation_attempts (devId, sent_at);")
+
+        # 旧版本数据库的 reservation_attempts 表没有 fallback 列，补充该列
+        columns = [row[1] for row in self.cursor.execute("PRAGMA table_info(reservation_attempts);")]
+        if "fallback" not in columns:
+            self.cursor.execute("ALTER TABLE reservation_attempts ADD COLUMN fallback INTEGER DEFAULT 0;")
+
+        # 创建 reservation_runs 表
+        create_reservation_runs_query = """
+        CREATE TABLE IF NOT EXISTS reservation_runs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,  -- 自增主键
+            run_id TEXT UNIQUE NOT NULL,           -- 预约运行的 ID，与 reservation_attempts.run_id 对应
+            started_at REAL NOT NULL,              -- 运行开始时间（时间戳）
+            finished_at REAL NOT NULL,             -- 运行结束时间（时间戳）
+            users INTEGER,                         -- 本次预约的用户数
+            phase_timings TEXT                     -- 各阶段耗时直方图（JSON，见 utils.phase_metrics）
+        );
+        """
+        self.cursor.execute(create_reservation_runs_query)
+
         self.conn.commit()
 
+    def _create_version_triggers(self, table_name):
+        """
+        为指定的表创建触发器，表中数据发生增删改时自动递增 table_versions 中的版本号。
+
+        :param table_name: 表名
+        :return: None
+        """
+        self.cursor.execute("INSERT OR IGNORE INTO table_versions (name, version) VALUES (?, 0);", (table_name,))
+        for event in ("INSERT", "UPDATE", "DELETE"):
+            self.cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {table_name}_version_{event.lower()}
+            AFTER {event} ON {table_name}
+            BEGIN
+                UPDATE table_versions SET version = version + 1 WHERE name = '{table_name}';
+            END;
+            """)
+
+    def get_table_version(self, table_name):
+        """
+        查询表的版本号。
+
+        :param table_name: 表名
+        :return: 版本号，未记录时返回 None
+        """
+        self.cursor.execute("SELECT version FROM table_versions WHERE name = ?;", (table_name,))
+        result = self.cursor.fetchone()
+        return result[0] if result else None
+
     def insert_user(self, user_info):
         """
         插入用户数据。如果主键冲突则忽略。
@@ -121,29 +396,30 @@ class LibraryDatabase:
         插入或更新预约数据。
 
         :param reservation_data: 预约数据，字典格式，包含字段：
-                                 pid, begin_time, end_time, seat_list, logonName, password, is_reserved
+                                 pid, begin_time, end_time, seat_list, logonName, password, is_reserved，
+                                 可选字段 seat_ids
         :return: None
         """
         try:
-            insert_on_conflict_query = """
-            INSERT INTO reservation_info (pid, begin_time, end_time, seat_list, logonName, password, is_reserved)
-            VALUES (:pid, :begin_time, :end_time, :seat_list, :logonName, :password, :is_reserved)
-            ON CONFLICT(pid) DO UPDATE SET
-                begin_time = excluded.begin_time,
-                end_time = excluded.end_time,
-                seat_list = excluded.seat_list,
-                logonName = excluded.logonName,
-                password = excluded.password,
-                is_reserved = excluded.is_reserved;
-            """
             # 执行插入或更新
-            self.cursor.execute(insert_on_conflict_query, reservation_data)
+            self.cursor.execute(UPSERT_RESERVATION_QUERY, {"seat_ids": None, **reservation_data})
             self.conn.commit()
             print("数据插入或更新成功！")
         except Exception as e:
             print(f"插入或更新失败: {e}")
             raise
 
+    def insert_or_update_reservations(self, reservations):
+        """
+        在一个事务中批量插入或更新预约数据，任何一条失败时全部回滚。
+
+        :param reservations: 预约数据列表，元素格式同 insert_or_update_reservation
+        :return: None
+        """
+        with self.conn:
+            self.cursor.executemany(UPSERT_RESERVATION_QUERY,
+                                    ({"seat_ids": None, **reservation_data} for reservation_data in reservations))
+
     def insert_device(self, device_data):
         """
         插入设备信息。
@@ -160,6 +436,76 @@ class LibraryDatabase:
         self.cursor.execute(insert_query, device_data)
         self.conn.commit()
 
+    def upsert_devices(self, devices):
+        """
+        在一个事务中批量插入或更新设备信息。
+
+        :param devices: 设备列表，元素为字典，包含字段：devId, devName, location
+        :return: None
+        """
+        with self.conn:
+            self.cursor.executemany(UPSERT_DEVICE_QUERY, devices)
+
+    def get_device_files(self):
+        """
+        查询所有已导入的座位信息文件记录。
+
+        :return: {file_name: {location, size, mtime, sha256, device_count, imported_at}}
+        """
+        self.cursor.execute("SELECT * FROM device_files;")
+        columns = [desc[0] for desc in self.cursor.description]
+        return {row[0]: dict(zip(columns, row)) for row in self.cursor.fetchall()}
+
+    def update_device_file_stat(self, file_name, size, mtime):
+        """
+        文件内容未变化（哈希相同）但修改时间变化时，只更新文件的大小和修改时间。
+
+        :param file_name: 文件名
+        :param size: 文件大小
+        :param mtime: 文件修改时间
+        :return: None
+        """
+        with self.conn:
+            self.cursor.execute("UPDATE device_files SET size = ?, mtime = ? WHERE file_name = ?;",
+                                (size, mtime, file_name))
+
+    def import_device_file(self, file_info, devices):
+        """
+        在一个事务中导入一个座位信息文件：批量插入或更新设备，删除该文件上次导入、这次已不存在的设备，并记录文件信息。
+
+        :param file_info: 文件信息字典，包含字段：file_name, location, size, mtime, sha256
+        :param devices: 设备列表，元素为字典，包含字段：devId, devName, location
+        :return: (插入或更新的设备数, 删除的设备数)
+        """
+        new_ids = {device["devId"] for device in devices}
+        with self.conn:
+            self.cursor.execute("SELECT devId FROM devices WHERE source_file = ?;", (file_info["file_name"],))
+            removed_ids = [(row[0],) for row in self.cursor.fetchall() if row[0] not in new_ids]
+            self.cursor.executemany("DELETE FROM devices WHERE devId = ?;", removed_ids)
+
+            self.cursor.executemany(UPSERT_FILE_DEVICE_QUERY,
+                                    ({**device, "source_file": file_info["file_name"]} for device in devices))
+
+            self.cursor.execute("""
+            INSERT OR REPLACE INTO device_files (file_name, location, size, mtime, sha256, device_count, imported_at)
+            VALUES (:file_name, :location, :size, :mtime, :sha256, :device_count, :imported_at);
+            """, {**file_info, "device_count": len(devices),
+                  "imported_at": datetime.now().strftime('%Y-%m-%d %H:%M:%S')})
+        return len(devices), len(removed_ids)
+
+    def delete_device_file(self, file_name):
+        """
+        座位信息文件被删除时，在一个事务中删除该文件导入的设备和文件记录。
+
+        :param file_name: 文件名
+        :return: 删除的设备数
+        """
+        with self.conn:
+            self.cursor.execute("DELETE FROM devices WHERE source_file = ?;", (file_name,))
+            deleted = self.cursor.rowcount
+            self.cursor.execute("DELETE FROM device_files WHERE file_name = ?;", (file_name,))
+        return deleted
+
     def insert_or_update_reservation_result(self, pid, result_info):
         """
         插入或更新预约结果信息，并自动更新时间戳。
@@ -193,6 +539,177 @@ class LibraryDatabase:
             print(f"插入或更新预约结果失败: {e}")
             raise
 
+    def insert_reservation_attempts(self, rows):
+        """
+        在一个事务中批量追加预约请求记录。
+
+        :param rows: [(run_id, pid, devId, sent_at, returned_at, latency_ms, outcome, status, message, fallback), ...]
+        :return: None
+        """
+        with self.conn:
+            self.cursor.executemany("""
+            INSERT INTO reservation_attempts
+                (run_id, pid, devId, sent_at, returned_at, latency_ms, outcome, status, message, fallback)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?);
+            """, rows)
+
+    @staticmethod
+    def _attempt_conditions(pid, devId, start, end):
+        """
+        构造 reservation_attempts 查询的 WHERE 条件。
+
+        :return: (条件列表, 参数列表)
+        """
+        conditions, params = [], []
+        for column, value in (("pid", pid), ("devId", devId)):
+            if value is not None:
+                conditions.append(f"{column} = ?")
+                params.append(value)
+        if start is not None:
+            conditions.append("sent_at >= ?")
+            params.append(start)
+        if end is not None:
+            conditions.append("sent_at < ?")
+            params.append(end)
+        return conditions, params
+
+    def get_reservation_attempts(self, pid=None, devId=None, start=None, end=None, limit=50, cursor=None):
+        """
+        按学号或座位 ID 分页查询一段时间内的预约请求记录，按发出时间倒序排列。
+
+        查询走 (pid, sent_at) 或 (devId, sent_at) 索引；翻页使用上一页最后一条记录的 (sent_at, id)，
+        不使用 OFFSET，翻到后面的页也不需要扫描前面的记录。
+
+        :param pid: 学号，与 devId 至少指定一个
+        :param devId: 座位 ID
+        :param start: 起始时间戳（包含）
+        :param end: 结束时间戳（不包含）
+        :param limit: 每页记录数
+        :param cursor: 上一页返回的 next_cursor，形如 (sent_at, id)
+        :return: (记录列表(元素为字典), next_cursor)，没有下一页时 next_cursor 为 None
+        """
+        conditions, params = self._attempt_conditions(pid, devId, start, end)
+        if cursor is not None:
+            conditions.append("(sent_at < ? OR (sent_at = ? AND id < ?))")
+            params.extend([cursor[0], cursor[0], cursor[1]])
+
+        query = f"""
+        SELECT * FROM reservation_attempts
+        WHERE {" AND ".join(conditions) or "1"}
+        ORDER BY sent_at DESC, id DESC
+        LIMIT ?;
+        """
+        self.cursor.execute(query, params + [limit + 1])
+        rows = self.cursor.fetchall()
+        columns = [desc[0] for desc in self.cursor.description]
+        attempts = [dict(zip(columns, row)) for row in rows[:limit]]
+        next_cursor = None
+        if len(rows) > limit:
+            next_cursor = (attempts[-1]["sent_at"], attempts[-1]["id"])
+        return attempts, next_cursor
+
+    def iter_reservation_attempts(self, start=None):
+        """
+        按写入顺序逐行读取预约请求记录（同一次运行的记录连续且按时间先后排列），用于统计和回放。
+
+        :param start: 可选的起始时间戳，只读取此后发出的请求
+        :return: 生成器，元素为 (run_id, pid, devId, sent_at, outcome, message)
+        """
+        query = "SELECT run_id, pid, devId, sent_at, outcome, message FROM reservation_attempts"
+        params = []
+        if start is not None:
+            query += " WHERE sent_at >= ?"
+            params.append(start)
+        cursor = self.conn.cursor()
+        try:
+            cursor.execute(query + " ORDER BY id;", params)
+            yield from cursor
+        finally:
+            cursor.close()
+
+    def get_reservation_attempt_summary(self, pid=None, devId=None, start=None, end=None):
+        """
+        统计一段时间内各结果代码的预约请求数，例如某个座位本月预约成功了多少次。
+
+        :param pid: 学号，与 devId 至少指定一个
+        :param devId: 座位 ID
+        :param start: 起始时间戳（包含）
+        :param end: 结束时间戳（不包含）
+        :return: {outcome: 次数}
+        """
+        conditions, params = self._attempt_conditions(pid, devId, start, end)
+
+        query = f"""
+        SELECT outcome, COUNT(*) FROM reservation_attempts
+        WHERE {" AND ".join(conditions) or "1"}
+        GROUP BY outcome;
+        """
+        self.cursor.execute(query, params)
+        return dict(self.cursor.fetchall())
+
+    def insert_reservation_run(self, run_id, started_at, finished_at, users, phase_timings):
+        """
+        保存一次预约运行的记录。
+
+        :param run_id: 运行 ID
+        :param started_at: 开始时间戳
+        :param finished_at: 结束时间戳
+        :param users: 预约的用户数
+        :param phase_timings: PhaseMetrics.snapshot() 的返回值
+        :return: None
+        """
+        with self.conn:
+            self.cursor.execute("""
+            INSERT INTO reservation_runs (run_id, started_at, finished_at, users, phase_timings)
+            VALUES (?, ?, ?, ?, ?);
+            """, (run_id, started_at, finished_at, users, json.dumps(phase_timings)))
+
+    def iter_reservation_runs(self, after_id=0):
+        """
+        按写入顺序读取预约运行记录，用于增量汇总各阶段耗时。
+
+        :param after_id: 只读取 id 大于该值的记录
+        :return: 生成器，元素为 (id, run_id, phase_timings 字典)
+        """
+        cursor = self.conn.cursor()
+        try:
+            cursor.execute("SELECT id, run_id, phase_timings FROM reservation_runs WHERE id > ? ORDER BY id;",
+                           (after_id,))
+            for row_id, run_id, phase_timings in cursor:
+                yield row_id, run_id, json.loads(phase_timings) if phase_timings else {}
+        finally:
+            cursor.close()
+
+    def get_fallback_summary(self, start=None, end=None):
+        """
+        统计相邻座位备选带来的成功率提升：每次运行中的每个用户计为一次预约，
+        分别统计所选座位预约成功、以及所选座位全部失败后靠相邻座位预约成功的次数。
+
+        :param start: 起始时间戳（包含）
+        :param end: 结束时间戳（不包含）
+        :return: {"users": 预约次数, "primary_wins": 所选座位成功次数, "fallback_users": 尝试了相邻座位的次数,
+                  "fallback_wins": 相邻座位成功次数}
+        """
+        conditions, params = self._attempt_conditions(None, None, start, end)
+        query = f"""
+        SELECT COUNT(*),
+               COALESCE(SUM(primary_win), 0),
+               COALESCE(SUM(used_fallback), 0),
+               COALESCE(SUM(fallback_win), 0)
+        FROM (
+            SELECT MAX(outcome = 'success' AND NOT fallback) AS primary_win,
+                   MAX(fallback) AS used_fallback,
+                   MAX(outcome = 'success' AND fallback) AS fallback_win
+            FROM reservation_attempts
+            WHERE {" AND ".join(conditions) or "1"}
+            GROUP BY run_id, pid
+        );
+        """
+        self.cursor.execute(query, params)
+        users, primary_wins, fallback_users, fallback_wins = self.cursor.fetchone()
+        return {"users": users, "primary_wins": primary_wins,
+                "fallback_users": fallback_users, "fallback_wins": fallback_wins}
+
     def insert_announcement(self, announcement_data):
         """
         插入公告信息（自动生成 id）。
@@ -228,39 +745,62 @@ class LibraryDatabase:
             return [dict(zip(columns, row)) for row in rows]
         return None
 
+    def iter_active_reservations(self):
+        """
+        按优先级从高到低逐行读取所有 is_reserved = 1 的预约记录（同优先级按 pid 排序）。
+
+        排序由索引 idx_reservation_info_priority 完成，按索引顺序逐行按 rowid 读表，不需要排序，
+        调用方拿到第一条记录时其余记录尚未读取。使用独立的游标，迭代期间可以继续通过 self.cursor 写入。
+
+        :return: 生成器，元素为 sqlite3.Row，可按列名取值
+        """
+        query = """
+        SELECT
+            pid,
+            logonName,
+            password,
+            seat_list,
+            seat_ids,
+            begin_time,
+            end_time,
+            priority
+        FROM
+            reservation_info
+        WHERE
+            is_reserved = 1  -- 使用 1 替代 TRUE
+        ORDER BY
+            priority DESC, pid;
+        """
+        cursor = self.conn.cursor()
+        cursor.row_factory = sqlite3.Row
+        try:
+            cursor.execute(query)
+            for row in cursor:
+                yield row
+        finally:
+            cursor.close()
+
     def get_all_active_reservations(self):
         """
-        查询所有 is_reserved = 1 的预约记录。
+        查询所有 is_reserved = 1 的预约记录，按优先级从高到低排序。
 
         :return: 正在预约中的记录列表(元素为字典)，若无结果返回空列表
         """
         try:
-            query = """
-            SELECT 
-                pid,
-                logonName, 
-                password, 
-                seat_list, 
-                begin_time, 
-                end_time, 
-                priority
-            FROM 
-                reservation_info
-            WHERE 
-                is_reserved = 1;  -- 使用 1 替代 TRUE
-            """
-            self.cursor.execute(query)
-            rows = self.cursor.fetchall()
-
-            # 如果有结果，将字段名与值组合为字典返回
-            if rows:
-                columns = [desc[0] for desc in self.cursor.description]
-                return [dict(zip(columns, row)) for row in rows]
-            return []  # 如果没有结果，返回空列表
+            return [dict(row) for row in self.iter_active_reservations()]
         except Exception as e:
             print(f"查询失败: {e}")
             raise
 
+    def get_all_devices(self):
+        """
+        查询所有设备信息。
+
+        :return: [(devId, devName, location), ...]
+        """
+        self.cursor.execute("SELECT devId, devName, location FROM devices;")
+        return self.cursor.fetchall()
+
     def get_device_id_by_name(self, devName):
         """
         根据设备名称查询设备 ID。
@@ -369,19 +909,103 @@ class LibraryDatabase:
         self.cursor.execute(update_query, (priority, pid))
         self.conn.commit()
 
+    def checkpoint(self, mode="PASSIVE"):
+        """
+        执行 WAL 检查点，将 WAL 文件中的内容写回数据库文件。
+
+        :param mode: PASSIVE / FULL / RESTART / TRUNCATE
+        :return: (busy, wal 页数, 已写回页数)
+        """
+        return self.conn.execute(f"PRAGMA wal_checkpoint({mode});").fetchone()
+
     def close(self):
         """
-        关闭数据库连接。
+        关闭数据库连接。使用连接池时将连接归还连接池，重复调用不会出错。
 
         :return: None
         """
-        self.conn.close()
+        if self.conn is None:
+            return
+        self.cursor.close()
+        if self.pool:
+            self.pool.release(self.conn)
+        else:
+            self.conn.close()
+        self.conn = None
+
+
+def stress_test(db_name, readers=4, writers=2, seconds=5):
+    """
+    并发读写压力测试：多个线程模拟学生轮询接口，多个线程模拟定时任务逐个用户提交预约结果。
+
+    :param db_name: 数据库文件路径
+    :param readers: 读线程数
+    :param writers: 写线程数
+    :param seconds: 持续时间（秒）
+    :return: {"reads": 读次数, "writes": 写次数, "locked_errors": 锁冲突次数, "max_read_ms": 最慢读耗时}
+    """
+    LibraryDatabase(db_name).close()
+    stats = {"reads": 0, "writes": 0, "locked_errors": 0, "max_read_ms": 0.0}
+    stats_lock = threading.Lock()
+    deadline = time.time() + seconds
+
+    # 打开连接时会建表、设置 journal_mode，回滚日志模式下同样可能遇到锁冲突，
+    # 因此在循环中打开，失败记为一次锁冲突后重试
+    def reader():
+        db = None
+        while time.time() < deadline:
+            start = time.perf_counter()
+            try:
+                if db is None:
+                    db = LibraryDatabase(db_name)
+                db.get_reservation_result_by_pid("1")
+                db.get_announcements()
+                with stats_lock:
+                    stats["reads"] += 1
+                    stats["max_read_ms"] = max(stats["max_read_ms"], (time.perf_counter() - start) * 1000)
+            except sqlite3.OperationalError:
+                with stats_lock:
+                    stats["locked_errors"] += 1
+        if db is not None:
+            db.close()
+
+    def writer(index):
+        db = None
+        count = 0
+        while time.time() < deadline:
+            try:
+                if db is None:
+                    db = LibraryDatabase(db_name)
+                db.insert_or_update_reservation_result(f"{index}-{count % 100}", "预约成功," * 20)
+                count += 1
+                with stats_lock:
+                    stats["writes"] += 1
+            except sqlite3.OperationalError:
+                with stats_lock:
+                    stats["locked_errors"] += 1
+        if db is not None:
+            db.close()
+
+    threads = [threading.Thread(target=reader) for _ in range(readers)]
+    threads += [threading.Thread(target=writer, args=(i,)) for i in range(writers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    LibraryDatabase(db_name).close()
+    return stats
 
 
 # 使用示例
 if __name__ == "__main__":
-    # 初始化数据库
-    db = LibraryDatabase()
-
-    # 关闭数据库连接
-    db.close()
+    import contextlib
+    import io
+    import tempfile
+
+    # 对比回滚日志模式与 WAL 模式下的并发读写：python -m utils.library_database
+    config.DB_BUSY_TIMEOUT = 100
+    for wal in (False, True):
+        config.DB_WAL = wal
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = stress_test(os.path.join(tempfile.mkdtemp(), "stress.db"), seconds=3)
+        print(f"{'WAL' if wal else '回滚日志'}模式(busy_timeout=100ms): {result}")
@@ -1,6 +1,13 @@
 from utils.base_system import BaseSystem
 from utils.password_encryptor import PasswordEncryptor
+from utils import config
+from utils.transport import send_once
+from utils.phase_metrics import (phase_metrics, PHASE_INITIAL_COOKIE, PHASE_PUBLIC_KEY, PHASE_RSA_ENCRYPT,
+                                 PHASE_LOGIN_POST, PHASE_RESERVE_POST)
+from utils.attempt_log import new_attempt, mark_cancelled, is_seat_failure, OUTCOME_SUCCESS, OUTCOME_REJECTED, OUTCOME_HTTP_ERROR
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+import time
 
 def log(*args):
     """
@@ -13,16 +20,35 @@ def log(*args):
     pass
 
 class LibrarySystem(BaseSystem):
+    BASE_URL = "https://webvpn.njfu.edu.cn/webvpn/LjIwMS4xNjkuMjE4LjE2OC4xNjc=/LjIwNS4xNTguMjAwLjE3MS4xNTMuMTUwLjIxNi45Ny4yMTEuMTU2LjE1OC4xNzMuMTQ4LjE1NS4xNTUuMjE3LjEwMC4xNTAuMTY1/"
+    VPN_SUFFIX = "?vpn-12-libseat.njfu.edu.cn"
+    INDEX_URL = f"{BASE_URL}ic-web/default/index{VPN_SUFFIX}"
+    PUBLIC_KEY_URL = f"{BASE_URL}ic-web/login/publicKey{VPN_SUFFIX}"
+    LOGIN_URL = f"{BASE_URL}ic-web/login/user{VPN_SUFFIX}"
+    RESERVE_URL = f"{BASE_URL}ic-web/reserve{VPN_SUFFIX}"
+    CANCEL_URL = f"{BASE_URL}ic-web/reserve/delete{VPN_SUFFIX}"
+
     def __init__(self, username, password):
         super().__init__(
             username=username,
             password=password,
-            base_url="https://webvpn.njfu.edu.cn/webvpn/LjIwMS4xNjkuMjE4LjE2OC4xNjc=/LjIwNS4xNTguMjAwLjE3MS4xNTMuMTUwLjIxNi45Ny4yMTEuMTU2LjE1OC4xNzMuMTQ4LjE1NS4xNTUuMjE3LjEwMC4xNTAuMTY1/",
-            vpn_suffix="?vpn-12-libseat.njfu.edu.cn"
+            base_url=self.BASE_URL,
+            vpn_suffix=self.VPN_SUFFIX
         )
-        self.public_key_url = f"{self.base_url}ic-web/login/publicKey{self.vpn_suffix}"
-        self.login_url = f"{self.base_url}ic-web/login/user{self.vpn_suffix}"
-        self.reserve_url = f"{self.base_url}ic-web/reserve{self.vpn_suffix}"
+        self.public_key_url = self.PUBLIC_KEY_URL
+        self.login_url = self.LOGIN_URL
+        self.reserve_url = self.RESERVE_URL
+        self.cancel_url = self.CANCEL_URL
+        # 可选的 VPNSessionManager，webvpn Cookie 失效时用于自动重新登录
+        self.vpn_manager = None
+        # 每次预约请求的记录: {"devId", "sent_at", "returned_at", "outcome", "status", "result"}
+        self.attempts = []
+        # 同时并发请求的座位数，1 表示按顺序逐个尝试
+        self.hedge_size = 1
+        # 可选的 SeatAvailability，预约前跳过已被占用的座位
+        self.availability = None
+        # 所选座位全部失败后，在同一次登录中依次尝试的相邻座位 ID（见 DeviceCatalog.nearest_unlisted）
+        self.fallback_seats = []
 
 
     def get_initial_cookie(self):
@@ -32,8 +58,15 @@ class LibrarySystem(BaseSystem):
         :return: 成功返回 True，失败返回 False
         """
         try:
-            init_resp = self.session.get(f"{self.base_url}ic-web/default/index{self.vpn_suffix}")
+            index_url = self.INDEX_URL
+            with phase_metrics.timer(PHASE_INITIAL_COOKIE):
+                init_resp = self.session.get(index_url)
             log("图书馆首页响应状态码:", init_resp.status_code)
+            if self.vpn_manager and self.vpn_manager.is_rejected(init_resp):
+                log("webvpn Cookie 已失效，重新登录 VPN")
+                if not self.vpn_manager.refresh(self.session):
+                    return False
+                init_resp = self.session.get(index_url)
             if init_resp.status_code != 200:
                 log("图书馆首页访问失败")
                 return False
@@ -49,7 +82,8 @@ class LibrarySystem(BaseSystem):
         :return: (public_key, nonce) 或 (None, None)
         """
         try:
-            key_resp = self.session.get(self.public_key_url)
+            with phase_metrics.timer(PHASE_PUBLIC_KEY):
+                key_resp = self.session.get(self.public_key_url)
             log("获取公钥响应状态码:", key_resp.status_code)
             log("获取公钥响应内容:", key_resp.text)
             if key_resp.status_code != 200:
@@ -78,10 +112,8 @@ class LibrarySystem(BaseSystem):
         """
         try:
             # 加密密码
-            encrypted_password = PasswordEncryptor.encrypt_with_public_key(
-                PasswordEncryptor.set_public_key(public_key),
-                f"{self.password};{nonce}"
-            )
+            with phase_metrics.timer(PHASE_RSA_ENCRYPT):
+                encrypted_password = PasswordEncryptor.rsa_encrypt(public_key, f"{self.password};{nonce}")
 
             # 发送登录请求
             login_data = {
@@ -90,7 +122,8 @@ class LibrarySystem(BaseSystem):
                 "captcha": "",
                 "privacy": True,
             }
-            login_resp = self.session.post(self.login_url, json=login_data)
+            with phase_metrics.timer(PHASE_LOGIN_POST):
+                login_resp = self.session.post(self.login_url, json=login_data)
             log("图书馆登录响应状态码:", login_resp.status_code)
             log("图书馆登录响应内容:", login_resp.text)
 
@@ -185,17 +218,18 @@ class LibrarySystem(BaseSystem):
         resv_end_time = tomorrow.strftime("%Y-%m-%d") + f" {end_time}:00"
         return resv_begin_time, resv_end_time
 
-    def reserve_single_seat(self, user_info, seat_id, resv_begin_time, resv_end_time):
+    @staticmethod
+    def build_resv_data(user_info, seat_id, resv_begin_time, resv_end_time):
         """
-        尝试为单个座位进行预约。
+        构造单个座位的预约请求数据。
 
         :param user_info: 用户信息字典
         :param seat_id: 座位 ID
         :param resv_begin_time: 预约开始时间
         :param resv_end_time: 预约结束时间
-        :return: 成功返回预约结果字典，失败返回错误消息
+        :return: 预约请求数据字典
         """
-        resv_data = {
+        return {
             "testName": "",
             "appAccNo": user_info['accNo'],
             "memberKind": 1,
@@ -207,23 +241,248 @@ class LibrarySystem(BaseSystem):
             "resvEndTime": resv_end_time
         }
 
-        response = self.session.post(self.reserve_url, json=resv_data)
+    @staticmethod
+    def parse_resv_time(value):
+        """
+        将接口返回的预约时间转换为毫秒时间戳，接口可能返回毫秒时间戳或时间字符串。
+
+        :param value: 毫秒时间戳或 "YYYY-MM-DD HH:MM[:SS]" 字符串
+        :return: 毫秒时间戳
+        """
+        if isinstance(value, (int, float)):
+            return value
+        time_format = "%Y-%m-%d %H:%M:%S" if value.count(":") == 2 else "%Y-%m-%d %H:%M"
+        return datetime.strptime(value, time_format).timestamp() * 1000
+
+    def get_room_occupancy(self, room_ids, resv_begin_time, resv_end_time):
+        """
+        一次请求查询多个房间所有座位的预约情况，找出预约时间段内已被占用的座位。
+
+        :param room_ids: 房间 ID 列表
+        :param resv_begin_time: 预约开始时间，形如 "2025-01-01 10:30:00"
+        :param resv_end_time: 预约结束时间
+        :return: 已占用的座位 ID 集合（字符串），查询失败返回 None
+        """
+        params = {
+            "roomIds": ",".join(str(room_id) for room_id in room_ids),
+            "resvDates": resv_begin_time[:10].replace("-", ""),
+            "sysKind": 8,
+        }
+        try:
+            # 放座时刻的辅助查询：短超时、不重试，查不到就不过滤
+            response = send_once(self.session, "GET", self.reserve_url, config.AVAILABILITY_TIMEOUT, params=params)
+            if response.status_code != 200:
+                log(f"查询座位占用失败: 状态码 {response.status_code}")
+                return None
+            result = response.json()
+            if result.get('code') != 0:
+                log(f"查询座位占用失败: {result.get('message')}")
+                return None
+
+            begin = self.parse_resv_time(resv_begin_time)
+            end = self.parse_resv_time(resv_end_time)
+            occupied = set()
+            for device in result.get('data') or []:
+                for resv in device.get('resvInfo') or []:
+                    # 已有预约与预约时间段有重叠即视为占用
+                    if self.parse_resv_time(resv['startTime']) < end and self.parse_resv_time(resv['endTime']) > begin:
+                        occupied.add(str(device['devId']))
+                        break
+            log(f"查询座位占用: {len(result.get('data') or [])} 个座位中 {len(occupied)} 个已被占用")
+            return occupied
+        except Exception as e:
+            log(f"查询座位占用时发生异常: {str(e)}")
+            return None
+
+    def submit_reservation(self, resv_data):
+        """
+        发送预约请求，并在 self.attempts 中记录本次请求的发出、返回时间。
+
+        :param resv_data: build_resv_data 构造的预约请求数据
+        :return: 成功返回预约结果字典，失败返回错误消息
+        """
+        seat_id = resv_data["resvDev"][0]
+        attempt = new_attempt(seat_id)
+        self.attempts.append(attempt)
+
+        with phase_metrics.timer(PHASE_RESERVE_POST):
+            response = self.session.post(self.reserve_url, json=resv_data, timeout=config.RESERVE_TIMEOUT)
+        attempt["returned_at"] = time.time()
+        attempt["status"] = response.status_code
         log(f"预约座位 {seat_id} 响应状态码: {response.status_code}")
         log(f"预约座位 {seat_id} 响应内容: {response.text}")
 
         if response.status_code != 200:
-            return f"座位 {seat_id} 请求失败: 状态码 {response.status_code}"
+            attempt["outcome"] = OUTCOME_HTTP_ERROR
+            attempt["result"] = f"座位 {seat_id} 请求失败: 状态码 {response.status_code}"
+            return attempt["result"]
 
         result = response.json()
         if result.get('code') != 0:
-            return result.get('message')
+            attempt["outcome"] = OUTCOME_REJECTED
+            attempt["result"] = result.get('message')
+            return attempt["result"]
 
-        return {
+        attempt["outcome"] = OUTCOME_SUCCESS
+        attempt["result"] = {
             "message": result["message"],
             "resvName": result["data"]["resvName"],
             "roomName": result["data"]["resvDevInfoList"][0]["roomName"],
             "devName": result["data"]["resvDevInfoList"][0]["devName"],
+            "uuid": result["data"].get("uuid"),
         }
+        return attempt["result"]
+
+    def cancel_reservation(self, resv_uuid):
+        """
+        取消一条已成功的预约。
+
+        :param resv_uuid: 预约的 uuid
+        :return: 成功返回 True，失败返回 False
+        """
+        try:
+            response = self.session.post(self.cancel_url, json={"uuid": resv_uuid}, timeout=config.RESERVE_TIMEOUT)
+            log(f"取消预约 {resv_uuid} 响应内容: {response.text}")
+            return response.status_code == 200 and response.json().get('code') == 0
+        except Exception as e:
+            log(f"取消预约 {resv_uuid} 时发生异常: {str(e)}")
+            return False
+
+    def reserve_single_seat(self, user_info, seat_id, resv_begin_time, resv_end_time):
+        """
+        尝试为单个座位进行预约。
+
+        :param user_info: 用户信息字典
+        :param seat_id: 座位 ID
+        :param resv_begin_time: 预约开始时间
+        :param resv_end_time: 预约结束时间
+        :return: 成功返回预约结果字典，失败返回错误消息
+        """
+        resv_data = self.build_resv_data(user_info, seat_id, resv_begin_time, resv_end_time)
+        return self.submit_reservation(resv_data)
+
+    def reserve_prepared(self, resv_data_list):
+        """
+        按顺序提交预先构造好的预约请求，直到有一个座位预约成功。
+
+        :param resv_data_list: build_resv_data 构造的预约请求数据列表
+        :return: (预约结果信息, 失败消息列表)
+        """
+        if self.hedge_size > 1:
+            return self.reserve_hedged(resv_data_list, self.hedge_size)
+
+        fail_message = []
+        for resv_data in resv_data_list:
+            seat_id = resv_data["resvDev"][0]
+            log(f"\n尝试预约座位: {seat_id}")
+            # 单个座位超时或连接失败只算该座位失败，继续尝试后面的座位
+            result = self._submit_safely(resv_data)
+
+            # 如果是成功的预约结果，返回成功信息
+            if isinstance(result, dict):
+                log(f"座位 {seat_id} 预约成功!")
+                result_data = self.format_result(result)
+                log("预约信息:", result_data)
+                return result_data, fail_message
+
+            # 如果失败，记录失败信息
+            log(f"座位 {seat_id} 预约失败: {result}")
+            if result not in fail_message:
+                fail_message.append(result)
+
+        # 如果所有座位都预约失败
+        return "无已预约结果", fail_message
+
+    def reserve_with_fallback(self, resv_data_list, fallback_data_list):
+        """
+        先预约用户所选的座位，全部失败时在同一个 Session 中继续尝试相邻座位，不需要重新登录。
+        只有所选座位都是因座位本身失败（被别人抢走、请求失败或超时，见 is_seat_failure）时才尝试，
+        用户自身原因的拒绝（已有预约等）换座位也不会成功，不再发出多余的请求。
+        相邻座位的请求记录标记 fallback，用于统计相邻座位带来的成功率提升。
+
+        :param resv_data_list: 所选座位的预约请求数据列表
+        :param fallback_data_list: 相邻座位的预约请求数据列表
+        :return: (预约结果信息, 失败消息列表)
+        """
+        first_attempt = len(self.attempts)
+        success_message, fail_message = self.reserve_prepared(resv_data_list)
+        if success_message != "无已预约结果" or not fallback_data_list:
+            return success_message, fail_message
+        if not all(is_seat_failure(attempt) for attempt in self.attempts[first_attempt:]):
+            log(f"所选座位因用户原因被拒绝，不尝试相邻座位: {fail_message}")
+            return success_message, fail_message
+
+        log(f"\n所选座位均预约失败，尝试相邻座位: {[resv_data['resvDev'][0] for resv_data in fallback_data_list]}")
+        first_attempt = len(self.attempts)
+        success_message, fallback_fail_message = self.reserve_prepared(fallback_data_list)
+        for attempt in self.attempts[first_attempt:]:
+            attempt["fallback"] = True
+        fail_message.extend(message for message in fallback_fail_message if message not in fail_message)
+        return success_message, fail_message
+
+    def reserve_hedged(self, resv_data_list, hedge_size):
+        """
+        每次同时提交 hedge_size 个座位的预约请求，取排名最靠前的成功结果，多余的成功预约立即取消。
+        这一批全部失败时再提交下一批。
+
+        :param resv_data_list: build_resv_data 构造的预约请求数据列表
+        :param hedge_size: 每批并发请求的座位数
+        :return: (预约结果信息, 失败消息列表)
+        """
+        fail_message = []
+        with ThreadPoolExecutor(max_workers=hedge_size) as executor:
+            for start in range(0, len(resv_data_list), hedge_size):
+                batch = resv_data_list[start:start + hedge_size]
+                log(f"\n同时尝试预约座位: {[resv_data['resvDev'][0] for resv_data in batch]}")
+                # map 保持原顺序，结果按座位排名排列
+                results = list(executor.map(self._submit_safely, batch))
+
+                best = None
+                for resv_data, result in zip(batch, results):
+                    seat_id = resv_data["resvDev"][0]
+                    if not isinstance(result, dict):
+                        log(f"座位 {seat_id} 预约失败: {result}")
+                        if result not in fail_message:
+                            fail_message.append(result)
+                    elif best is None:
+                        best = result
+                    else:
+                        # 同一用户只需要一个座位，释放多余的预约
+                        log(f"座位 {seat_id} 也预约成功，取消多余预约")
+                        if result.get("uuid") and self.cancel_reservation(result["uuid"]):
+                            mark_cancelled(self.attempts, result)
+                        else:
+                            log(f"取消座位 {seat_id} 的多余预约失败")
+
+                if best is not None:
+                    result_data = self.format_result(best)
+                    log("预约信息:", result_data)
+                    return result_data, fail_message
+
+        return "无已预约结果", fail_message
+
+    def _submit_safely(self, resv_data):
+        """
+        出现异常（超时、连接失败等）时返回错误消息而不是抛出，一个座位的请求失败不影响后面的座位，
+        并发时也不会丢失同批次中其他座位的成功结果。
+
+        :param resv_data: 预约请求数据
+        :return: 成功返回预约结果字典，失败返回错误消息
+        """
+        try:
+            return self.submit_reservation(resv_data)
+        except Exception as e:
+            return f"出现异常: {str(e)}"
+
+    @staticmethod
+    def format_result(result):
+        """
+        将成功的预约结果字典格式化为结果信息字符串。
+
+        :param result: submit_reservation 返回的预约结果字典
+        :return: 结果信息字符串
+        """
+        return f"{result['message']}，{result['resvName']}，{result['roomName']}，{result['devName']}"
 
     def reserve_seat(self, seat_list, begin_time="10:30", end_time="22:00"):
         """
@@ -243,27 +502,22 @@ class LibrarySystem(BaseSystem):
             # 设置预约时间
             resv_begin_time, resv_end_time = self.get_reservation_time(begin_time, end_time)
 
-            fail_message = []
-            # 遍历座位列表，尝试预约
-            for seat_id in seat_list:
-                log(f"\n尝试预约座位: {seat_id}")
-                result = self.reserve_single_seat(user_info, seat_id, resv_begin_time, resv_end_time)
-
-                # 如果是成功的预约结果，返回成功信息
-                if isinstance(result, dict):
-                    log(f"座位 {seat_id} 预约成功!")
-                    result_data = f"{result['message']}，{result['resvName']}，{result['roomName']}，{result['devName']}"
-                    log("预约信息:", result_data)
-                    return result_data, user_info, fail_message
-
-                # 如果失败，记录失败信息
-                log(f"座位 {seat_id} 预约失败: {result}")
-                if result not in fail_message:
-                    fail_message.append(result)
-
-            # 如果所有座位都预约失败
-            return "无已预约结果", user_info, fail_message
+            # 跳过已被占用的座位，不为它们发出注定失败的预约请求
+            fallback_seats = [seat_id for seat_id in self.fallback_seats if seat_id not in seat_list]
+            if self.availability is not None:
+                seat_list = self.availability.filter_seats(self, seat_list, resv_begin_time, resv_end_time)
+                fallback_seats = self.availability.filter_seats(self, fallback_seats, resv_begin_time, resv_end_time)
+                if not seat_list and not fallback_seats:
+                    return "无已预约结果", user_info, ["所选座位均已被占用"]
+
+            # 遍历座位列表，尝试预约，全部失败时再尝试相邻座位
+            resv_data_list = [self.build_resv_data(user_info, seat_id, resv_begin_time, resv_end_time)
+                              for seat_id in seat_list]
+            fallback_data_list = [self.build_resv_data(user_info, seat_id, resv_begin_time, resv_end_time)
+                                  for seat_id in fallback_seats]
+            success_message, fail_message = self.reserve_with_fallback(resv_data_list, fallback_data_list)
+            return success_message, user_info, fail_message
 
         except Exception as e:
             log(f"预约过程出现异常: {str(e)}")
-            return "无已预约结果", "无用户信息", [f"出现异常: {str(e)}"]
\ No newline at end of file
+            return "无已预约结果", "无用户信息", [f"出现异常: {str(e)}"]
@@ -1,12 +1,40 @@
 import base64
 import random
 import string
+from functools import lru_cache
 
 from Crypto.Util.Padding import pad
 from Crypto.Cipher import AES
 from Crypto.Cipher import PKCS1_v1_5
 from Crypto.PublicKey import RSA
 
+RANDOM_CHARS = string.ascii_letters + string.digits
+
+@lru_cache(maxsize=32)
+def _import_public_key(public_key):
+    """
+    将公钥字符串格式化为 PEM 格式并导入，结果按公钥字符串缓存。
+
+    :param public_key: 公钥字符串
+    :return: RSA 公钥对象
+    """
+    pem = "-----BEGIN PUBLIC KEY-----\n"
+    pem += "\n".join(public_key[i:i + 64] for i in range(0, len(public_key), 64))
+    pem += "\n-----END PUBLIC KEY-----"
+    return RSA.importKey(pem)
+
+
+@lru_cache(maxsize=32)
+def _get_rsa_cipher(public_key):
+    """
+    获取公钥对应的 PKCS1_v1_5 加密对象，结果按公钥字符串缓存。
+
+    :param public_key: 公钥字符串
+    :return: PKCS1_v1_5 加密对象
+    """
+    return PKCS1_v1_5.new(_import_public_key(public_key))
+
+
 class PasswordEncryptor:
     @staticmethod
     def aes_encrypt_password(salt, password):
@@ -18,8 +46,9 @@ class PasswordEncryptor:
         :return: 加密后的密码字符串
         """
         try:
-            random_prefix = ''.join(random.choice(string.ascii_letters + string.digits) for _ in range(64))
-            random_iv = ''.join(random.choice(string.ascii_letters + string.digits) for _ in range(16))
+            # 一次生成 64 位前缀和 16 位 IV
+            random_chars = ''.join(random.choices(RANDOM_CHARS, k=80))
+            random_prefix, random_iv = random_chars[:64], random_chars[64:]
             cipher = AES.new(salt.encode('utf-8'), AES.MODE_CBC, random_iv.encode('utf-8'))
             encrypted_password = base64.b64encode(
                 cipher.encrypt(pad((random_prefix + password).encode('utf-8'), AES.block_size))).decode('utf-8')
@@ -31,15 +60,12 @@ class PasswordEncryptor:
     @staticmethod
     def set_public_key(public_key):
         """
-        将公钥字符串格式化为 PEM 格式，并导入为 RSA 公钥。
+        将公钥字符串格式化为 PEM 格式，并导入为 RSA 公钥。相同的公钥字符串只会导入一次。
 
         :param public_key: 公钥字符串
         :return: RSA 公钥对象
         """
-        pem = "-----BEGIN PUBLIC KEY-----\n"
-        pem += "\n".join(public_key[i:i + 64] for i in range(0, len(public_key), 64))
-        pem += "\n-----END PUBLIC KEY-----"
-        return RSA.importKey(pem)
+        return _import_public_key(public_key)
 
     @staticmethod
     def encrypt_with_public_key(public_key, text):
@@ -53,4 +79,65 @@ class PasswordEncryptor:
         text_bytes = text.encode('utf-8')
         cipher = PKCS1_v1_5.new(public_key)
         encrypted = cipher.encrypt(text_bytes)
-        return base64.b64encode(encrypted).decode('utf-8')
\ No newline at end of file
+        return base64.b64encode(encrypted).decode('utf-8')
+
+    @staticmethod
+    def rsa_encrypt(public_key, text):
+        """
+        使用公钥字符串加密文本，导入的公钥和加密对象都会按公钥字符串缓存复用。
+
+        :param public_key: 公钥字符串
+        :param text: 需要加密的文本
+        :return: 加密后的文本（base64 编码字符串）
+        """
+        encrypted = _get_rsa_cipher(public_key).encrypt(text.encode('utf-8'))
+        return base64.b64encode(encrypted).decode('utf-8')
+
+    @staticmethod
+    def rsa_encrypt_batch(items):
+        """
+        批量加密多个用户的登录凭据。
+
+        :param items: [(public_key, text), ...]，public_key 为公钥字符串
+        :return: 与 items 顺序一致的加密结果列表
+        """
+        return [PasswordEncryptor.rsa_encrypt(public_key, text) for public_key, text in items]
+
+    @staticmethod
+    def aes_encrypt_batch(salt, passwords):
+        """
+        使用同一个盐值批量加密多个密码。
+
+        :param salt: 加密盐值
+        :param passwords: 原始密码列表
+        :return: 与 passwords 顺序一致的加密结果列表
+        """
+        return [PasswordEncryptor.aes_encrypt_password(salt, password) for password in passwords]
+
+
+# 微基准测试：对比每次登录的加密耗时
+if __name__ == "__main__":
+    import timeit
+
+    public_key = base64.b64encode(RSA.generate(1024).publickey().export_key(format="DER")).decode()
+    salt = "0123456789abcdef"
+    rounds = 200
+
+    def old_rsa():
+        pem = "-----BEGIN PUBLIC KEY-----\n"
+        pem += "\n".join(public_key[i:i + 64] for i in range(0, len(public_key), 64))
+        pem += "\n-----END PUBLIC KEY-----"
+        PasswordEncryptor.encrypt_with_public_key(RSA.importKey(pem), "password;nonce")
+
+    def old_aes():
+        random_prefix = ''.join(random.choice(RANDOM_CHARS) for _ in range(64))
+        random_iv = ''.join(random.choice(RANDOM_CHARS) for _ in range(16))
+        cipher = AES.new(salt.encode('utf-8'), AES.MODE_CBC, random_iv.encode('utf-8'))
+        base64.b64encode(cipher.encrypt(pad((random_prefix + "password").encode('utf-8'), AES.block_size)))
+
+    for name, old, new in (
+            ("RSA", old_rsa, lambda: PasswordEncryptor.rsa_encrypt(public_key, "password;nonce")),
+            ("AES", old_aes, lambda: PasswordEncryptor.aes_encrypt_password(salt, "password"))):
+        old_time = timeit.timeit(old, number=rounds) / rounds * 1e6
+        new_time = timeit.timeit(new, number=rounds) / rounds * 1e6
+        print(f"{name}: 原实现 {old_time:.1f}us/次，缓存实现 {new_time:.1f}us/次，提升 {old_time / new_time:.1f} 倍")
@@ -0,0 +1,214 @@
+import bisect
+import threading
+import time
+
+# 预约流程的各个阶段
+PHASE_VPN_INITIAL_PAGE = "vpn_initial_page"      # 获取 VPN 登录页面
+PHASE_VPN_FORM_EXTRACT = "vpn_form_extract"      # 提取 salt 和 lt
+PHASE_VPN_AES_ENCRYPT = "vpn_aes_encrypt"        # AES 加密 VPN 密码
+PHASE_VPN_LOGIN_POST = "vpn_login_post"          # 提交 VPN 登录请求
+PHASE_INITIAL_COOKIE = "initial_cookie"          # 访问图书馆首页获取初始 Cookie
+PHASE_PUBLIC_KEY = "public_key"                  # 获取公钥和随机字符串
+PHASE_RSA_ENCRYPT = "rsa_encrypt"                # RSA 加密图书馆密码
+PHASE_LOGIN_POST = "login_post"                  # 提交图书馆登录请求
+PHASE_RESERVE_POST = "reserve_post"              # 提交一次预约请求
+
+PHASES = (PHASE_VPN_INITIAL_PAGE, PHASE_VPN_FORM_EXTRACT, PHASE_VPN_AES_ENCRYPT, PHASE_VPN_LOGIN_POST,
+          PHASE_INITIAL_COOKIE, PHASE_PUBLIC_KEY, PHASE_RSA_ENCRYPT, PHASE_LOGIN_POST, PHASE_RESERVE_POST)
+
+# 直方图桶的上界（秒），覆盖本地加密（毫秒以下）到超时的网络请求
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Prometheus 指标名
+METRIC_NAME = "library_phase_duration_seconds"
+
+def log(*args):
+    """
+    统一打印日志函数。
+
+    :param args: 打印的内容
+    :return: None
+    """
+    # print(*args)
+    pass
+
+class PhaseTimer:
+    __slots__ = ("metrics", "phase", "start")
+
+    def __init__(self, metrics, phase):
+        """
+        计时上下文管理器，退出时（包括抛出异常）将耗时记入直方图。
+
+        :param metrics: PhaseMetrics 对象
+        :param phase: 阶段名称
+        """
+        self.metrics = metrics
+        self.phase = phase
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.metrics.observe(self.phase, time.perf_counter() - self.start)
+        return False
+
+
+class PhaseMetrics:
+    def __init__(self, buckets=BUCKETS):
+        """
+        进程内各阶段耗时的直方图，可在多个线程中同时记录。
+
+        每个阶段只保存各个桶的计数、总耗时和最大耗时，记录一次耗时是一次二分查找和几次加法，
+        不保存单次耗时，内存占用与请求数无关。
+
+        :param buckets: 桶的上界（秒），从小到大排列
+        """
+        self.buckets = tuple(buckets)
+        # {阶段: [各桶计数(最后一个为超过所有上界的计数), 总耗时, 次数, 最大耗时]}
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def timer(self, phase):
+        """
+        为一个阶段计时：with phase_metrics.timer(PHASE_LOGIN_POST): ...
+
+        :param phase: 阶段名称
+        :return: PhaseTimer 对象
+        """
+        return PhaseTimer(self, phase)
+
+    def observe(self, phase, seconds):
+        """
+        记录一次耗时。
+
+        :param phase: 阶段名称
+        :param seconds: 耗时（秒）
+        :return: None
+        """
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            histogram = self._histograms.get(phase)
+            if histogram is None:
+                histogram = self._histograms[phase] = [[0] * (len(self.buckets) + 1), 0.0, 0, 0.0]
+            histogram[0][index] += 1
+            histogram[1] += seconds
+            histogram[2] += 1
+            if seconds > histogram[3]:
+                histogram[3] = seconds
+
+    def snapshot(self):
+        """
+        复制当前的统计数据，可序列化为 JSON。
+
+        :return: {阶段: {"buckets": 各桶计数, "sum": 总耗时, "count": 次数, "max": 最大耗时}}
+        """
+        with self._lock:
+            return {phase: {"buckets": list(histogram[0]), "sum": histogram[1],
+                            "count": histogram[2], "max": histogram[3]}
+                    for phase, histogram in self._histograms.items()}
+
+    def drain(self):
+        """
+        取出当前的统计数据并清空，每次预约运行结束时调用，常驻进程的下一次运行从零开始统计。
+
+        :return: snapshot() 格式的字典
+        """
+        with self._lock:
+            histograms, self._histograms = self._histograms, {}
+        return {phase: {"buckets": histogram[0], "sum": histogram[1], "count": histogram[2], "max": histogram[3]}
+                for phase, histogram in histograms.items()}
+
+
+def merge_snapshots(total, snapshot):
+    """
+    将一份统计数据累加到 total 中（桶的上界必须相同）。
+
+    :param total: snapshot() 格式的字典，原地修改
+    :param snapshot: snapshot() 格式的字典
+    :return: total
+    """
+    for phase, histogram in snapshot.items():
+        entry = total.get(phase)
+        if entry is None:
+            total[phase] = {"buckets": list(histogram["buckets"]), "sum": histogram["sum"],
+                            "count": histogram["count"], "max": histogram["max"]}
+            continue
+        entry["buckets"] = [a + b for a, b in zip(entry["buckets"], histogram["buckets"])]
+        entry["sum"] += histogram["sum"]
+        entry["count"] += histogram["count"]
+        entry["max"] = max(entry["max"], histogram["max"])
+    return total
+
+
+def format_summary(snapshot):
+    """
+    将统计数据格式化为一行日志，按流程顺序列出每个阶段的次数、平均和最大耗时。
+
+    :param snapshot: snapshot() 格式的字典
+    :return: 字符串
+    """
+    parts = []
+    for phase in sorted(snapshot, key=lambda name: PHASES.index(name) if name in PHASES else len(PHASES)):
+        histogram = snapshot[phase]
+        if histogram["count"]:
+            parts.append(f"{phase} {histogram['count']} 次 平均 {histogram['sum'] / histogram['count'] * 1000:.1f}ms "
+                         f"最大 {histogram['max'] * 1000:.1f}ms")
+    return "，".join(parts)
+
+
+def render_prometheus(snapshot, runs=None, buckets=BUCKETS):
+    """
+    输出 Prometheus 文本格式（0.0.4）的直方图。
+
+    :param snapshot: snapshot() 格式的字典
+    :param runs: 可选，已记录的预约运行次数
+    :param buckets: 桶的上界（秒）
+    :return: 字符串
+    """
+    lines = [f"# HELP {METRIC_NAME} 预约流程各阶段耗时（秒）", f"# TYPE {METRIC_NAME} histogram"]
+    for phase in sorted(snapshot):
+        histogram = snapshot[phase]
+        cumulative = 0
+        for bound, count in zip(buckets, histogram["buckets"]):
+            cumulative += count
+            lines.append(f'{METRIC_NAME}_bucket{{phase="{phase}",le="{bound}"}} {cumulative}')
+        lines.append(f'{METRIC_NAME}_bucket{{phase="{phase}",le="+Inf"}} {histogram["count"]}')
+        lines.append(f'{METRIC_NAME}_sum{{phase="{phase}"}} {histogram["sum"]!r}')
+        lines.append(f'{METRIC_NAME}_count{{phase="{phase}"}} {histogram["count"]}')
+    if runs is not None:
+        lines.append("# HELP library_reservation_runs_total 已记录的预约运行次数")
+        lines.append("# TYPE library_reservation_runs_total counter")
+        lines.append(f"library_reservation_runs_total {runs}")
+    return "\n".join(lines) + "\n"
+
+
+# 进程内共用的阶段耗时统计
+phase_metrics = PhaseMetrics()
+
+
+# 计时开销测试：python -m utils.phase_metrics
+if __name__ == "__main__":
+    import timeit
+
+    metrics = PhaseMetrics()
+    rounds = 100000
+
+    def timed():
+        with metrics.timer(PHASE_RSA_ENCRYPT):
+            pass
+
+    overhead = timeit.timeit(timed, number=rounds) / rounds * 1e6
+    snapshot = metrics.snapshot()
+    assert snapshot[PHASE_RSA_ENCRYPT]["count"] == rounds
+    assert sum(snapshot[PHASE_RSA_ENCRYPT]["buckets"]) == rounds
+
+    metrics.observe(PHASE_LOGIN_POST, 0.3)
+    metrics.observe(PHASE_LOGIN_POST, 20)
+    text = render_prometheus(metrics.snapshot(), runs=1)
+    assert f'{METRIC_NAME}_bucket{{phase="login_post",le="0.5"}} 1' in text
+    assert f'{METRIC_NAME}_bucket{{phase="login_post",le="+Inf"}} 2' in text
+    print(text)
+    print(format_summary(metrics.snapshot()))
+    print(f"每次计时开销: {overhead:.2f}µs")
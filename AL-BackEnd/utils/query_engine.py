@@ -0,0 +1,117 @@
+import sqlite3
+import time
+
+from utils import config
+from utils.library_database import ConnectionPool
+
+# 每执行多少条 SQLite 虚拟机指令检查一次是否超时
+PROGRESS_STEPS = 1000
+
+class QueryTimeout(Exception):
+    """
+    查询超过耗时上限被中断。
+    """
+    pass
+
+
+class QueryResult:
+    def __init__(self, engine, conn, cursor, deadline):
+        """
+        只读查询的结果，逐行读取，读完或关闭时归还连接。
+
+        :param engine: QueryEngine 对象
+        :param conn: 执行查询的连接
+        :param cursor: 已执行查询的游标
+        :param deadline: 查询截止时间（time.perf_counter()）
+        """
+        self.engine = engine
+        self.columns = [desc[0] for desc in cursor.description] if cursor.description else []
+        self.row_count = 0
+        # 结果超过行数上限被截断时为 True
+        self.truncated = False
+        self._conn = conn
+        self._cursor = cursor
+        self._deadline = deadline
+
+    def __iter__(self):
+        """
+        逐行返回查询结果，最多返回 engine.max_rows 行。
+
+        :return: 生成器，元素为元组
+        """
+        try:
+            for row in self._cursor:
+                if self.row_count >= self.engine.max_rows:
+                    self.truncated = True
+                    return
+                self.row_count += 1
+                yield row
+        except sqlite3.OperationalError as e:
+            if time.perf_counter() > self._deadline:
+                raise QueryTimeout(f"查询超过 {self.engine.time_budget}s 被中断") from e
+            raise
+        finally:
+            self.close()
+
+    def close(self):
+        """
+        结束查询并归还连接，可重复调用。
+
+        :return: None
+        """
+        if self._conn is not None:
+            self._cursor.close()
+            self.engine.release(self._conn)
+            self._conn = None
+
+
+class QueryEngine:
+    def __init__(self, db_name=config.DB_NAME, max_rows=config.SQL_MAX_ROWS, time_budget=config.SQL_TIME_BUDGET):
+        """
+        只读查询引擎。
+
+        - 连接以 mode=ro 打开，任何写操作都会失败；
+        - 每条查询（包括读取结果的过程）有耗时上限，超时由 progress handler 中断，不会长时间占用读锁；
+        - 结果逐行读取，最多返回 max_rows 行，不会一次性读入内存；
+        - 连接在请求之间复用，sqlite3 在每个连接上缓存预编译语句，重复的查询无需重新编译。
+
+        :param db_name: 数据库文件路径
+        :param max_rows: 每条查询最多返回的行数
+        :param time_budget: 每条查询的耗时上限（秒）
+        """
+        self.pool = ConnectionPool(db_name, read_only=True)
+        self.max_rows = max_rows
+        self.time_budget = time_budget
+
+    def execute(self, sql, params=()):
+        """
+        执行一条只读查询。
+
+        :param sql: SQL 语句（只能是一条语句）
+        :param params: 查询参数
+        :return: QueryResult 对象，需要迭代读完或调用 close() 归还连接
+        """
+        conn = self.pool.acquire()
+        deadline = time.perf_counter() + self.time_budget
+        conn.set_progress_handler(lambda: time.perf_counter() > deadline, PROGRESS_STEPS)
+        try:
+            cursor = conn.execute(sql, params)
+        except sqlite3.OperationalError as e:
+            self.release(conn)
+            if time.perf_counter() > deadline:
+                raise QueryTimeout(f"查询超过 {self.time_budget}s 被中断") from e
+            raise
+        except Exception:
+            self.release(conn)
+            raise
+        return QueryResult(self, conn, cursor, deadline)
+
+    def release(self, conn):
+        """
+        清除超时检查并归还连接。
+
+        :param conn: sqlite3.Connection 对象
+        :return: None
+        """
+        conn.set_progress_handler(None, 0)
+        self.pool.release(conn)
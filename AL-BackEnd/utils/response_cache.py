@@ -0,0 +1,98 @@
+import hashlib
+import threading
+import time
+
+class ResponseCache:
+    def __init__(self, ttl=0):
+        """
+        进程内的接口响应缓存，缓存序列化好的响应体及其 ETag，命中时不需要查询数据库，也不需要重新序列化。
+
+        :param ttl: 缓存有效时长（秒），0 表示只在 invalidate() 时失效
+        """
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        查询缓存。
+
+        :param key: 缓存键
+        :return: (响应体 bytes, ETag)，未命中返回 None
+        """
+        entry = self._entries.get(key)
+        if entry is not None and (not self.ttl or time.time() - entry[2] < self.ttl):
+            self.hits += 1
+            return entry[0], entry[1]
+        self.misses += 1
+        return None
+
+    def set(self, key, body):
+        """
+        写入缓存，ETag 由响应体的哈希生成，内容相同的响应 ETag 相同。
+
+        :param key: 缓存键
+        :param body: 序列化好的响应体（str 或 bytes）
+        :return: (响应体 bytes, ETag)
+        """
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        etag = hashlib.sha1(body).hexdigest()
+        with self._lock:
+            self._entries[key] = (body, etag, time.time())
+        return body, etag
+
+    def invalidate(self):
+        """
+        清空缓存，数据发生变化时调用。
+
+        :return: None
+        """
+        with self._lock:
+            self._entries = {}
+
+    def stats(self):
+        """
+        缓存命中统计。
+
+        :return: {"hits": 命中次数, "misses": 未命中次数, "entries": 缓存条目数}
+        """
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries)}
+
+
+class VersionedCache(ResponseCache):
+    def __init__(self, table_name, check_interval=1.0):
+        """
+        依赖某张表的响应缓存，可在多进程间失效。
+
+        表中数据的每次增删改都会通过触发器增加 table_versions 中的版本号（无论由哪个进程写入），
+        validate() 发现版本号变化时清空缓存。版本号最多每 check_interval 秒查询一次，
+        两次查询之间的请求只是字典查找。
+
+        :param table_name: 缓存所依赖的表名
+        :param check_interval: 查询版本号的最小间隔（秒），0 表示每次都查询
+        """
+        super().__init__()
+        self.table_name = table_name
+        self.check_interval = check_interval
+        self.version = None
+        self._last_check = 0
+
+    def validate(self, get_db):
+        """
+        距上次查询超过 check_interval 时查询表的版本号，版本号变化则清空缓存。
+
+        :param get_db: 返回 LibraryDatabase 对象的函数，只在需要查询时调用
+        :return: None
+        """
+        now = time.time()
+        if now - self._last_check < self.check_interval:
+            return
+        version = get_db().get_table_version(self.table_name)
+        with self._lock:
+            self._last_check = now
+            if version != self.version:
+                self._entries = {}
+                self.version = version
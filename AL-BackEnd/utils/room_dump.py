@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+import json
+import re
+import time
+
+from utils.library_database import LibraryDatabase
+
+# 流式解析时关心的字符: 字符串引号、转义符和容器括号
+TOKEN_PATTERN = re.compile(r'["\\{}\[\]]')
+
+def log(*args):
+    """
+    统一打印日志函数。
+
+    :param args: 打印的内容
+    :return: None
+    """
+    # print(*args)
+    pass
+
+def iter_json_records(file, chunk_size=1 << 16):
+    """
+    流式读取 JSON 文件中的设备记录，内存占用只与单条记录的大小有关。
+
+    记录为最外层数组 [{...}, {...}] 中的对象，或最外层对象中 data 数组的对象，
+    例如 ic-web 接口响应 {"code": 0, "data": [{...}, {...}]}；其他键（例如 "extra": [{...}]）中的对象不会作为记录。
+    每条记录完整读取后整体解析，字段不会与其他记录错位。
+
+    :param file: 以文本模式打开的文件对象
+    :param chunk_size: 每次读取的字符数
+    :return: 生成器，元素为记录字典
+    """
+    stack = []             # 当前所在的容器类型 "{" 或 "["
+    in_string = False
+    escape = False         # 上一个块以字符串中的转义符结尾
+    record_depth = None    # 记录所在的深度，进入记录数组时确定
+    in_records = False     # 是否在记录数组中
+    pieces = None          # 正在读取的记录文本片段
+    key_pieces = None      # 正在读取的最外层对象中的字符串片段
+    last_key = None        # 最外层对象中最后读完的字符串，数组之前的字符串即为该数组的键
+
+    while True:
+        chunk = file.read(chunk_size)
+        if not chunk:
+            break
+        start = 0      # 当前记录在本块中的起始位置
+        key_start = 0  # 当前字符串在本块中的起始位置
+        skip_until = 1 if escape else 0
+        escape = False
+        for match in TOKEN_PATTERN.finditer(chunk):
+            index = match.start()
+            if index < skip_until:
+                continue
+            token = match.group()
+            if in_string:
+                if token == "\\":
+                    if index + 1 >= len(chunk):
+                        escape = True
+                    skip_until = index + 2
+                elif token == '"':
+                    in_string = False
+                    if key_pieces is not None:
+                        key_pieces.append(chunk[key_start:index])
+                        last_key = "".join(key_pieces)
+                        key_pieces = None
+                continue
+            if token == '"':
+                in_string = True
+                if len(stack) == 1 and stack[0] == "{":
+                    key_pieces = []
+                    key_start = index + 1
+            elif token in "{[":
+                if token == "[" and (not stack or (len(stack) == 1 and stack[0] == "{" and last_key == "data")):
+                    record_depth = len(stack) + 1
+                    in_records = True
+                elif token == "{" and in_records and pieces is None and len(stack) == record_depth:
+                    pieces = []
+                    start = index
+                stack.append(token)
+            elif token in "}]":
+                if not stack:
+                    raise ValueError("JSON 格式错误: 括号不匹配")
+                stack.pop()
+                if pieces is not None and token == "}" and len(stack) == record_depth:
+                    pieces.append(chunk[start:index + 1])
+                    yield json.loads("".join(pieces))
+                    pieces = None
+                elif in_records and token == "]" and len(stack) == record_depth - 1:
+                    in_records = False
+        if pieces is not None:
+            pieces.append(chunk[start:])
+        if key_pieces is not None:
+            key_pieces.append(chunk[key_start:])
+
+    if stack or pieces is not None:
+        raise ValueError("JSON 格式错误: 文件不完整")
+
+
+def parse_device(record, location=None):
+    """
+    从 ic-web 设备记录中提取设备信息。
+
+    :param record: 设备记录字典
+    :param location: 可选，指定位置；默认使用记录中的 roomName
+    :return: {"devId", "devName", "location", "roomId"}，缺少必要字段时返回 None
+    """
+    devId = record.get("devSn", record.get("devId"))
+    devName = record.get("devName")
+    location = location or record.get("roomName")
+    if devId is None or not devName or not location:
+        return None
+    return {"devId": str(devId), "devName": devName, "location": location, "roomId": record.get("roomId")}
+
+
+def ingest_room_dumps(paths, db_path=None, location=None, batch_size=500):
+    """
+    流式导入一个或多个 ic-web 房间设备 JSON 文件，批量写入 devices 表。
+
+    :param paths: JSON 文件路径列表
+    :param db_path: 数据库文件路径，默认使用配置中的数据库
+    :param location: 可选，指定所有设备的位置；默认使用每条记录的 roomName
+    :param batch_size: 每个事务写入的设备数
+    :return: {"devices": 写入的设备数, "skipped": 缺少字段被跳过的记录数, "rooms": {位置: 房间 ID}}
+    """
+    start_time = time.perf_counter()
+    db = LibraryDatabase(db_name=db_path) if db_path else LibraryDatabase()
+    summary = {"devices": 0, "skipped": 0, "rooms": {}}
+    try:
+        for path in paths:
+            batch = []
+            with open(path, "r", encoding="utf-8") as file:
+                for record in iter_json_records(file):
+                    device = parse_device(record, location)
+                    if device is None:
+                        summary["skipped"] += 1
+                        log(f"跳过缺少 devSn/devName/roomName 的记录: {record}")
+                        continue
+                    summary["rooms"].setdefault(device["location"], device["roomId"])
+                    batch.append(device)
+                    if len(batch) >= batch_size:
+                        db.upsert_devices(batch)
+                        summary["devices"] += len(batch)
+                        batch = []
+            if batch:
+                db.upsert_devices(batch)
+                summary["devices"] += len(batch)
+    finally:
+        db.close()
+
+    rooms = "，".join(f"{name}(roomId {room_id})" for name, room_id in summary["rooms"].items())
+    print(f"房间设备导入完成: {len(paths)} 个文件，写入 {summary['devices']} 个座位，"
+          f"跳过 {summary['skipped']} 条记录，耗时 {(time.perf_counter() - start_time) * 1000:.1f}ms，房间: {rooms}")
+    return summary
+
+
+# 导入房间设备数据：python -m utils.room_dump 文件1.json [文件2.json ...] [--location 位置]
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="流式导入 ic-web 房间设备 JSON 到 devices 表")
+    parser.add_argument("paths", nargs="+", help="ic-web 设备列表接口的响应 JSON 文件")
+    parser.add_argument("--location", help="指定位置，默认使用记录中的 roomName")
+    parser.add_argument("--db", help="数据库文件路径，默认使用 .env 中的 DB_NAME")
+    parser.add_argument("--batch-size", type=int, default=500, help="每个事务写入的设备数")
+    args = parser.parse_args()
+
+    ingest_room_dumps(args.paths, args.db, args.location, args.batch_size)
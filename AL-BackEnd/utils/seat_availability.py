@@ -0,0 +1,168 @@
+from concurrent.futures import Future
+import threading
+import time
+
+from utils import config
+
+_shared_availability = None
+_shared_availability_lock = threading.Lock()
+
+def log(*args):
+    """
+    统一打印日志函数。
+
+    :param args: 打印的内容
+    :return: None
+    """
+    # print(*args)
+    pass
+
+class SeatAvailability:
+    def __init__(self, room_ids, ttl=config.AVAILABILITY_TTL):
+        """
+        房间座位占用快照，同一次运行中所有用户共用。
+
+        一次请求查询所有房间在预约时间段内的占用情况，快照在 ttl 秒内复用。
+        多个线程同时需要同一时间段的快照时只有一个线程发出请求，其余线程等待该请求的结果；
+        锁只保护快照字典，不在持锁时发出请求，不同时间段的查询互不阻塞。
+
+        :param room_ids: 房间 ID 列表
+        :param ttl: 快照有效时长（秒）
+        """
+        self.room_ids = list(room_ids)
+        self.ttl = ttl
+        self.fetch_count = 0
+        # {(resv_begin_time, resv_end_time): (查询时间, 已占用的座位 ID 集合或 None)}
+        self._snapshots = {}
+        # 正在查询的时间段 {(resv_begin_time, resv_end_time): Future}
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def get_occupied(self, library, resv_begin_time, resv_end_time):
+        """
+        获取预约时间段内已被占用的座位，快照过期时使用 library 的已登录 Session 重新查询。
+
+        :param library: 已登录的 LibrarySystem 对象
+        :param resv_begin_time: 预约开始时间
+        :param resv_end_time: 预约结束时间
+        :return: 已占用的座位 ID 集合，查询失败返回 None
+        """
+        key = (resv_begin_time, resv_end_time)
+        with self._lock:
+            snapshot = self._snapshots.get(key)
+            if snapshot is not None and time.time() - snapshot[0] < self.ttl:
+                return snapshot[1]
+            future = self._pending.get(key)
+            if future is not None:
+                owner = False
+            else:
+                owner = True
+                future = self._pending[key] = Future()
+                self.fetch_count += 1
+
+        if not owner:
+            return future.result()
+
+        occupied = None
+        try:
+            occupied = library.get_room_occupancy(self.room_ids, resv_begin_time, resv_end_time)
+        finally:
+            with self._lock:
+                # 查询失败也缓存，避免每个用户都重新请求一次
+                self._snapshots[key] = (time.time(), occupied)
+                del self._pending[key]
+            future.set_result(occupied)
+        return occupied
+
+    def filter_seats(self, library, seat_list, resv_begin_time, resv_end_time):
+        """
+        从座位列表中去掉已被占用的座位，保持原有顺序。查询失败时不做过滤。
+
+        :param library: 已登录的 LibrarySystem 对象
+        :param seat_list: 座位 ID 列表
+        :param resv_begin_time: 预约开始时间
+        :param resv_end_time: 预约结束时间
+        :return: 空闲座位 ID 列表
+        """
+        occupied = self.get_occupied(library, resv_begin_time, resv_end_time)
+        if occupied is None:
+            return list(seat_list)
+        free_seats = [seat_id for seat_id in seat_list if str(seat_id) not in occupied]
+        log(f"座位占用快照: {len(seat_list)} 个座位中 {len(free_seats)} 个空闲")
+        return free_seats
+
+
+def get_shared_availability():
+    """
+    获取进程内共用的座位占用快照，未配置 ROOM_IDS 时返回 None。
+
+    :return: SeatAvailability 对象或 None
+    """
+    global _shared_availability
+    if not config.ROOM_IDS:
+        return None
+    with _shared_availability_lock:
+        if _shared_availability is None:
+            _shared_availability = SeatAvailability(config.ROOM_IDS)
+        return _shared_availability
+
+
+# 使用本地模拟的 ic-web 接口演示：python -m utils.seat_availability
+if __name__ == "__main__":
+    from concurrent.futures import ThreadPoolExecutor
+    from datetime import datetime
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    from urllib.parse import urlparse, parse_qs
+    import json
+
+    from utils.library_system import LibrarySystem
+
+    resv_begin_time, resv_end_time = LibrarySystem.get_reservation_time("10:30", "22:00")
+
+    def to_ms(value):
+        return int(datetime.strptime(value, "%Y-%m-%d %H:%M:%S").timestamp() * 1000)
+
+    # 模拟数据: 座位 1、3 全天被占用，座位 4 只在预约时间段之前被占用
+    day_start = to_ms(resv_begin_time[:10] + " 00:00:00")
+    stub_devices = [
+        {"devId": 1, "resvInfo": [{"startTime": to_ms(resv_begin_time), "endTime": to_ms(resv_end_time)}]},
+        {"devId": 2, "resvInfo": []},
+        {"devId": 3, "resvInfo": [{"startTime": to_ms(resv_begin_time) + 3600000, "endTime": to_ms(resv_end_time)}]},
+        {"devId": 4, "resvInfo": [{"startTime": day_start, "endTime": to_ms(resv_begin_time)}]},
+        {"devId": 5, "resvInfo": None},
+    ]
+    stub_requests = []
+
+    class StubHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlparse(self.path)
+            stub_requests.append(parse_qs(url.query))
+            body = json.dumps({"code": 0, "message": "", "data": stub_devices}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    availability = SeatAvailability(["100455344"], ttl=5)
+
+    def check(seat_list):
+        library = LibrarySystem("user", "password")
+        library.reserve_url = f"http://127.0.0.1:{server.server_port}/ic-web/reserve"
+        return availability.filter_seats(library, seat_list, resv_begin_time, resv_end_time)
+
+    # 8 个用户同时过滤座位列表，只应发出一次查询
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(check, [["1", "2", "3", "4", "5", "6"]] * 8))
+    server.shutdown()
+
+    assert all(result == ["2", "4", "5", "6"] for result in results), results
+    assert len(stub_requests) == 1 and availability.fetch_count == 1, stub_requests
+    assert stub_requests[0]["roomIds"] == ["100455344"] and stub_requests[0]["resvDates"] == [resv_begin_time[:10].replace("-", "")]
+    print(f"空闲座位: {results[0]}，8 个用户共发出 {len(stub_requests)} 次占用查询")
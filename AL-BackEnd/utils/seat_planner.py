@@ -0,0 +1,56 @@
+def log(*args):
+    """
+    统一打印日志函数。
+
+    :param args: 打印的内容
+    :return: None
+    """
+    # print(*args)
+    pass
+
+def plan_seat_assignment(entries):
+    """
+    在预约开始前为所有用户统一分配首选座位，避免自己人之间互相抢同一个座位。
+
+    按优先级从高到低依次分配（串行独裁匹配）：每个用户拿到自己列表中排名最靠前、
+    且尚未分配给更高优先级用户的座位，作为第一次请求的目标，分配到首选座位的用户之间，
+    第一次请求没有两个用户指向同一个 devId。
+    其余座位作为后备顺序：没有被别人选为首选的座位保持原顺序排在前面，
+    已被别人选为首选的座位移到最后（只有对方失败时才可能空出）。
+
+    若某用户的座位全部被更高优先级的用户选为首选，该用户没有独占的首选座位（记入 deferred），
+    第一次请求就会与分配到该座位的用户竞争。调用方应把这些用户排在最后调度，尽量让对方先完成预约。
+
+    :param entries: [(pid, priority, seat_id_list), ...]，seat_id_list 为用户按偏好排列的座位 ID
+    :return: (plan, deferred)，plan 为 {pid: 重新排列后的 seat_id_list}，分配到首选座位时首个元素即该座位；
+             deferred 为没有独占首选座位的 pid 集合
+    """
+    ordered = sorted(entries, key=lambda entry: entry[1], reverse=True)
+
+    # 第一轮：按优先级分配互不冲突的首选座位
+    first_choice = {}
+    claimed = set()
+    deferred = set()
+    for pid, _, seat_id_list in ordered:
+        for seat_id in seat_id_list:
+            if seat_id not in claimed:
+                first_choice[pid] = seat_id
+                claimed.add(seat_id)
+                break
+        else:
+            deferred.add(pid)
+            log(f"用户 {pid} 的座位均已分配给更高优先级的用户")
+
+    # 第二轮：生成每个用户的后备顺序
+    plan = {}
+    for pid, _, seat_id_list in ordered:
+        own = first_choice.get(pid)
+        seen = {own}
+        free_seats, contested_seats = [], []
+        for seat_id in seat_id_list:
+            if seat_id in seen:
+                continue
+            seen.add(seat_id)
+            (contested_seats if seat_id in claimed else free_seats).append(seat_id)
+        plan[pid] = ([own] if own is not None else []) + free_seats + contested_seats
+    return plan, deferred
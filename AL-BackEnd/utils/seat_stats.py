@@ -0,0 +1,240 @@
+import itertools
+import time
+
+from utils import config
+from utils.attempt_log import OUTCOME_SUCCESS, OUTCOME_CANCELLED, OUTCOME_REJECTED, is_seat_taken
+
+def log(*args):
+    """
+    统一打印日志函数。
+
+    :param args: 打印的内容
+    :return: None
+    """
+    # print(*args)
+    pass
+
+# time-to-loss 的参考值（秒）：失败时距运行开始越短于此值，座位被认为竞争越激烈
+TIME_TO_LOSS_SCALE = 1.0
+
+class SeatStats:
+    def __init__(self, half_life_days=config.SEAT_STATS_HALF_LIFE_DAYS):
+        """
+        每个座位的历史预约胜负统计。
+
+        预约成功（包括并发预约中被取消的多余成功）记为胜，因座位已被别人预约而被拒绝记为负；
+        请求失败以及已有预约、不在预约时间等与座位无关的拒绝不计。
+        所有计数按指数衰减，half_life_days 天前的一次结果只相当于现在的半次。
+        另外记录每次失败时距本次运行第一个请求的时间（time-to-loss），越小说明座位被抢得越快。
+
+        :param half_life_days: 半衰期（天）
+        """
+        self.half_life = half_life_days * 86400
+        # {devId: [胜, 负, time-to-loss 加权和, time-to-loss 权重, 最后更新时间]}
+        self.seats = {}
+
+    def _decay(self, entry, timestamp):
+        """
+        将座位的统计衰减到指定时间。
+
+        :param entry: self.seats 中的记录
+        :param timestamp: 时间戳
+        :return: None
+        """
+        elapsed = timestamp - entry[4]
+        if elapsed > 0:
+            factor = 0.5 ** (elapsed / self.half_life)
+            for index in range(4):
+                entry[index] *= factor
+            entry[4] = timestamp
+
+    def update(self, devId, outcome, sent_at, message=None, time_to_loss=None):
+        """
+        记录一次预约请求的结果。
+
+        :param devId: 座位 ID
+        :param outcome: 结果代码（见 utils.attempt_log）
+        :param sent_at: 请求发出时间戳
+        :param message: 被拒绝时图书馆返回的消息
+        :param time_to_loss: 失败时距本次运行第一个请求的秒数
+        :return: None
+        """
+        if outcome in (OUTCOME_SUCCESS, OUTCOME_CANCELLED):
+            win = True
+        elif outcome == OUTCOME_REJECTED and is_seat_taken(message):
+            win = False
+        else:
+            return
+        entry = self.seats.setdefault(str(devId), [0.0, 0.0, 0.0, 0.0, sent_at])
+        self._decay(entry, sent_at)
+        if win:
+            entry[0] += 1
+        else:
+            entry[1] += 1
+            if time_to_loss is not None:
+                entry[2] += time_to_loss
+                entry[3] += 1
+
+    def record_run(self, attempts):
+        """
+        记录一次运行的所有预约请求。
+
+        :param attempts: [(run_id, pid, devId, sent_at, outcome, message), ...]
+        :return: None
+        """
+        if not attempts:
+            return
+        run_start = min(attempt[3] for attempt in attempts)
+        for _, _, devId, sent_at, outcome, message in attempts:
+            self.update(devId, outcome, sent_at, message, sent_at - run_start)
+
+    def win_rate(self, devId, now=None):
+        """
+        座位的预约成功率估计，没有历史数据时为 0.5（胜负各加一次的先验）。
+
+        :param devId: 座位 ID
+        :param now: 计算衰减的时间戳，默认为当前时间
+        :return: 0 到 1 之间的成功率
+        """
+        entry = self.seats.get(str(devId))
+        if entry is None:
+            return 0.5
+        factor = 0.5 ** (max(0, (now or time.time()) - entry[4]) / self.half_life)
+        wins, losses = entry[0] * factor, entry[1] * factor
+        return (wins + 1) / (wins + losses + 2)
+
+    def time_to_loss(self, devId):
+        """
+        座位失败时距运行开始的平均秒数（衰减加权）。
+
+        :param devId: 座位 ID
+        :return: 秒数，没有失败记录时返回 None
+        """
+        entry = self.seats.get(str(devId))
+        if entry is None or not entry[3]:
+            return None
+        return entry[2] / entry[3]
+
+    def contention(self, devId, now=None):
+        """
+        座位的竞争程度：失败率 × 失败速度系数。失败时距运行开始越短，系数越接近 1；
+        失败得越晚（例如只是请求发得太晚），系数越接近 0.5；没有失败记录时系数为 1。
+
+        :param devId: 座位 ID
+        :param now: 计算衰减的时间戳，默认为当前时间
+        :return: 0 到 1 之间的值，越大越难抢到
+        """
+        time_to_loss = self.time_to_loss(devId)
+        speed = 1.0 if time_to_loss is None else 0.5 + 0.5 * TIME_TO_LOSS_SCALE / (TIME_TO_LOSS_SCALE + time_to_loss)
+        return (1 - self.win_rate(devId, now)) * speed
+
+    def reorder(self, seat_list, tolerance, now=None):
+        """
+        在用户允许的范围内调整座位顺序，把经常被抢走的座位移到更容易抢到的座位后面。
+
+        每个座位的排序键为 原位置 + (tolerance + 1) × 竞争程度（见 contention），键小于下一个整数位置，
+        因此任何座位最多后移 tolerance 位；竞争程度相同的座位保持原有顺序。
+
+        :param seat_list: 座位 ID 列表（用户的偏好顺序）
+        :param tolerance: 允许后移的最大位置数，0 表示不调整
+        :param now: 计算衰减的时间戳，默认为当前时间
+        :return: 调整后的座位 ID 列表
+        """
+        if tolerance <= 0 or len(seat_list) < 2:
+            return list(seat_list)
+        now = now or time.time()
+        keys = {seat_id: index + (tolerance + 1) * self.contention(seat_id, now)
+                for index, seat_id in enumerate(seat_list)}
+        return sorted(seat_list, key=lambda seat_id: keys[seat_id])
+
+    @staticmethod
+    def iter_runs(db, start=None):
+        """
+        按运行分组读取预约请求记录。
+
+        :param db: LibraryDatabase 对象
+        :param start: 可选的起始时间戳
+        :return: 生成器，元素为 (run_id, [(run_id, pid, devId, sent_at, outcome, message), ...])
+        """
+        for run_id, attempts in itertools.groupby(db.iter_reservation_attempts(start), key=lambda row: row[0]):
+            yield run_id, list(attempts)
+
+    @classmethod
+    def from_db(cls, db, half_life_days=config.SEAT_STATS_HALF_LIFE_DAYS):
+        """
+        从 reservation_attempts 表加载统计。只读取最近 10 个半衰期内的记录，更早的记录影响可以忽略。
+
+        :param db: LibraryDatabase 对象
+        :param half_life_days: 半衰期（天）
+        :return: SeatStats 对象
+        """
+        stats = cls(half_life_days)
+        for _, attempts in cls.iter_runs(db, time.time() - stats.half_life * 10):
+            stats.record_run(attempts)
+        log(f"座位统计已加载: {len(stats.seats)} 个座位")
+        return stats
+
+
+def evaluate(db, tolerance, half_life_days=config.SEAT_STATS_HALF_LIFE_DAYS):
+    """
+    离线回放历史运行，比较按原顺序和按统计调整顺序时第一个请求的成功次数。
+
+    依次回放每次运行：只用这次运行之前的记录建立统计，按统计调整每个用户本次实际请求过的座位顺序，
+    再用本次运行中这些座位的真实结果（任一用户在本次运行中抢到即为可抢到，只因被别人预约而被拒绝过即为抢不到）
+    判断调整后排在最前、且本次有结果的座位能否抢到。
+
+    :param db: LibraryDatabase 对象
+    :param tolerance: 允许后移的最大位置数
+    :param half_life_days: 半衰期（天）
+    :return: {"runs", "users", "baseline_first_wins", "reordered_first_wins", "changed_first_choice"}
+    """
+    stats = SeatStats(half_life_days)
+    report = {"runs": 0, "users": 0, "baseline_first_wins": 0, "reordered_first_wins": 0, "changed_first_choice": 0}
+    for _, attempts in SeatStats.iter_runs(db):
+        run_start = min(attempt[3] for attempt in attempts)
+
+        # 本次运行中每个座位的结果，以及每个用户的请求顺序
+        seat_results = {}
+        user_seats = {}
+        for _, pid, devId, _, outcome, message in attempts:
+            if outcome in (OUTCOME_SUCCESS, OUTCOME_CANCELLED):
+                seat_results[devId] = True
+            elif outcome == OUTCOME_REJECTED and is_seat_taken(message):
+                seat_results.setdefault(devId, False)
+            seats = user_seats.setdefault(pid, [])
+            if devId not in seats:
+                seats.append(devId)
+
+        for seats in user_seats.values():
+            known_seats = [seat_id for seat_id in seats if seat_id in seat_results]
+            if not known_seats:
+                continue
+            reordered = stats.reorder(known_seats, tolerance, run_start)
+            report["users"] += 1
+            report["baseline_first_wins"] += seat_results[known_seats[0]]
+            report["reordered_first_wins"] += seat_results[reordered[0]]
+            report["changed_first_choice"] += reordered[0] != known_seats[0]
+
+        report["runs"] += 1
+        stats.record_run(attempts)
+    return report
+
+
+# 离线评估：python -m utils.seat_stats [tolerance ...]
+if __name__ == "__main__":
+    import sys
+    from utils.library_database import LibraryDatabase
+
+    db = LibraryDatabase()
+    try:
+        for tolerance in [int(arg) for arg in sys.argv[1:]] or [1, 2, 3, 5]:
+            report = evaluate(db, tolerance)
+            print(f"tolerance={tolerance}: 回放 {report['runs']} 次运行、{report['users']} 个用户，"
+                  f"第一个请求成功 原顺序 {report['baseline_first_wins']} 次，"
+                  f"调整后 {report['reordered_first_wins']} 次，"
+                  f"首选座位改变 {report['changed_first_choice']} 次")
+        summary = db.get_fallback_summary()
+        print(f"相邻座位备选: {summary['users']} 次预约中所选座位成功 {summary['primary_wins']} 次，"
+              f"{summary['fallback_users']} 次尝试了相邻座位，其中成功 {summary['fallback_wins']} 次")
+    finally:
+        db.close()
@@ -0,0 +1,163 @@
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from utils import config
+
+DEFAULT_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+    "Accept": "application/json, text/plain, */*",
+    "Accept-Language": "zh-CN,zh;q=0.9",
+}
+
+_shared_adapter = None
+_shared_adapter_lock = threading.Lock()
+_single_attempt_adapter = None
+
+class TimeoutSession(requests.Session):
+    def __init__(self, timeout=None):
+        """
+        带默认超时的 Session。未显式传入 timeout 的请求使用默认超时，避免单个卡死的连接拖住整个流程。
+
+        :param timeout: 默认超时 (连接超时, 读取超时)，默认为 config.LOGIN_TIMEOUT
+        """
+        super().__init__()
+        self.default_timeout = config.LOGIN_TIMEOUT if timeout is None else timeout
+
+    def request(self, method, url, **kwargs):
+        if kwargs.get("timeout") is None:
+            kwargs["timeout"] = self.default_timeout
+        return super().request(method, url, **kwargs)
+
+
+def create_adapter(pool_size=None, retries=None):
+    """
+    创建连接池适配器。
+
+    只对建立连接失败的情况重试（此时请求尚未发出），以及 GET 请求的读取失败；
+    预约 POST 不会因读取失败而重复提交。
+
+    :param pool_size: 每个主机的最大连接数，默认为 config.HTTP_POOL_SIZE
+    :param retries: 重试次数，默认为 config.HTTP_RETRIES
+    :return: HTTPAdapter 对象
+    """
+    pool_size = config.HTTP_POOL_SIZE if pool_size is None else pool_size
+    retries = config.HTTP_RETRIES if retries is None else retries
+    retry = Retry(total=retries, connect=retries, read=retries, status=0,
+                  allowed_methods=frozenset(["GET", "HEAD"]), raise_on_status=False)
+    return HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=retry)
+
+
+def get_shared_adapter():
+    """
+    获取进程内共用的连接池适配器。webvpn 和图书馆接口都经由同一个 webvpn 主机，
+    所有用户的 Session 挂载同一个适配器后，keep-alive 连接可以在用户和线程之间复用。
+
+    :return: HTTPAdapter 对象
+    """
+    global _shared_adapter
+    with _shared_adapter_lock:
+        if _shared_adapter is None:
+            _shared_adapter = create_adapter()
+        return _shared_adapter
+
+
+def get_single_attempt_adapter():
+    """
+    获取不做任何重试的适配器，与共用适配器使用同一个连接池，可以复用已建立的 keep-alive 连接。
+
+    :return: HTTPAdapter 对象
+    """
+    global _single_attempt_adapter
+    shared_adapter = get_shared_adapter()
+    with _shared_adapter_lock:
+        if _single_attempt_adapter is None:
+            adapter = HTTPAdapter(max_retries=0)
+            adapter.poolmanager = shared_adapter.poolmanager
+            _single_attempt_adapter = adapter
+        return _single_attempt_adapter
+
+
+def ensure_pool_size(pool_size):
+    """
+    保证共用连接池每个主机至少能保留 pool_size 个连接。两阶段预约的发射阶段所有用户同时发出请求，
+    连接池小于用户数时，多出的连接用完即被丢弃，之后的请求需要重新建立 TCP/TLS 连接。
+
+    连接池只能在创建时指定大小，扩容时重建连接池，已有的少量连接（VPN 登录时建立）会被关闭，应在预热前调用。
+    重建后 get_transport_stats 统计的请求数和新建连接数从零开始。
+
+    :param pool_size: 需要的连接数
+    :return: None
+    """
+    adapter = get_shared_adapter()
+    with _shared_adapter_lock:
+        if adapter.poolmanager.connection_pool_kw.get("maxsize", 0) >= pool_size:
+            return
+        old_poolmanager = adapter.poolmanager
+        adapter.init_poolmanager(4, pool_size)
+        if _single_attempt_adapter is not None:
+            _single_attempt_adapter.poolmanager = adapter.poolmanager
+        # 关闭旧连接池中的空闲连接，不等待垃圾回收
+        old_poolmanager.clear()
+
+
+def send_once(session, method, url, timeout, **kwargs):
+    """
+    使用 session 的 Cookie 和请求头发送一次请求，失败不重试（包括 GET 的读取失败），
+    用于放座时可以放弃的辅助请求，避免拖住后面的预约请求。
+
+    :param session: requests.Session 对象
+    :param method: 请求方法
+    :param url: 请求的 URL
+    :param timeout: 超时 (连接超时, 读取超时)
+    :param kwargs: 传给 requests.Request 的其他参数（params、json 等）
+    :return: 响应对象
+    """
+    request = session.prepare_request(requests.Request(method, url, **kwargs))
+    # 与 Session.send 使用相同的证书和代理设置，才会落到同一个连接池
+    settings = session.merge_environment_settings(request.url, {}, False, None, None)
+    response = get_single_attempt_adapter().send(request, timeout=timeout, verify=settings["verify"],
+                                                 cert=settings["cert"], proxies=settings["proxies"])
+    # 读完响应体，连接才会归还连接池供后续请求复用
+    response.content
+    return response
+
+
+def create_session(adapter=None, timeout=None):
+    """
+    创建挂载了连接池适配器、带默认请求头和默认超时的 Session。每个 Session 有独立的 Cookie 罐。
+
+    :param adapter: 连接池适配器，默认使用共用适配器
+    :param timeout: 默认超时 (连接超时, 读取超时)
+    :return: TimeoutSession 对象
+    """
+    adapter = get_shared_adapter() if adapter is None else adapter
+    session = TimeoutSession(timeout)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update(DEFAULT_HEADERS)
+    return session
+
+
+def get_transport_stats(adapter=None):
+    """
+    统计连接池的连接复用情况。
+
+    :param adapter: 连接池适配器，默认使用共用适配器
+    :return: {"requests": 请求数, "new_connections": 新建连接数, "reused_connections": 复用连接数}
+    """
+    adapter = get_shared_adapter() if adapter is None else adapter
+    total_requests = 0
+    new_connections = 0
+    pools = adapter.poolmanager.pools
+    pool_list = [pool for pool in (pools.get(key) for key in pools.keys()) if pool is not None]
+    for pool in pool_list:
+        total_requests += pool.num_requests
+        new_connections += pool.num_connections
+    return {
+        "requests": total_requests,
+        "new_connections": new_connections,
+        "reused_connections": max(0, total_requests - new_connections),
+    }
@@ -0,0 +1,119 @@
+import threading
+import time
+
+from utils import config
+from utils.transport import create_session
+from utils.vpn_system import VPNSystem
+
+def log(*args):
+    """
+    统一打印日志函数。
+
+    :param args: 打印的内容
+    :return: None
+    """
+    # print(*args)
+    pass
+
+# webvpn Cookie 失效时会被重定向到这些登录页面
+VPN_LOGIN_MARKERS = ("authserver/login", "webvpn.njfu.edu.cn/login")
+
+class VPNSessionManager:
+    def __init__(self, username=config.VPN_USERNAME, password=config.VPN_PASSWORD,
+                 cookie_lifetime=config.VPN_COOKIE_LIFETIME):
+        """
+        webvpn 会话管理类。
+
+        所有用户共用同一个 VPN 账号，因此只需登录一次，之后每个用户拿到一个复制了 webvpn Cookie 的
+        独立 Session（各自的 Cookie 罐，互不影响图书馆的 ic-cookie）。
+
+        :param username: VPN 用户名
+        :param password: VPN 密码
+        :param cookie_lifetime: webvpn Cookie 的有效时长（秒），超时后自动重新登录
+        """
+        self.username = username
+        self.password = password
+        self.cookie_lifetime = cookie_lifetime
+        self._cookies = None
+        self._login_time = 0
+        # 每次重新登录后加一，用于避免多个线程同时发现 Cookie 失效时重复登录
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def _is_valid(self):
+        """
+        判断当前缓存的 webvpn Cookie 是否仍在有效期内。
+
+        :return: 有效返回 True
+        """
+        return self._cookies is not None and time.time() - self._login_time < self.cookie_lifetime
+
+    def _do_login(self):
+        """
+        执行一次完整的 VPN 登录，并缓存登录后的 Cookie。调用前需持有锁。
+
+        :return: 登录成功返回 True，失败返回 False
+        """
+        vpn = VPNSystem(self.username, self.password)
+        if not vpn.vpn_login():
+            log("VPN登录失败")
+            self._cookies = None
+            return False
+        self._cookies = vpn.session.cookies.copy()
+        self._login_time = time.time()
+        self._generation += 1
+        log("VPN登录成功，第", self._generation, "次登录")
+        return True
+
+    def login(self, force=False):
+        """
+        确保 webvpn 处于登录状态。Cookie 有效时直接返回，不会重复登录。
+
+        :param force: 是否强制重新登录
+        :return: 登录成功返回 True，失败返回 False
+        """
+        with self._lock:
+            if not force and self._is_valid():
+                return True
+            return self._do_login()
+
+    def new_session(self):
+        """
+        创建一个携带 webvpn Cookie 的新 Session，每个用户使用各自的 Cookie 罐，但共用同一个连接池。
+
+        :return: requests.Session 对象，VPN 登录失败时返回 None
+        """
+        if not self.login():
+            return None
+        session = create_session()
+        with self._lock:
+            session.cookies.update(self._cookies)
+        session.vpn_generation = self._generation
+        return session
+
+    def refresh(self, session):
+        """
+        webvpn 拒绝了 Session 中的 Cookie 时调用，重新登录并更新该 Session 的 Cookie。
+
+        如果其他线程已经在该 Session 创建之后重新登录过，则直接复用新的 Cookie。
+
+        :param session: 被拒绝的 requests.Session 对象
+        :return: 成功返回 True，失败返回 False
+        """
+        with self._lock:
+            if getattr(session, "vpn_generation", 0) == self._generation or not self._is_valid():
+                if not self._do_login():
+                    return False
+            session.cookies.update(self._cookies)
+            session.vpn_generation = self._generation
+        return True
+
+    @staticmethod
+    def is_rejected(response):
+        """
+        判断响应是否说明 webvpn Cookie 已失效（被重定向回登录页面）。
+
+        :param response: 响应对象
+        :return: Cookie 失效返回 True
+        """
+        return response is not None and any(marker in response.url for marker in VPN_LOGIN_MARKERS)
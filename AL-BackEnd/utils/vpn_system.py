@@ -1,6 +1,9 @@
 from utils.base_system import BaseSystem
-from bs4 import BeautifulSoup
 from utils.password_encryptor import PasswordEncryptor
+from utils.phase_metrics import (phase_metrics, PHASE_VPN_INITIAL_PAGE, PHASE_VPN_FORM_EXTRACT,
+                                 PHASE_VPN_AES_ENCRYPT, PHASE_VPN_LOGIN_POST)
+import html
+import re
 
 def log(*args):
     """
@@ -12,13 +15,20 @@ def log(*args):
     # print(*args)
     pass
 
+# 快速提取表单元素所用的正则：逐个匹配 <input> 标签及其属性
+INPUT_TAG_PATTERN = re.compile(r"<input\b([^>]*)>", re.IGNORECASE)
+ATTR_PATTERN = re.compile(r"""([^\s=/>]+)\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s>]+))""")
+
 class VPNSystem(BaseSystem):
+    BASE_URL = "https://webvpn.njfu.edu.cn/webvpn/LjIwMS4xNjkuMjE4LjE2OC4xNjc=/LjIxNC4xNTguMTk5LjEwMi4xNjIuMTU5LjIwMi4xNjguMTQ3LjE1MS4xNTYuMTczLjE0OC4xNTMuMTY1/"
+    VPN_SUFFIX = ""
+
     def __init__(self, username, password):
         super().__init__(
             username=username,
             password=password,
-            base_url="https://webvpn.njfu.edu.cn/webvpn/LjIwMS4xNjkuMjE4LjE2OC4xNjc=/LjIxNC4xNTguMTk5LjEwMi4xNjIuMTU5LjIwMi4xNjguMTQ3LjE1MS4xNTYuMTczLjE0OC4xNTMuMTY1/",
-            vpn_suffix=""
+            base_url=self.BASE_URL,
+            vpn_suffix=self.VPN_SUFFIX
         )
 
     def fetch_vpn_initial_page(self, login_url, params):
@@ -40,15 +50,44 @@ class VPNSystem(BaseSystem):
             log("获取 VPN 初始页面时发生异常:", str(e))
             return None
 
+    @staticmethod
+    def extract_form_elements_fast(html_text):
+        """
+        逐个扫描 <input> 标签提取表单元素，找到 salt 和 lt 后立即停止，不构建完整的文档树。
+
+        :param html_text: HTML 文本
+        :return: (salt, lt) 或 None
+        """
+        salt = lt = None
+        for tag in INPUT_TAG_PATTERN.finditer(html_text):
+            attrs = {}
+            for match in ATTR_PATTERN.finditer(tag.group(1)):
+                value = next(v for v in match.groups()[1:] if v is not None)
+                attrs.setdefault(match.group(1).lower(), html.unescape(value))
+            if salt is None and attrs.get('id') == 'pwdDefaultEncryptSalt':
+                salt = attrs.get('value')
+            if lt is None and attrs.get('name') == 'lt':
+                lt = attrs.get('value')
+            if salt is not None and lt is not None:
+                return salt, lt
+        return None
+
     @staticmethod
     def extract_form_elements(html_text):
         """
-        从页面中提取必要的表单元素。
+        从页面中提取必要的表单元素。优先使用快速提取，未找到时再用 BeautifulSoup 完整解析。
 
         :param html_text: HTML 文本
         :return: (salt, lt) 或 None
         """
+        form_elements = VPNSystem.extract_form_elements_fast(html_text)
+        if form_elements:
+            return form_elements
+
+        log("快速提取表单元素失败，使用 BeautifulSoup 解析")
         try:
+            # 只在快速提取失败时才导入 bs4，减少启动时间
+            from bs4 import BeautifulSoup
             soup = BeautifulSoup(html_text, 'html.parser')
             salt_input = soup.find('input', {'id': 'pwdDefaultEncryptSalt'})
             lt_input = soup.find('input', {'name': 'lt'})
@@ -70,19 +109,22 @@ class VPNSystem(BaseSystem):
         params = {'service': 'https://webvpn.njfu.edu.cn/rump_frontend/loginFromCas/'}
 
         # 获取初始页面
-        html_text = self.get_response(login_url, params=params).text
+        with phase_metrics.timer(PHASE_VPN_INITIAL_PAGE):
+            html_text = self.get_response(login_url, params=params).text
         if not html_text:
             return False
 
         # 提取表单元素
-        form_elements = self.extract_form_elements(html_text)
+        with phase_metrics.timer(PHASE_VPN_FORM_EXTRACT):
+            form_elements = self.extract_form_elements(html_text)
         if not form_elements:
             return False
 
         salt, lt = form_elements
 
         # 加密密码
-        encrypted_password = PasswordEncryptor.aes_encrypt_password(salt, self.password)
+        with phase_metrics.timer(PHASE_VPN_AES_ENCRYPT):
+            encrypted_password = PasswordEncryptor.aes_encrypt_password(salt, self.password)
         if not encrypted_password:
             return False
 
@@ -97,7 +139,8 @@ class VPNSystem(BaseSystem):
             'rmShown': '1'
         }
 
-        response = self.session.post(login_url, data=data)
+        with phase_metrics.timer(PHASE_VPN_LOGIN_POST):
+            response = self.session.post(login_url, data=data)
 
         if response and "frontend/login/index.html" in response.url:
             log("VPN登录成功")
@@ -105,3 +148,47 @@ class VPNSystem(BaseSystem):
 
         log("VPN登录失败")
         return False
+
+
+# 对比快速提取与 BeautifulSoup 完整解析：python -m utils.vpn_system
+if __name__ == "__main__":
+    import timeit
+    from bs4 import BeautifulSoup
+
+    # 模拟统一身份认证登录页面的夹具
+    filler = "".join(f'<div class="item-{i}"><span>占位内容 {i}</span><a href="/link/{i}">链接</a></div>\n'
+                     for i in range(300))
+    fixtures = {
+        "标准页面": f"""<html><head><title>统一身份认证</title></head><body>{filler}
+<form id="casLoginForm" method="post">
+<input id="username" name="username" type="text" placeholder="用户名"/>
+<input id="password" name="password" type="password"/>
+<input type="hidden" name="lt" value="LT-123456-abcdefg-cas"/>
+<input type="hidden" name="dllt" value="userNamePasswordLogin"/>
+<input type="hidden" name="execution" value="e1s1"/>
+<input type="hidden" id="pwdDefaultEncryptSalt" value="AbCdEfGh12345678"/>
+</form>{filler}</body></html>""",
+        "属性顺序与引号变化": f"""<html><body>{filler}
+<INPUT value='Salt&amp;Value1234' type=hidden ID="pwdDefaultEncryptSalt">
+<input value=LT-999-xyz name=lt type="hidden">
+{filler}</body></html>""",
+        "缺少字段(回退)": f"<html><body>{filler}<input name='lt' value='LT-1'/></body></html>",
+    }
+
+    def full_parse(html_text):
+        soup = BeautifulSoup(html_text, 'html.parser')
+        salt_input = soup.find('input', {'id': 'pwdDefaultEncryptSalt'})
+        lt_input = soup.find('input', {'name': 'lt'})
+        if not salt_input or not lt_input:
+            return None
+        return salt_input['value'], lt_input['value']
+
+    rounds = 50
+    for name, page in fixtures.items():
+        fast_result = VPNSystem.extract_form_elements_fast(page)
+        full_result = full_parse(page)
+        assert VPNSystem.extract_form_elements(page) == full_result, name
+        fast_time = timeit.timeit(lambda: VPNSystem.extract_form_elements_fast(page), number=rounds) / rounds * 1e3
+        full_time = timeit.timeit(lambda: full_parse(page), number=rounds) / rounds * 1e3
+        print(f"{name}: 快速提取 {fast_result} {fast_time:.3f}ms/次，"
+              f"BeautifulSoup {full_result} {full_time:.3f}ms/次")